@@ -0,0 +1,170 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# One-shot announcements that came due while the bot was down are still sent if they're at most this
+# late; a restart warning from an hour ago would only confuse players
+MISSED_GRACE = 300.0
+
+
+class Announcement:
+    """A scheduled message to one or more of a guild's servers"""
+
+    __slots__ = ("id", "guild_id", "servers", "message", "next_run", "repeat", "created_by")
+
+    def __init__(self, id, guild_id, servers, message, next_run, repeat, created_by):
+        self.id = id
+        self.guild_id = guild_id
+        # Server keys, or ["all"] for whatever the guild has when it fires
+        self.servers = servers
+        self.message = message
+        self.next_run = next_run
+        self.repeat = repeat
+        self.created_by = created_by
+
+    @classmethod
+    def from_row(cls, row):
+        id, guild_id, servers, message, next_run, repeat, created_by = row
+        return cls(id, guild_id, json.loads(servers), message, next_run, repeat, created_by)
+
+
+class AnnouncementScheduler:
+    """Persistent delayed and recurring announcements.
+
+    Each pending announcement is one timer on the event loop (loop.call_at), so nothing sleeps
+    or polls in between; the SQLite table makes them survive restarts.
+    """
+
+    def __init__(self, db_file, deliver, owns_guild=None):
+        self.db_file = db_file
+        # async deliver(announcement) sends it and returns when done
+        self.deliver = deliver
+        # With several shard processes sharing the table, each only runs its own guilds' announcements
+        self.owns_guild = owns_guild or (lambda guild_id: True)
+        self._db = None
+        self._open_lock = threading.Lock()
+        self._timers = {}
+        self._loop = None
+
+    def open(self):
+        """Open the database once; blocking, so startup runs it in a thread"""
+        with self._open_lock:
+            if self._db is not None:
+                return
+            # Only used from the event loop once open
+            db = sqlite3.connect(self.db_file, isolation_level=None, timeout=10.0, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS announcements ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " guild_id INTEGER NOT NULL,"
+                " servers TEXT NOT NULL,"
+                " message TEXT NOT NULL,"
+                " next_run REAL NOT NULL,"
+                " repeat REAL NOT NULL DEFAULT 0,"
+                " created_by TEXT NOT NULL)"
+            )
+            self._db = db
+
+    @property
+    def db(self):
+        if self._db is None:
+            self.open()
+        return self._db
+
+    def start(self):
+        """Arm a timer for every stored announcement; safe to call again on reconnect"""
+        if self._loop is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        now = time.time()
+        for row in self.db.execute("SELECT * FROM announcements"):
+            announcement = Announcement.from_row(row)
+            if not self.owns_guild(announcement.guild_id):
+                continue
+            if announcement.next_run < now - MISSED_GRACE:
+                if not announcement.repeat:
+                    logger.info("dropping missed announcement", extra={"announcement_id": announcement.id})
+                    self._delete(announcement.id)
+                    continue
+                announcement.next_run = self._next_occurrence(announcement, now)
+                self._save_next_run(announcement)
+            self._arm(announcement)
+
+    def stop(self):
+        for timer in self._timers.values():
+            timer.cancel()
+        self._timers.clear()
+        self._loop = None
+
+    def add(self, guild_id, servers, message, delay, repeat=0.0, created_by=""):
+        """Schedule an announcement `delay` seconds from now, repeating every `repeat` seconds if given"""
+        next_run = time.time() + delay
+        cursor = self.db.execute(
+            "INSERT INTO announcements (guild_id, servers, message, next_run, repeat, created_by) VALUES (?, ?, ?, ?, ?, ?)",
+            (guild_id, json.dumps(servers), message, next_run, repeat, str(created_by))
+        )
+        announcement = Announcement(cursor.lastrowid, guild_id, servers, message, next_run, repeat, str(created_by))
+        if self._loop is not None:
+            self._arm(announcement)
+        return announcement
+
+    def list(self, guild_id):
+        rows = self.db.execute("SELECT * FROM announcements WHERE guild_id = ? ORDER BY next_run", (guild_id,))
+        return [Announcement.from_row(row) for row in rows]
+
+    def cancel(self, guild_id, announcement_id):
+        """Cancel one of a guild's announcements; returns whether it existed"""
+        deleted = self.db.execute(
+            "DELETE FROM announcements WHERE id = ? AND guild_id = ?", (announcement_id, guild_id)
+        ).rowcount
+        timer = self._timers.pop(announcement_id, None)
+        if timer is not None:
+            timer.cancel()
+        return bool(deleted)
+
+    def _arm(self, announcement):
+        delay = max(announcement.next_run - time.time(), 0.0)
+        timer = self._timers.pop(announcement.id, None)
+        if timer is not None:
+            timer.cancel()
+        self._timers[announcement.id] = self._loop.call_at(self._loop.time() + delay, self._fire, announcement.id)
+
+    def _fire(self, announcement_id):
+        self._timers.pop(announcement_id, None)
+        asyncio.ensure_future(self._run(announcement_id))
+
+    async def _run(self, announcement_id):
+        row = self.db.execute("SELECT * FROM announcements WHERE id = ?", (announcement_id,)).fetchone()
+        if row is None:
+            # Cancelled after the timer fired
+            return
+        announcement = Announcement.from_row(row)
+        # Reschedule before sending so a slow or failing delivery can't stall the next occurrence
+        if announcement.repeat:
+            announcement.next_run = self._next_occurrence(announcement, time.time())
+            self._save_next_run(announcement)
+            self._arm(announcement)
+        else:
+            self._delete(announcement.id)
+        try:
+            await self.deliver(announcement)
+        except Exception:
+            logger.exception("error delivering announcement", extra={"announcement_id": announcement.id})
+
+    @staticmethod
+    def _next_occurrence(announcement, now):
+        # Skip occurrences missed while the bot was down instead of sending them all at once
+        missed = max(int((now - announcement.next_run) // announcement.repeat) + 1, 1)
+        return announcement.next_run + missed * announcement.repeat
+
+    def _save_next_run(self, announcement):
+        self.db.execute("UPDATE announcements SET next_run = ? WHERE id = ?", (announcement.next_run, announcement.id))
+
+    def _delete(self, announcement_id):
+        self.db.execute("DELETE FROM announcements WHERE id = ?", (announcement_id,))
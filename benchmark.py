@@ -0,0 +1,253 @@
+# Load-test the slash command handlers against fake RCON servers, without Discord.
+# Usage: python benchmark.py --servers 3 --concurrency 50 --requests 2000 --latency 0.02
+import argparse
+import asyncio
+import datetime
+import itertools
+import os
+import random
+import tempfile
+import time
+
+from fake_rcon import FakeRconServer
+
+GUILD_ID = 1234
+
+
+class FakePermissions:
+    def __init__(self, administrator):
+        self.administrator = administrator
+
+
+class FakeUser:
+    def __init__(self, user_id, administrator=False):
+        self.id = user_id
+        self.guild_permissions = FakePermissions(administrator)
+
+    def __str__(self):
+        return f"bench-user-{self.id}"
+
+
+class FakeResponse:
+    """Mimics discord.InteractionResponse closely enough for the handlers"""
+
+    def __init__(self, interaction):
+        self._interaction = interaction
+        self._done = False
+
+    def is_done(self):
+        return self._done
+
+    def _acknowledge(self):
+        if self._done:
+            raise RuntimeError("This interaction has already been responded to before")
+        self._done = True
+        self._interaction.acknowledged = time.perf_counter()
+
+    async def send_message(self, content=None, **kwargs):
+        self._acknowledge()
+        self._interaction.reply = content
+
+    async def defer(self, **kwargs):
+        self._acknowledge()
+
+
+class FakeFollowup:
+    async def send(self, content=None, **kwargs):
+        pass
+
+
+class FakeNamespace:
+    def __init__(self, values):
+        self.__dict__.update(values)
+
+
+class FakeInteraction:
+    """Stands in for discord.Interaction when calling command callbacks directly"""
+
+    def __init__(self, user, arguments):
+        self.guild_id = GUILD_ID
+        self.created_at = datetime.datetime.now(datetime.timezone.utc)
+        self.user = user
+        self.extras = {}
+        self.namespace = FakeNamespace(arguments)
+        self.command = None
+        self.acknowledged = None
+        self.reply = None
+        self.response = FakeResponse(self)
+        self.followup = FakeFollowup()
+
+    async def edit_original_response(self, **kwargs):
+        pass
+
+
+class LoopBlockMonitor:
+    """Measures how long the event loop was unable to run a short periodic timer"""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.blocked = 0.0
+        self.worst = 0.0
+        self._task = None
+
+    async def _run(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag = time.perf_counter() - started - self.interval
+            if lag > 0:
+                self.blocked += lag
+                self.worst = max(self.worst, lag)
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    def take(self):
+        """Blocked time and worst stall since the last call; counting starts afresh"""
+        blocked, worst = self.blocked, self.worst
+        self.blocked = self.worst = 0.0
+        return blocked, worst
+
+    async def stop(self):
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(int(fraction * len(sorted_values)), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def build_scenarios(commands):
+    """Map scenario name -> (command, function building its arguments for a server key)"""
+    counter = itertools.count()
+    return {
+        "players": (commands.players, lambda server: {"server": server}),
+        "status": (commands.status, lambda server: {"server": server}),
+        "world": (commands.world, lambda server: {"server": server}),
+        "memory": (commands.memory, lambda server: {"server": server}),
+        "say": (commands.say, lambda server: {"message": "benchmark", "server": server}),
+        "whitelist_add": (commands.whitelist_add,
+                          lambda server: {"minecraft_username": f"bench{next(counter)}", "server": server}),
+    }
+
+
+async def run(args):
+    fake_servers = [
+        await FakeRconServer("bench", latency=args.latency, jitter=args.jitter,
+                             failure_rate=args.failure_rate, seed=i, vanilla=args.vanilla).start()
+        for i in range(args.servers)
+    ]
+
+    # The bot's stores read and write files in the working directory on import
+    workdir = tempfile.mkdtemp(prefix="mcbot-bench-")
+    os.chdir(workdir)
+    import commands
+    from execution import command_scheduler
+    from helpers import server_manager, response_cache, rcon_pools
+
+    for i, fake in enumerate(fake_servers):
+        server_manager.add_server(f"bench{i}", fake.host, fake.port, "bench", GUILD_ID)
+    if args.no_cache:
+        response_cache.ttls.clear()
+    rcon_pools.max_size = args.pool_size
+    if not args.rate_limits:
+        # Every request comes from one fake guild, which the real limits would throttle
+        command_scheduler.user_limits.rate = command_scheduler.guild_limits.rate = 1e9
+
+    scenarios = build_scenarios(commands)
+    selected = args.commands.split(",") if args.commands else list(scenarios)
+    server_keys = [f"bench{i}" for i in range(args.servers)]
+    # Regular members: admins would skip the rate limits
+    users = [FakeUser(user_id) for user_id in range(200)]
+    latencies = {name: [] for name in selected}
+    ack_latencies = {name: [] for name in selected}
+    errors = {name: 0 for name in selected}
+    rejected = {name: 0 for name in selected}
+    blocked = {}
+    elapsed = {}
+    rng = random.Random(0)
+
+    async def worker(name, jobs):
+        command, build_arguments = scenarios[name]
+        while True:
+            try:
+                server = jobs.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            arguments = build_arguments(server)
+            interaction = FakeInteraction(rng.choice(users), arguments)
+            started = time.perf_counter()
+            try:
+                await command.callback(interaction, **arguments)
+            except Exception as e:
+                errors[name] += 1
+                print(f"{name} failed: {e!r}")
+            finished = time.perf_counter()
+            latencies[name].append(finished - started)
+            if interaction.acknowledged is not None:
+                ack_latencies[name].append(interaction.acknowledged - started)
+            if interaction.reply and interaction.reply.startswith("⏳"):
+                rejected[name] += 1
+
+    # One phase per command, so the event-loop blocking measured during a phase is that command's own
+    monitor = LoopBlockMonitor()
+    monitor.start()
+    for i, name in enumerate(selected):
+        jobs = asyncio.Queue()
+        for _ in range(args.requests // len(selected) + (i < args.requests % len(selected))):
+            jobs.put_nowait(rng.choice(server_keys))
+        monitor.take()
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(name, jobs) for _ in range(args.concurrency)))
+        elapsed[name] = time.perf_counter() - started
+        blocked[name] = monitor.take()
+    await monitor.stop()
+
+    print(f"{args.requests} requests, concurrency {args.concurrency}, {args.servers} servers, "
+          f"{args.latency * 1000:.0f}±{args.jitter * 1000:.0f} ms RCON latency, "
+          f"cache {'off' if args.no_cache else 'on'}{', vanilla servers' if args.vanilla else ''}")
+    print(f"{'command':<15}{'n':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}{'ack p95':>10}"
+          f"{'req/s':>8}{'blocked ms':>12}{'stall ms':>10}{'busy':>6}{'errors':>8}")
+    for name in selected:
+        values = sorted(latencies[name])
+        acks = sorted(ack_latencies[name])
+        blocked_time, worst_stall = blocked[name]
+        print(f"{name:<15}{len(values):>6}"
+              f"{percentile(values, 0.50) * 1000:>10.1f}{percentile(values, 0.95) * 1000:>10.1f}"
+              f"{percentile(values, 0.99) * 1000:>10.1f}{(values[-1] if values else 0) * 1000:>10.1f}"
+              f"{percentile(acks, 0.95) * 1000:>10.1f}{len(values) / elapsed[name]:>8.0f}"
+              f"{blocked_time * 1000:>12.1f}{worst_stall * 1000:>10.1f}{rejected[name]:>6}{errors[name]:>8}")
+    total_elapsed = sum(elapsed.values())
+    print(f"throughput: {args.requests / total_elapsed:.0f} req/s over {total_elapsed:.2f}s")
+    print(f"event loop blocked: {sum(b for b, _ in blocked.values()) * 1000:.1f} ms total, "
+          f"worst stall {max(w for _, w in blocked.values()) * 1000:.1f} ms")
+    print(f"RCON: {sum(f.commands_received for f in fake_servers)} commands over "
+          f"{sum(f.connections_opened for f in fake_servers)} connections")
+
+    await rcon_pools.close_all()
+    for fake in fake_servers:
+        await fake.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the command handlers against fake RCON servers")
+    parser.add_argument("--servers", type=int, default=3)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds of RCON latency per command")
+    parser.add_argument("--jitter", type=float, default=0.005)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--pool-size", type=int, default=2, help="RCON connections per server")
+    parser.add_argument("--no-cache", action="store_true", help="disable the read-only response cache")
+    parser.add_argument("--vanilla", action="store_true",
+                        help="fake servers read packets like vanilla Minecraft, which drops pipelined packets")
+    parser.add_argument("--rate-limits", action="store_true", help="keep the per-user and per-guild rate limits")
+    parser.add_argument("--commands", help="comma-separated subset of: players,status,world,memory,say,whitelist_add")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
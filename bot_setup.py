@@ -1,7 +1,100 @@
+import hashlib
+import json
+import logging
+import os
+import time
 import discord
+from discord import app_commands
 from discord.ext import commands
+from log import correlation_id
+from metrics import registry
+from sharding import shard_config
+from startup import startup
 
-# Bot setup
+logger = logging.getLogger(__name__)
+
+
+class InstrumentedCommandTree(app_commands.CommandTree):
+    """Command tree that records per-command latency and errors"""
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        interaction.extras["started"] = time.perf_counter()
+        if not startup.stores_loaded.is_set():
+            # The gateway can come up before servers.json and the databases finish loading
+            await startup.stores_loaded.wait()
+        # Everything this command logs, in any task it starts, carries the interaction's ID
+        correlation_id.set(str(interaction.id))
+        command = interaction.command.qualified_name if interaction.command else "unknown"
+        # Argument values go through the formatter's redaction (e.g. /add_server's password)
+        logger.info("command invoked", extra={
+            "command": command,
+            "user_id": interaction.user.id,
+            "guild_id": interaction.guild_id,
+            "options": {key: value if isinstance(value, (str, int, float, bool)) else str(value)
+                        for key, value in vars(interaction.namespace).items()},
+        })
+        return True
+
+    async def on_error(self, interaction: discord.Interaction, error: app_commands.AppCommandError):
+        command = interaction.command.qualified_name if interaction.command else "unknown"
+        registry.inc("bot_command_errors_total", (("command", command), ("type", type(error).__name__)))
+        record_command_latency(interaction, interaction.command)
+        await super().on_error(interaction, error)
+
+
+    def command_hash(self, guild=None):
+        """Stable hash of the command payloads Discord would receive for a sync"""
+        payload = sorted((command.to_dict(self) for command in self.get_commands(guild=guild)),
+                         key=lambda command: (command.get("type", 1), command["name"]))
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+    async def sync_if_changed(self, guild=None, cache_file="command_sync.json"):
+        """Sync the tree only if it changed since the last successful sync; returns whether it synced.
+
+        With a guild, the global commands are copied into it first so changes show up there
+        immediately (handy for a test server).
+        """
+        if guild is not None:
+            self.copy_global_to(guild=guild)
+        scope = f"{self.client.application_id}:{guild.id if guild else 'global'}"
+        digest = self.command_hash(guild)
+
+        try:
+            with open(cache_file) as f:
+                synced = json.load(f)
+        except (OSError, ValueError):
+            synced = {}
+        if synced.get(scope) == digest:
+            return False
+
+        await self.sync(guild=guild)
+        synced[scope] = digest
+        # Write-then-rename so a crash can't leave a half-written cache that skips the next sync
+        temp_file = cache_file + ".tmp"
+        with open(temp_file, "w") as f:
+            json.dump(synced, f, indent=4)
+        os.replace(temp_file, cache_file)
+        return True
+
+
+def record_command_latency(interaction, command):
+    started = interaction.extras.get("started")
+    if started is None or command is None:
+        return
+    # Set by resolve_server once the argument matched a configured server; typos would otherwise
+    # each create a histogram series that's never freed
+    server = interaction.extras.get("server", "-")
+    registry.observe("bot_command_seconds", time.perf_counter() - started,
+                     (("command", command.qualified_name), ("server", server)))
+
+
+# Bot setup; sharded, this process only connects the shards in SHARD_IDS
 intents = discord.Intents.default()
-bot = commands.Bot(command_prefix="!", intents=intents)
+bot_class = commands.AutoShardedBot if shard_config.enabled else commands.Bot
+bot = bot_class(command_prefix="!", intents=intents, tree_cls=InstrumentedCommandTree, **shard_config.bot_options())
 tree = bot.tree
+
+
+@bot.event
+async def on_app_command_completion(interaction: discord.Interaction, command):
+    record_command_latency(interaction, command)
@@ -0,0 +1,124 @@
+import asyncio
+import time
+
+# How long (in seconds) the reply to each read-only command stays fresh.
+# Commands not listed here are never cached and invalidate the server's entries.
+DEFAULT_TTLS = {
+    "list": 3.0,
+    "version": 300.0,
+    "difficulty": 30.0,
+    "time query daytime": 5.0,
+    "weather query": 10.0,
+    "tps": 5.0,
+    "gc": 5.0,
+    "whitelist list": 30.0,
+}
+
+# Commands that are neither cached nor change anything another query would see
+PASSTHROUGH = {"debug start", "debug stop", "tick query"}
+
+
+class ResponseCache:
+    """TTL cache for read-only RCON replies that coalesces concurrent identical queries"""
+
+    def __init__(self, ttls=None):
+        self.ttls = dict(DEFAULT_TTLS if ttls is None else ttls)
+        self._entries = {}
+        self._inflight = {}
+        self._generations = {}
+
+    def is_cacheable(self, command):
+        return command.strip() in self.ttls
+
+    def invalidates(self, command):
+        """Whether running this command should drop the server's cached replies"""
+        command = command.strip()
+        return command not in self.ttls and command not in PASSTHROUGH
+
+    def peek(self, server_key, command):
+        """A fresh cached reply, or None; never queries the server"""
+        entry = self._entries.get((server_key, command.strip()))
+        if entry is not None and entry[0] > time.monotonic():
+            return entry[1]
+        return None
+
+    async def get(self, server_key, command, fetch):
+        """Return a fresh cached reply, join an identical in-flight query, or start one with fetch()"""
+        command = command.strip()
+        key = (server_key, command)
+
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            return entry[1]
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = self._start(key, fetch())
+        # Shielded so one caller giving up doesn't cancel the query for everyone else
+        return await asyncio.shield(task)
+
+    async def get_many(self, server_key, commands, fetch_many):
+        """Like get() for several commands; the misses are fetched together with fetch_many(misses)"""
+        keys = [(server_key, command.strip()) for command in commands]
+        now = time.monotonic()
+        results = [None] * len(keys)
+        waiting = {}
+        misses = []
+
+        for i, key in enumerate(keys):
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                results[i] = entry[1]
+            elif key in self._inflight:
+                waiting[i] = self._inflight[key]
+            elif key not in misses:
+                misses.append(key)
+
+        if misses:
+            batch = asyncio.ensure_future(fetch_many([command for _, command in misses]))
+            for position, key in enumerate(misses):
+                self._start(key, self._pick(batch, position))
+            for i, key in enumerate(keys):
+                if results[i] is None and i not in waiting:
+                    waiting[i] = self._inflight[key]
+
+        for i, task in waiting.items():
+            results[i] = await asyncio.shield(task)
+        return results
+
+    @staticmethod
+    async def _pick(batch, position):
+        return (await asyncio.shield(batch))[position]
+
+    def _start(self, key, coro):
+        generation = self._generations.get(key[0], 0)
+        task = asyncio.ensure_future(coro)
+        self._inflight[key] = task
+
+        def store(done):
+            if self._inflight.get(key) is done:
+                del self._inflight[key]
+            # Skip failures, and results that raced with an invalidation of this server
+            if done.cancelled() or done.exception() is not None:
+                return
+            if self._generations.get(key[0], 0) == generation:
+                self._entries[key] = (time.monotonic() + self.ttls[key[1]], done.result())
+
+        task.add_done_callback(store)
+        return task
+
+    def generation(self, server_key):
+        """Counter that changes every time the server's entries are invalidated"""
+        return self._generations.get(server_key, 0)
+
+    def discard(self, server_key, command):
+        """Drop one cached reply so the next query goes to the server"""
+        self._entries.pop((server_key, command.strip()), None)
+
+    def invalidate(self, server_key):
+        """Forget everything cached for a server, e.g. after a command that changes its state"""
+        self._generations[server_key] = self._generations.get(server_key, 0) + 1
+        for key in [key for key in self._entries if key[0] == server_key]:
+            del self._entries[key]
+        for key in [key for key in self._inflight if key[0] == server_key]:
+            del self._inflight[key]
@@ -1,8 +1,22 @@
+import csv
+import io
+import logging
+import time
 import discord
 from discord import app_commands
 from bot_setup import bot, tree
-from helpers import (get_guild_servers, get_single_guild_server, rcon_command, 
-                    is_admin, add_server, add_player, remove_player)
+from parsers import (is_already_whitelisted, is_unknown_command, is_whitelist_addition, is_whitelist_removal,
+                     parse_gc, parse_list, parse_username_file, parse_whitelist, strip_colors)
+from tps import format_tps
+from execution import (MAX_EMBED_FIELDS, MAX_FIELD_LENGTH, execute, execute_all, long_text, resolve_server,
+                       resolve_server_list, resolve_servers, server_autocomplete, server_or_all_autocomplete)
+from scheduler import PRIORITY_ACTION, PRIORITY_ADMIN
+from helpers import (get_guild_servers, rcon_command, rcon_batch, get_snapshot, get_server_liveness,
+                    get_tps_history, is_admin, add_server, add_player, remove_player, add_players,
+                    remove_players, reconcile_whitelist, set_relay_channel, user_manager, whitelist_reconciler,
+                    announcement_scheduler)
+
+logger = logging.getLogger(__name__)
 
 # --- Helper functions for server management ---
 
@@ -14,7 +28,6 @@ from helpers import (get_guild_servers, get_single_guild_server, rcon_command,
     password="RCON password"
 )
 async def add_server_command(interaction: discord.Interaction, server_key: str, host: str, port: int, password: str):
-    print(f"add_server called with: {server_key}, {host}, {port}, {password}")
     if not is_admin(interaction.user):
         await interaction.response.send_message("❌ You don't have permission to use this.", ephemeral=True)
         return
@@ -31,7 +44,6 @@ async def add_server_command(interaction: discord.Interaction, server_key: str,
 
 @tree.command(name="help", description="Display available commands and their descriptions")
 async def help_command(interaction: discord.Interaction):
-    print("help command called")
     
     # Build embed for better formatting
     embed = discord.Embed(
@@ -73,6 +85,14 @@ async def help_command(interaction: discord.Interaction):
             name="Admin Commands",
             value=(
                 "`/add_server <key> <host> <port> <password>` - Add a new server\n"
+                "`/whitelist import <file>` - Whitelist every player in a text/CSV file\n"
+                "`/whitelist bulk_remove <file>` - Remove every player in a text/CSV file\n"
+                "`/whitelist export` - Download the whitelist, with who added each player\n"
+                "`/whitelist sync` - Sync the bot's records with the server's whitelist\n"
+                "`/relay set <channel>` / `/relay off` - Relay a server's chat and events to a channel\n"
+                "`/broadcast <message>` - Send a message (and `;`-separated commands) to several servers\n"
+                "`/announce add|restart` - Schedule announcements or restart warnings\n"
+                "`/announce list|cancel` - Show or cancel scheduled announcements\n"
                 "`/custom <server> <command>` - Run custom RCON command"
             ),
             inline=False
@@ -81,48 +101,75 @@ async def help_command(interaction: discord.Interaction):
     # Tips
     embed.add_field(
         name="Tips",
-        value="For commands that need a server parameter, you can omit it if only one server is available",
+        value=("For commands that need a server parameter, you can omit it if only one server is available\n"
+               "`/players`, `/status`, `/tps` and `/say` also accept `all` to cover every server at once"),
         inline=False
     )
     
     await interaction.response.send_message(embed=embed, ephemeral=True)
 
+# Embed descriptions hold 4096 characters; leave room for the count line
+MAX_PLAYER_TEXT = 3900
+
+async def _player_summary(server):
+    """Player count and names for a server, and the snapshot they came from (None if asked live)"""
+    # Answer from the background poller's snapshot, or ask the server with "list"
+    snapshot = get_snapshot(server)
+    if snapshot is not None and snapshot.players is not None:
+        result = snapshot.players
+        player_list = snapshot.player_list
+    else:
+        snapshot = None
+        result = await rcon_command(server, "list")
+        player_list = parse_list(result)
+
+    if player_list is not None:
+        result = f"**{player_list.online}/{player_list.max} online**"
+        if player_list.names:
+            result += "\n" + ", ".join(player_list.names)
+    else:
+        result = strip_colors(result)
+    if len(result) > MAX_PLAYER_TEXT:
+        # Big servers can list more names than an embed holds
+        cut = result.rfind(", ", 0, MAX_PLAYER_TEXT)
+        result = result[:cut if cut > 0 else MAX_PLAYER_TEXT] + " …"
+    return result, snapshot
+
 @tree.command(name="players", description="Show who's currently online on the server")
-@app_commands.describe(server="Server key from servers.json (optional if only one server)")
+@app_commands.describe(server="Server key from servers.json, or \"all\" (optional if only one server)")
+@app_commands.autocomplete(server=server_or_all_autocomplete)
 async def players(interaction: discord.Interaction, server: str = None):
-    print(f"players called with: {server}")
-    guild_id = interaction.guild_id
-    guild_servers = get_guild_servers(guild_id)
-
-    if not guild_servers:
-        await interaction.response.send_message("No servers are configured for this Discord server.", ephemeral=True)
+    servers = await resolve_servers(interaction, server)
+    if servers is None:
         return
 
-    if server is None:
-        server = get_single_guild_server(guild_id)
-        if server is None:
-            await interaction.response.send_message("Multiple servers are available. Please specify the server.", ephemeral=True)
-            return
+    if len(servers) > 1:
+        async def summarize(server):
+            result, _ = await _player_summary(server)
+            return result
 
-    if server not in guild_servers:
-        await interaction.response.send_message(f"❌ Server '{server}' is not available in this Discord server.", ephemeral=True)
+        await execute_all(interaction, servers, summarize, "Players on all servers", discord.Color.green())
         return
 
-    # Get online players using "list" command
-    result = rcon_command(server, "list")
-    
-    # Create a nice embed
-    embed = discord.Embed(
-        title=f"Players on {server}",
-        description=result,
-        color=discord.Color.green()
-    )
-    
-    await interaction.response.send_message(embed=embed)
+    server = servers[0]
+
+    async def work():
+        result, snapshot = await _player_summary(server)
+
+        # Create a nice embed
+        embed = discord.Embed(
+            title=f"Players on {server}",
+            description=result,
+            color=discord.Color.green()
+        )
+        if snapshot is not None:
+            embed.set_footer(text=f"Updated {snapshot.age_text()}")
+        return embed
+
+    await execute(interaction, work(), server=server)
 
 @tree.command(name="list_servers", description="List available Minecraft servers")
 async def list_servers(interaction: discord.Interaction):
-    print("list_servers called")
     guild_id = interaction.guild_id
     guild_servers = get_guild_servers(guild_id)
 
@@ -130,62 +177,54 @@ async def list_servers(interaction: discord.Interaction):
         await interaction.response.send_message("No servers are configured for this Discord server.", ephemeral=True)
         return
 
-    server_list = "\n".join([f"- {key}" for key in guild_servers.keys()])
+    server_list = "\n".join([f"- {key}: {get_server_liveness(key)}" for key in guild_servers.keys()])
     await interaction.response.send_message(f"Available servers:\n{server_list}", ephemeral=True)
 
 
 @tree.command(name="say", description="Broadcast a message")
-@app_commands.describe(server="Server key from servers.json (optional if only one server)", message="Message to broadcast")
+@app_commands.describe(server="Server key from servers.json, or \"all\" (optional if only one server)", message="Message to broadcast")
+@app_commands.autocomplete(server=server_or_all_autocomplete)
 async def say(interaction: discord.Interaction, message: str, server: str = None):
-    print(f"say called with: {message}, {server}")
-    guild_id = interaction.guild_id
-    guild_servers = get_guild_servers(guild_id)
-
-    if not guild_servers:
-        await interaction.response.send_message("No servers are configured for this Discord server.", ephemeral=True)
+    servers = await resolve_servers(interaction, server)
+    if servers is None:
         return
 
-    if server is None:
-        server = get_single_guild_server(guild_id)
-        if server is None:
-            await interaction.response.send_message("Multiple servers are available. Please specify the server.", ephemeral=True)
-            return
+    if len(servers) > 1:
+        async def broadcast(server):
+            result = await rcon_command(server, f"say {message}")
+            # "say" normally answers with nothing
+            return strip_colors(result) or "✅ Sent"
 
-    if server not in guild_servers:
-        await interaction.response.send_message(f"❌ Server '{server}' is not available in this Discord server.", ephemeral=True)
+        await execute_all(interaction, servers, broadcast, "Message sent to all servers", discord.Color.blue(),
+                          priority=PRIORITY_ACTION)
         return
 
-    result = rcon_command(server, f"say {message}")
-    await interaction.response.send_message(f"[{server}] {result}")
+    server = servers[0]
+
+    async def work():
+        result = await rcon_command(server, f"say {message}")
+        return f"[{server}] {result}"
+
+    await execute(interaction, work(), server=server, priority=PRIORITY_ACTION)
 
 
 @tree.command(name="weather", description="Set weather (clear, rain, thunder)")
 @app_commands.describe(server="Server key (optional if only one server)", type="Weather type: clear, rain, or thunder")
+@app_commands.autocomplete(server=server_autocomplete)
 async def weather(interaction: discord.Interaction, type: str, server: str = None):
-    print(f"weather called with: {type}, {server}")
-    guild_id = interaction.guild_id
-    guild_servers = get_guild_servers(guild_id)
-
-    if not guild_servers:
-        await interaction.response.send_message("No servers are configured for this Discord server.", ephemeral=True)
-        return
-
+    server = await resolve_server(interaction, server)
     if server is None:
-        server = get_single_guild_server(guild_id)
-        if server is None:
-            await interaction.response.send_message("Multiple servers are available. Please specify the server.", ephemeral=True)
-            return
-
-    if server not in guild_servers:
-        await interaction.response.send_message(f"❌ Server '{server}' is not available in this Discord server.", ephemeral=True)
         return
 
     if type.lower() not in ["clear", "rain", "thunder"]:
         await interaction.response.send_message("Invalid weather type. Choose: clear, rain, or thunder.")
         return
 
-    result = rcon_command(server, f"weather {type.lower()}")
-    await interaction.response.send_message(f"[{server}] {result}")
+    async def work():
+        result = await rcon_command(server, f"weather {type.lower()}")
+        return f"[{server}] {result}"
+
+    await execute(interaction, work(), server=server, priority=PRIORITY_ACTION)
 
 
 # Whitelist command group
@@ -196,244 +235,576 @@ whitelist_group = app_commands.Group(name="whitelist", description="Manage the s
     minecraft_username="Minecraft username to whitelist",
     server="Server key (optional if only one server)"
 )
+@app_commands.autocomplete(server=server_autocomplete)
 async def whitelist_add(interaction: discord.Interaction, minecraft_username: str, server: str = None):
-    print(f"whitelist add called with: {minecraft_username}, {server}")
-    guild_id = interaction.guild_id
-    guild_servers = get_guild_servers(guild_id)
-
-    if not guild_servers:
-        await interaction.response.send_message("No servers are configured for this Discord server.", ephemeral=True)
-        return
-
+    server = await resolve_server(interaction, server)
     if server is None:
-        server = get_single_guild_server(guild_id)
-        if server is None:
-            await interaction.response.send_message("Multiple servers are available. Please specify the server.", ephemeral=True)
-            return
-
-    if server not in guild_servers:
-        await interaction.response.send_message(f"❌ Server '{server}' is not available in this Discord server.", ephemeral=True)
         return
 
     discord_user_id = interaction.user.id
-    result = add_player(server, minecraft_username, discord_user_id)
-    await interaction.response.send_message(f"[{server}] {result}")
+
+    async def work():
+        result = await add_player(server, minecraft_username, discord_user_id)
+        return f"[{server}] {result}"
+
+    # Players' own whitelist changes don't jump ahead of everyone else like moderation does
+    priority = PRIORITY_ADMIN if is_admin(interaction.user) else PRIORITY_ACTION
+    await execute(interaction, work(), server=server, priority=priority)
 
 @whitelist_group.command(name="remove", description="Remove a player from the server whitelist")
 @app_commands.describe(
     minecraft_username="Minecraft username to remove",
     server="Server key (optional if only one server)"
 )
+@app_commands.autocomplete(server=server_autocomplete)
 async def whitelist_remove(interaction: discord.Interaction, minecraft_username: str, server: str = None):
-    print(f"whitelist remove called with: {minecraft_username}, {server}")
-    guild_id = interaction.guild_id
-    guild_servers = get_guild_servers(guild_id)
+    server = await resolve_server(interaction, server)
+    if server is None:
+        return
 
-    if not guild_servers:
-        await interaction.response.send_message("No servers are configured for this Discord server.", ephemeral=True)
+    discord_user_id = interaction.user.id
+    user_is_admin = is_admin(interaction.user)
+
+    # Check ownership before touching the server so refusals stay private
+    if not user_manager.can_remove(server, minecraft_username, discord_user_id, user_is_admin):
+        await interaction.response.send_message("❌ You can only remove players that you added yourself.", ephemeral=True)
         return
 
-    if server is None:
-        server = get_single_guild_server(guild_id)
-        if server is None:
-            await interaction.response.send_message("Multiple servers are available. Please specify the server.", ephemeral=True)
+    async def work():
+        result, success = await remove_player(server, minecraft_username, discord_user_id, user_is_admin)
+        return f"[{server}] {result}" if success else f"❌ {result}"
+
+    await execute(interaction, work(), server=server, priority=PRIORITY_ADMIN if user_is_admin else PRIORITY_ACTION)
+
+# Uploaded player lists larger than this are refused
+MAX_PLAYER_FILE_BYTES = 1024 * 1024
+# Failed players listed inline; the attached results file has all of them
+MAX_LISTED_FAILURES = 10
+
+def _progress_reporter(interaction, server, verb):
+    """Edit the deferred response with progress at most every couple of seconds"""
+    last_update = 0.0
+
+    async def report(done, total):
+        nonlocal last_update
+        now = time.monotonic()
+        if done == total or now - last_update < 2.0 or not interaction.response.is_done():
             return
+        last_update = now
+        try:
+            await interaction.edit_original_response(content=f"⏳ [{server}] {verb} {done}/{total} players...")
+        except discord.HTTPException as e:
+            logger.warning("Couldn't update progress", extra={"server": server, "error": str(e)})
+
+    return report
+
+def _results_file(results, filename):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(["username", "result"])
+    writer.writerows((username, strip_colors(reply)) for username, reply in results)
+    return discord.File(io.BytesIO(buffer.getvalue().encode("utf-8")), filename=filename)
+
+def _bulk_summary(server, results, invalid, succeeded, skipped, action):
+    """Summary message for a bulk whitelist change, with a results file when anything failed"""
+    done = [username for username, reply in results if succeeded(reply)]
+    unchanged = [username for username, reply in results if not succeeded(reply) and skipped(reply)]
+    failed = [(username, reply) for username, reply in results if not succeeded(reply) and not skipped(reply)]
+
+    lines = [f"[{server}] {action.capitalize()}: {len(done)} done, {len(unchanged)} unchanged, {len(failed)} failed"]
+    if invalid:
+        lines.append(f"Skipped {len(invalid)} invalid names: {', '.join(invalid[:MAX_LISTED_FAILURES])}"
+                     + (" ..." if len(invalid) > MAX_LISTED_FAILURES else ""))
+    for username, reply in failed[:MAX_LISTED_FAILURES]:
+        lines.append(f"❌ {username}: {strip_colors(reply)}")
+    if len(failed) > MAX_LISTED_FAILURES:
+        lines.append(f"... and {len(failed) - MAX_LISTED_FAILURES} more")
+
+    message = {"content": "\n".join(lines)[:2000]}
+    if failed or invalid:
+        message["file"] = _results_file(results + [(token, "invalid username") for token in invalid],
+                                        f"{server}-whitelist-{action}.csv")
+    return message
+
+async def _read_player_file(file: discord.Attachment):
+    """Download an uploaded player list; returns (usernames, invalid entries) or an error string"""
+    if file.size > MAX_PLAYER_FILE_BYTES:
+        return f"❌ The file is too large (max {MAX_PLAYER_FILE_BYTES // 1024} KB)."
+    data = await file.read()
+    names, invalid = parse_username_file(data.decode("utf-8-sig", errors="replace"))
+    if not names:
+        return "❌ No valid Minecraft usernames found in the file."
+    return names, invalid
+
+@whitelist_group.command(name="import", description="Admin-only: Whitelist every player in a text or CSV file")
+@app_commands.describe(
+    file="Text file with one username per line, or a CSV whose first column is the username",
+    server="Server key (optional if only one server)"
+)
+@app_commands.autocomplete(server=server_autocomplete)
+async def whitelist_import(interaction: discord.Interaction, file: discord.Attachment, server: str = None):
+    if not is_admin(interaction.user):
+        await interaction.response.send_message("❌ You don't have permission to use this.", ephemeral=True)
+        return
 
-    if server not in guild_servers:
-        await interaction.response.send_message(f"❌ Server '{server}' is not available in this Discord server.", ephemeral=True)
+    server = await resolve_server(interaction, server)
+    if server is None:
         return
 
     discord_user_id = interaction.user.id
-    user_is_admin = is_admin(interaction.user)
-    result, success = remove_player(server, minecraft_username, discord_user_id, user_is_admin)
-    
-    if success:
-        await interaction.response.send_message(f"[{server}] {result}")
-    else:
-        await interaction.response.send_message(f"❌ {result}", ephemeral=True)
+
+    async def work():
+        parsed = await _read_player_file(file)
+        if isinstance(parsed, str):
+            return parsed
+        names, invalid = parsed
+        # All adds are pipelined over one pooled connection and recorded in one write
+        results = await add_players(server, names, discord_user_id,
+                                    progress=_progress_reporter(interaction, server, "Whitelisted"))
+        return _bulk_summary(server, results, invalid, is_whitelist_addition, is_already_whitelisted, "import")
+
+    await execute(interaction, work(), timeout=120.0, server=server, priority=PRIORITY_ADMIN)
+
+@whitelist_group.command(name="bulk_remove", description="Admin-only: Remove every player in a text or CSV file")
+@app_commands.describe(
+    file="Text file with one username per line, or a CSV whose first column is the username",
+    server="Server key (optional if only one server)"
+)
+@app_commands.autocomplete(server=server_autocomplete)
+async def whitelist_bulk_remove(interaction: discord.Interaction, file: discord.Attachment, server: str = None):
+    if not is_admin(interaction.user):
+        await interaction.response.send_message("❌ You don't have permission to use this.", ephemeral=True)
+        return
+
+    server = await resolve_server(interaction, server)
+    if server is None:
+        return
+
+    async def work():
+        parsed = await _read_player_file(file)
+        if isinstance(parsed, str):
+            return parsed
+        names, invalid = parsed
+        results = await remove_players(server, names,
+                                       progress=_progress_reporter(interaction, server, "Removed"))
+        # "Player is not whitelisted" counts as removed, so nothing is reported as unchanged
+        return _bulk_summary(server, results, invalid, is_whitelist_removal, lambda reply: False, "remove")
+
+    await execute(interaction, work(), timeout=120.0, server=server, priority=PRIORITY_ADMIN)
+
+@whitelist_group.command(name="export", description="Admin-only: Download the whitelist as CSV")
+@app_commands.describe(server="Server key (optional if only one server)")
+@app_commands.autocomplete(server=server_autocomplete)
+async def whitelist_export(interaction: discord.Interaction, server: str = None):
+    if not is_admin(interaction.user):
+        await interaction.response.send_message("❌ You don't have permission to use this.", ephemeral=True)
+        return
+
+    server = await resolve_server(interaction, server)
+    if server is None:
+        return
+
+    async def work():
+        reply = await rcon_command(server, "whitelist list")
+        names = parse_whitelist(reply)
+        if names is None:
+            return f"❌ [{server}] Couldn't read the whitelist: {strip_colors(reply)}"
+
+        owners = user_manager.get_owners(server)
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(["username", "added_by"])
+        writer.writerows((name, owners.get(name.lower(), "")) for name in sorted(names, key=str.lower))
+        # The file can be fed straight back into /whitelist import
+        return {
+            "content": f"[{server}] {len(names)} whitelisted players",
+            "file": discord.File(io.BytesIO(buffer.getvalue().encode("utf-8")), filename=f"{server}-whitelist.csv"),
+        }
+
+    await execute(interaction, work(), server=server, priority=PRIORITY_ADMIN, ephemeral=True)
+
+@whitelist_group.command(name="sync", description="Admin-only: Sync the bot's records with the server whitelist")
+@app_commands.describe(server="Server key (optional if only one server)")
+@app_commands.autocomplete(server=server_autocomplete)
+async def whitelist_sync(interaction: discord.Interaction, server: str = None):
+    if not is_admin(interaction.user):
+        await interaction.response.send_message("❌ You don't have permission to use this.", ephemeral=True)
+        return
+
+    server = await resolve_server(interaction, server)
+    if server is None:
+        return
+
+    async def work():
+        delta = await reconcile_whitelist(server)
+        if delta is None:
+            return f"❌ [{server}] Couldn't read the whitelist, try again later."
+        added, removed = delta
+        if not added and not removed:
+            return f"[{server}] Records already match the whitelist."
+        lines = [f"[{server}] Synced: {len(added)} found on the server, {len(removed)} no longer whitelisted"]
+        if added:
+            lines.append("Found: " + ", ".join(added[:MAX_LISTED_FAILURES]) + (" ..." if len(added) > MAX_LISTED_FAILURES else ""))
+        if removed:
+            lines.append("Gone: " + ", ".join(removed[:MAX_LISTED_FAILURES]) + (" ..." if len(removed) > MAX_LISTED_FAILURES else ""))
+        return "\n".join(lines)
+
+    await execute(interaction, work(), server=server, priority=PRIORITY_ADMIN, ephemeral=True)
 
 # Add the whitelist command group to the bot
 tree.add_command(whitelist_group)
 
 
+# Relay command group
+relay_group = app_commands.Group(name="relay", description="Live server chat and events in a channel")
+
+@relay_group.command(name="set", description="Admin-only: Relay a server's chat, joins and deaths to a channel")
+@app_commands.describe(channel="Channel to post to", server="Server key (optional if only one server)")
+@app_commands.autocomplete(server=server_autocomplete)
+async def relay_set(interaction: discord.Interaction, channel: discord.TextChannel, server: str = None):
+    if not is_admin(interaction.user):
+        await interaction.response.send_message("❌ You don't have permission to use this.", ephemeral=True)
+        return
+
+    server = await resolve_server(interaction, server)
+    if server is None:
+        return
+
+    set_relay_channel(server, interaction.guild_id, channel.id)
+    # The log path can only be set in servers.json, so Discord admins can't make the bot read arbitrary files
+    source = "its log file" if get_guild_servers(interaction.guild_id)[server].get("log_path") else "player list changes"
+    await interaction.response.send_message(f"✅ [{server}] Relaying {source} to {channel.mention}.", ephemeral=True)
+
+@relay_group.command(name="off", description="Admin-only: Stop relaying a server to this Discord server")
+@app_commands.describe(server="Server key (optional if only one server)")
+@app_commands.autocomplete(server=server_autocomplete)
+async def relay_off(interaction: discord.Interaction, server: str = None):
+    if not is_admin(interaction.user):
+        await interaction.response.send_message("❌ You don't have permission to use this.", ephemeral=True)
+        return
+
+    server = await resolve_server(interaction, server)
+    if server is None:
+        return
+
+    set_relay_channel(server, interaction.guild_id, None)
+    await interaction.response.send_message(f"✅ [{server}] Relay to this Discord server stopped.", ephemeral=True)
+
+tree.add_command(relay_group)
+
+
+# Warnings sent before a scheduled restart, in minutes before it
+RESTART_WARNINGS = (10, 5, 1)
+# Commands a broadcast may chain after its message, separated by this
+COMMAND_SEPARATOR = ";"
+
+def _delivery_report(replies):
+    errors = [reply for reply in replies if reply.startswith("Error:")]
+    if errors:
+        return f"❌ {errors[0]}"
+    # "say" answers with nothing; show what the other commands said
+    output = [strip_colors(reply) for reply in replies if reply.strip()]
+    return "✅ Delivered" + (f"\n{' / '.join(output)}" if output else "")
+
+@tree.command(name="broadcast", description="Admin-only: Send a message (and commands) to several servers at once")
+@app_commands.describe(
+    message="Message to broadcast with /say",
+    servers="\"all\" (default) or comma-separated server keys",
+    commands="Optional RCON commands to run after the message, separated by ;"
+)
+async def broadcast_command(interaction: discord.Interaction, message: str, servers: str = "all", commands: str = None):
+    if not is_admin(interaction.user):
+        await interaction.response.send_message("❌ You don't have permission to use this.", ephemeral=True)
+        return
+
+    server_keys = await resolve_server_list(interaction, servers)
+    if server_keys is None:
+        return
+
+    sequence = [f"say {message}"]
+    if commands:
+        sequence += [command.strip() for command in commands.split(COMMAND_SEPARATOR) if command.strip()]
+
+    async def deliver(server):
+        # The whole sequence goes over one pooled connection; every server runs at the same time
+        return _delivery_report(await rcon_batch(server, sequence))
+
+    await execute_all(interaction, server_keys, deliver, "Broadcast", discord.Color.blue(), priority=PRIORITY_ADMIN)
+
+# Announcement command group
+announce_group = app_commands.Group(name="announce", description="Scheduled announcements")
+
+def _announcement_line(announcement):
+    servers = ", ".join(announcement.servers)
+    repeat = f", every {announcement.repeat / 60:g} min" if announcement.repeat else ""
+    return f"`#{announcement.id}` <t:{int(announcement.next_run)}:R>{repeat} on {servers}: {announcement.message}"
+
+@announce_group.command(name="add", description="Admin-only: Schedule a delayed or recurring announcement")
+@app_commands.describe(
+    message="Message to broadcast",
+    minutes="Minutes from now until it's sent",
+    repeat_minutes="Send it again every this many minutes (optional)",
+    servers="\"all\" (default) or comma-separated server keys"
+)
+async def announce_add(interaction: discord.Interaction, message: str, minutes: app_commands.Range[float, 0, 40320],
+                       repeat_minutes: app_commands.Range[float, 1, 40320] = None, servers: str = "all"):
+    if not is_admin(interaction.user):
+        await interaction.response.send_message("❌ You don't have permission to use this.", ephemeral=True)
+        return
+
+    server_keys = await resolve_server_list(interaction, servers)
+    if server_keys is None:
+        return
+    # "all" is stored as such, so servers added later are included
+    stored = ["all"] if servers.strip().lower() == "all" else server_keys
+    announcement = announcement_scheduler.add(interaction.guild_id, stored, message, minutes * 60,
+                                              repeat=(repeat_minutes or 0) * 60, created_by=interaction.user.id)
+    await interaction.response.send_message(f"✅ Scheduled {_announcement_line(announcement)}", ephemeral=True)
+
+@announce_group.command(name="restart", description="Admin-only: Warn players of a restart at T-10, T-5 and T-1 minutes")
+@app_commands.describe(
+    minutes="Minutes until the restart",
+    servers="\"all\" (default) or comma-separated server keys"
+)
+async def announce_restart(interaction: discord.Interaction, minutes: app_commands.Range[int, 1, 1440], servers: str = "all"):
+    if not is_admin(interaction.user):
+        await interaction.response.send_message("❌ You don't have permission to use this.", ephemeral=True)
+        return
+
+    server_keys = await resolve_server_list(interaction, servers)
+    if server_keys is None:
+        return
+    stored = ["all"] if servers.strip().lower() == "all" else server_keys
+
+    # Warn now, then at each standard mark that's still ahead
+    warnings = sorted({minutes} | {mark for mark in RESTART_WARNINGS if mark < minutes}, reverse=True)
+    lines = []
+    for left in warnings:
+        unit = "minute" if left == 1 else "minutes"
+        announcement = announcement_scheduler.add(interaction.guild_id, stored, f"Server restarting in {left} {unit}!",
+                                                  (minutes - left) * 60, created_by=interaction.user.id)
+        lines.append(_announcement_line(announcement))
+    await interaction.response.send_message("✅ Restart warnings scheduled:\n" + "\n".join(lines), ephemeral=True)
+
+@announce_group.command(name="list", description="Admin-only: List scheduled announcements")
+async def announce_list(interaction: discord.Interaction):
+    if not is_admin(interaction.user):
+        await interaction.response.send_message("❌ You don't have permission to use this.", ephemeral=True)
+        return
+
+    announcements = announcement_scheduler.list(interaction.guild_id)
+    if not announcements:
+        await interaction.response.send_message("No announcements are scheduled.", ephemeral=True)
+        return
+    text = "\n".join(_announcement_line(announcement) for announcement in announcements)
+    await interaction.response.send_message(text[:2000], ephemeral=True)
+
+@announce_group.command(name="cancel", description="Admin-only: Cancel a scheduled announcement")
+@app_commands.describe(announcement_id="Number shown by /announce list")
+async def announce_cancel(interaction: discord.Interaction, announcement_id: int):
+    if not is_admin(interaction.user):
+        await interaction.response.send_message("❌ You don't have permission to use this.", ephemeral=True)
+        return
+
+    if announcement_scheduler.cancel(interaction.guild_id, announcement_id):
+        await interaction.response.send_message(f"✅ Cancelled announcement #{announcement_id}.", ephemeral=True)
+    else:
+        await interaction.response.send_message(f"❌ No announcement #{announcement_id} here.", ephemeral=True)
+
+tree.add_command(announce_group)
+
+
 # --- Admin-only Commands ---
 
 @tree.command(name="custom", description="Admin-only: Run custom RCON command")
 @app_commands.describe(server="Server key", command="Raw RCON command to send")
+@app_commands.autocomplete(server=server_autocomplete)
 async def custom(interaction: discord.Interaction, server: str, command: str):
-    print(f"custom called with: {server}, {command}")
     if not is_admin(interaction.user):
         await interaction.response.send_message("❌ You don't have permission to use this.", ephemeral=True)
         return
 
-    guild_id = interaction.guild_id
-    guild_servers = get_guild_servers(guild_id)
-
-    if server not in guild_servers:
-        await interaction.response.send_message(f"❌ Server '{server}' is not available in this Discord server.",
-                                                ephemeral=True)
+    server = await resolve_server(interaction, server)
+    if server is None:
         return
 
-    result = rcon_command(server, command)
-    await interaction.response.send_message(f"[{server}] {result}")
+    async def work():
+        result = await rcon_command(server, command)
+        if command.strip().lower().startswith("whitelist"):
+            # Keep the ownership records in step with hand-made whitelist changes
+            whitelist_reconciler.request(server)
+        # Plugin dumps and long lists can run to many RCON packets and past Discord's message limit
+        return long_text(f"[{server}] {result}", f"{server}-output.txt")
+
+    # Admin diagnostics can legitimately take a while
+    await execute(interaction, work(), timeout=30.0, server=server, priority=PRIORITY_ADMIN)
 
 # --- Status Commands ---
 
+async def _server_status(server):
+    """Version and player count for a server, and the snapshot they came from (None if asked live)"""
+    snapshot = get_snapshot(server)
+    if snapshot is not None and snapshot.version is not None and snapshot.players is not None:
+        return snapshot.version, snapshot.players, snapshot
+    # Get version information and player count in one round trip
+    version_info, player_count = await rcon_batch(server, ["version", "list"])
+    return version_info, player_count, None
+
 @tree.command(name="status", description="Get server status information")
-@app_commands.describe(server="Server key from servers.json (optional if only one server)")
+@app_commands.describe(server="Server key from servers.json, or \"all\" (optional if only one server)")
+@app_commands.autocomplete(server=server_or_all_autocomplete)
 async def status(interaction: discord.Interaction, server: str = None):
-    print(f"status called with: {server}")
-    guild_id = interaction.guild_id
-    guild_servers = get_guild_servers(guild_id)
+    servers = await resolve_servers(interaction, server)
+    if servers is None:
+        return
 
-    if not guild_servers:
-        await interaction.response.send_message("No servers are configured for this Discord server.", ephemeral=True)
+    if len(servers) > 1:
+        async def summarize(server):
+            version_info, player_count, _ = await _server_status(server)
+            if version_info.startswith("Error:"):
+                # Both replies carry the same error when the server can't be reached
+                return f"❌ {version_info}"
+            player_list = parse_list(player_count)
+            if player_list is not None:
+                player_count = f"{player_list.online}/{player_list.max} online"
+            return f"{strip_colors(version_info)}\n{strip_colors(player_count)}"
+
+        await execute_all(interaction, servers, summarize, "Status of all servers", discord.Color.blue())
         return
 
-    if server is None:
-        server = get_single_guild_server(guild_id)
-        if server is None:
-            await interaction.response.send_message("Multiple servers are available. Please specify the server.", ephemeral=True)
-            return
+    server = servers[0]
 
-    if server not in guild_servers:
-        await interaction.response.send_message(f"❌ Server '{server}' is not available in this Discord server.", ephemeral=True)
-        return
+    async def work():
+        version_info, player_count, snapshot = await _server_status(server)
 
-    # Get version information
-    version_info = rcon_command(server, "version")
-    
-    # Get player count
-    player_count = rcon_command(server, "list")
-    
-    # Create embed
-    embed = discord.Embed(
-        title=f"{server} - Server Status",
-        color=discord.Color.blue()
-    )
-    
-    embed.add_field(name="Version", value=version_info, inline=False)
-    embed.add_field(name="Players", value=player_count, inline=False)
-    
-    await interaction.response.send_message(embed=embed)
+        # Create embed
+        embed = discord.Embed(
+            title=f"{server} - Server Status",
+            color=discord.Color.blue()
+        )
+
+        player_list = parse_list(player_count)
+        if player_list is not None:
+            # The full reply lists every name, which can overflow an embed field
+            player_count = f"{player_list.online}/{player_list.max} online"
+        embed.add_field(name="Version", value=version_info[:MAX_FIELD_LENGTH], inline=False)
+        embed.add_field(name="Players", value=player_count[:MAX_FIELD_LENGTH], inline=False)
+        if snapshot is not None:
+            embed.set_footer(text=f"Updated {snapshot.age_text()}")
+        return embed
+
+    await execute(interaction, work(), server=server)
 
 @tree.command(name="tps", description="Check server's Ticks Per Second")
-@app_commands.describe(server="Server key from servers.json (optional if only one server)")
+@app_commands.describe(server="Server key from servers.json, or \"all\" (optional if only one server)")
+@app_commands.autocomplete(server=server_or_all_autocomplete)
 async def tps(interaction: discord.Interaction, server: str = None):
-    print(f"tps called with: {server}")
-    guild_id = interaction.guild_id
-    guild_servers = get_guild_servers(guild_id)
+    servers = await resolve_servers(interaction, server)
+    if servers is None:
+        return
 
-    if not guild_servers:
-        await interaction.response.send_message("No servers are configured for this Discord server.", ephemeral=True)
+    if len(servers) > 1:
+        # Every server's history is already in memory, so there is nothing to fan out
+        embed = discord.Embed(title="TPS on all servers", color=discord.Color.green())
+        for server in servers[:MAX_EMBED_FIELDS]:
+            history = get_tps_history(server)
+            if history is None:
+                value = "No samples yet"
+            else:
+                value = (f"Current {format_tps(history.latest())} · 15m {format_tps(history.average(900))}\n"
+                         f"`{history.sparkline()}`")
+            embed.add_field(name=server, value=value, inline=False)
+        await interaction.response.send_message(embed=embed)
         return
 
-    if server is None:
-        server = get_single_guild_server(guild_id)
-        if server is None:
-            await interaction.response.send_message("Multiple servers are available. Please specify the server.", ephemeral=True)
-            return
+    server = servers[0]
 
-    if server not in guild_servers:
-        await interaction.response.send_message(f"❌ Server '{server}' is not available in this Discord server.", ephemeral=True)
+    # TPS is sampled in the background for both Paper and vanilla servers, so this never waits on RCON
+    history = get_tps_history(server)
+    if history is None:
+        await interaction.response.send_message(f"[{server}] No TPS samples yet, try again in a moment.", ephemeral=True)
         return
 
-    # Get TPS information (different commands depending on server type)
-    # Try Spigot/Paper command first
-    result = rcon_command(server, "tps")
-    
-    # If that didn't work, try vanilla command
-    if "Unknown command" in result:
-        result = rcon_command(server, "debug start")
-        # Wait briefly
-        await interaction.response.defer()
-        import asyncio
-        await asyncio.sleep(5)
-        result = rcon_command(server, "debug stop")
-    
     embed = discord.Embed(
         title=f"{server} - TPS Information",
-        description=result,
         color=discord.Color.green()
     )
+    embed.add_field(name="Current", value=format_tps(history.latest()), inline=True)
+    embed.add_field(name="1m", value=format_tps(history.average(60)), inline=True)
+    embed.add_field(name="5m", value=format_tps(history.average(300)), inline=True)
+    embed.add_field(name="15m", value=format_tps(history.average(900)), inline=True)
+    embed.add_field(name="Last 15 minutes", value=f"`{history.sparkline()}`", inline=False)
+    embed.set_footer(text=f"Sampled {int(time.time() - history.latest_time())}s ago")
     
     await interaction.response.send_message(embed=embed)
 
 @tree.command(name="memory", description="Check server memory usage")
 @app_commands.describe(server="Server key from servers.json (optional if only one server)")
+@app_commands.autocomplete(server=server_autocomplete)
 async def memory(interaction: discord.Interaction, server: str = None):
-    print(f"memory called with: {server}")
-    guild_id = interaction.guild_id
-    guild_servers = get_guild_servers(guild_id)
-
-    if not guild_servers:
-        await interaction.response.send_message("No servers are configured for this Discord server.", ephemeral=True)
-        return
-
+    server = await resolve_server(interaction, server)
     if server is None:
-        server = get_single_guild_server(guild_id)
-        if server is None:
-            await interaction.response.send_message("Multiple servers are available. Please specify the server.", ephemeral=True)
-            return
-
-    if server not in guild_servers:
-        await interaction.response.send_message(f"❌ Server '{server}' is not available in this Discord server.", ephemeral=True)
         return
 
-    # Different servers might have different commands for this
-    # Try Paper GC command
-    result = rcon_command(server, "gc")
-    
-    if "Unknown command" in result:
-        # If not Paper/Spigot, fallback to less detailed message
-        result = "Memory information only available on Paper/Spigot servers with GC command enabled."
-    
-    embed = discord.Embed(
-        title=f"{server} - Memory Usage",
-        description=result,
-        color=discord.Color.gold()
-    )
-    
-    await interaction.response.send_message(embed=embed)
+    async def work():
+        # Different servers might have different commands for this
+        # Try Paper GC command, from the poller's snapshot if it has one
+        snapshot = get_snapshot(server)
+        if snapshot is not None and "gc" in snapshot.unsupported:
+            result = None
+        elif snapshot is not None and snapshot.memory is not None:
+            result = snapshot.memory
+        else:
+            snapshot = None
+            result = await rcon_command(server, "gc")
+
+        if result is None or is_unknown_command(result):
+            # If not Paper/Spigot, fallback to less detailed message
+            result = "Memory information only available on Paper/Spigot servers with GC command enabled."
+
+        embed = discord.Embed(
+            title=f"{server} - Memory Usage",
+            color=discord.Color.gold()
+        )
+        reading = parse_gc(result)
+        if reading is None:
+            # An error or an unfamiliar format; shown as is, minus the colour codes
+            embed.description = strip_colors(result)
+        else:
+            for name, value in (("Used", reading.used_mb), ("Allocated", reading.allocated_mb),
+                                ("Maximum", reading.max_mb)):
+                if value is not None:
+                    embed.add_field(name=name, value=f"{value:,} MB", inline=True)
+            if reading.uptime:
+                embed.add_field(name="Uptime", value=reading.uptime, inline=False)
+        if snapshot is not None:
+            embed.set_footer(text=f"Updated {snapshot.age_text()}")
+        return embed
+
+    await execute(interaction, work(), server=server)
 
 @tree.command(name="world", description="Get information about the Minecraft world")
 @app_commands.describe(server="Server key from servers.json (optional if only one server)")
+@app_commands.autocomplete(server=server_autocomplete)
 async def world(interaction: discord.Interaction, server: str = None):
-    print(f"world called with: {server}")
-    guild_id = interaction.guild_id
-    guild_servers = get_guild_servers(guild_id)
-
-    if not guild_servers:
-        await interaction.response.send_message("No servers are configured for this Discord server.", ephemeral=True)
+    server = await resolve_server(interaction, server)
+    if server is None:
         return
 
-    if server is None:
-        server = get_single_guild_server(guild_id)
-        if server is None:
-            await interaction.response.send_message("Multiple servers are available. Please specify the server.", ephemeral=True)
-            return
+    async def work():
+        # Get time, weather and difficulty in one round trip
+        time_info, weather_info, difficulty_info = await rcon_batch(
+            server, ["time query daytime", "weather query", "difficulty"]
+        )
 
-    if server not in guild_servers:
-        await interaction.response.send_message(f"❌ Server '{server}' is not available in this Discord server.", ephemeral=True)
-        return
+        embed = discord.Embed(
+            title=f"{server} - World Information",
+            color=discord.Color.purple()
+        )
 
-    # Get time information
-    time_info = rcon_command(server, "time query daytime")
-    
-    # Get weather information
-    weather_info = rcon_command(server, "weather query")
-    
-    # Get difficulty
-    difficulty_info = rcon_command(server, "difficulty")
-    
-    embed = discord.Embed(
-        title=f"{server} - World Information",
-        color=discord.Color.purple()
-    )
-    
-    embed.add_field(name="Time", value=time_info, inline=False)
-    embed.add_field(name="Weather", value=weather_info, inline=False)
-    embed.add_field(name="Difficulty", value=difficulty_info, inline=False)
-    
-    await interaction.response.send_message(embed=embed)
+        embed.add_field(name="Time", value=strip_colors(time_info), inline=False)
+        embed.add_field(name="Weather", value=strip_colors(weather_info), inline=False)
+        embed.add_field(name="Difficulty", value=strip_colors(difficulty_info), inline=False)
+        return embed
 
+    await execute(interaction, work(), server=server)
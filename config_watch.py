@@ -0,0 +1,150 @@
+import asyncio
+import contextlib
+import json
+import logging
+import os
+
+try:
+    import fcntl
+except ImportError:
+    # No advisory locks (Windows): only run a single bot process there
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+def file_signature(path):
+    """(mtime, size) of a file, or None if it doesn't exist; changes whenever the file is rewritten"""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def validate_servers(data):
+    """Check a parsed servers.json and return it normalised; raises ValueError naming the bad entry"""
+    if not isinstance(data, dict):
+        raise ValueError("top level must be an object of server entries")
+    servers = {}
+    for server_key, entry in data.items():
+        if not isinstance(entry, dict):
+            raise ValueError(f"{server_key}: entry must be an object")
+        missing = [field for field in ("host", "port", "password") if field not in entry]
+        if missing:
+            raise ValueError(f"{server_key}: missing {', '.join(missing)}")
+        try:
+            port = int(entry["port"])
+        except (TypeError, ValueError):
+            raise ValueError(f"{server_key}: port must be a number")
+        if not 0 < port < 65536:
+            raise ValueError(f"{server_key}: port {port} is out of range")
+        allowed_guilds = entry.get("allowed_guilds", [])
+        if not isinstance(allowed_guilds, list) or not all(isinstance(guild, int) for guild in allowed_guilds):
+            raise ValueError(f"{server_key}: allowed_guilds must be a list of guild IDs")
+        relay_channels = entry.get("relay_channels", {})
+        if not isinstance(relay_channels, dict) or not all(
+                guild.isdigit() and isinstance(channel, int) for guild, channel in relay_channels.items()):
+            raise ValueError(f"{server_key}: relay_channels must map guild IDs to channel IDs")
+        if not isinstance(entry.get("log_path", ""), str):
+            raise ValueError(f"{server_key}: log_path must be a path")
+        servers[server_key] = dict(entry, port=port)
+    return servers
+
+
+@contextlib.contextmanager
+def config_lock(path):
+    """Exclusive lock between bot processes for a read-modify-write of a config file"""
+    if fcntl is None:
+        yield
+        return
+    with open(path + ".lock", "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def write_servers_file(path, servers):
+    """Write servers.json atomically, so other processes never read a half-written file"""
+    temp_file = path + ".tmp"
+    with open(temp_file, "w") as f:
+        json.dump(servers, f, indent=4)
+    os.replace(temp_file, path)
+
+
+def read_servers_file(path):
+    """Read, parse and validate servers.json; blocking, so run it in a thread"""
+    signature = file_signature(path)
+    with open(path) as f:
+        return signature, validate_servers(json.load(f))
+
+
+class ConfigWatcher:
+    """Polls servers.json for out-of-band edits and applies them without a restart.
+
+    Only servers whose entries changed are passed to `on_server_changed`, so every other
+    server keeps its connections, cache and health state. When several bot processes share the
+    file, this is also how each one learns about the others' changes.
+    """
+
+    def __init__(self, config_manager, on_server_changed, interval=5.0):
+        self.config_manager = config_manager
+        self.on_server_changed = on_server_changed
+        self.interval = interval
+        self._rejected = None
+        self._task = None
+
+    def start(self):
+        """Start watching; safe to call again on reconnect"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def check(self):
+        """Reload the file if it changed since it was last loaded or saved; returns whether anything changed"""
+        manager = self.config_manager
+        # Other processes' changes picked up while we saved one of our own
+        stale, manager.stale = manager.stale, set()
+        for server_key in stale:
+            await self.on_server_changed(server_key)
+
+        signature = file_signature(manager.SERVERS_FILE)
+        if signature is None or signature == manager.signature or signature == self._rejected:
+            return False
+
+        saves = manager.saves
+        try:
+            # Parsing a large file shouldn't stall every command
+            signature, servers = await asyncio.to_thread(read_servers_file, manager.SERVERS_FILE)
+        except (OSError, ValueError) as e:
+            # Keep serving the last good config until the file is fixed
+            logger.error("ignoring invalid server config", extra={"file": manager.SERVERS_FILE, "error": str(e)})
+            self._rejected = signature
+            return False
+        if manager.saves != saves:
+            # The bot saved its own change meanwhile; applying what we read would undo it
+            return False
+
+        added, removed, changed = manager.apply_config(servers, signature)
+        if added or removed or changed:
+            logger.info("reloaded server config", extra={
+                "file": manager.SERVERS_FILE, "added": sorted(added), "removed": sorted(removed), "changed": sorted(changed),
+            })
+        for server_key in removed | changed:
+            await self.on_server_changed(server_key)
+        return bool(added or removed or changed)
+
+    async def _run(self):
+        while True:
+            try:
+                await self.check()
+            except Exception:
+                logger.exception("error reloading server config")
+            await asyncio.sleep(self.interval)
@@ -0,0 +1,330 @@
+import asyncio
+import datetime
+import difflib
+import io
+import logging
+import discord
+from discord import app_commands
+from helpers import command_scheduler, get_guild_servers, get_server_hint, get_single_guild_server, is_admin
+from scheduler import PRIORITY_STATUS, SchedulerBusy
+from startup import startup
+
+logger = logging.getLogger(__name__)
+
+# Discord fails the interaction if it isn't acknowledged within 3 seconds
+ACK_DEADLINE = 3.0
+# Work that finishes this quickly is answered directly instead of deferring first
+ANSWER_DIRECTLY_WITHIN = 1.0
+# Interaction tokens (and with them followups) expire after 15 minutes
+TOKEN_LIFETIME = datetime.timedelta(minutes=15)
+DEFAULT_TIMEOUT = 10.0
+# Server argument that targets every server of the guild
+ALL_SERVERS = "all"
+# How long a fanned-out command waits for the slowest server before answering with what it has
+FAN_OUT_DEADLINE = 8.0
+# Discord's limits for one embed
+MAX_EMBED_FIELDS = 25
+MAX_FIELD_LENGTH = 1024
+MAX_MESSAGE_LENGTH = 2000
+# Longer output is attached as a file instead of being sent as this many messages
+MAX_PAGES = 3
+
+async def resolve_server(interaction: discord.Interaction, server):
+    """Work out which server a command targets, replying with an error and returning None if there isn't one"""
+    guild_id = interaction.guild_id
+    guild_servers = get_guild_servers(guild_id)
+
+    if not guild_servers:
+        await interaction.response.send_message("No servers are configured for this Discord server.", ephemeral=True)
+        return None
+
+    if server is None:
+        server = get_single_guild_server(guild_id)
+        if server is None:
+            await interaction.response.send_message("Multiple servers are available. Please specify the server.", ephemeral=True)
+            return None
+
+    if server not in guild_servers:
+        message = f"❌ Server '{server}' is not available in this Discord server."
+        close = difflib.get_close_matches(server, list(guild_servers), n=1)
+        if close:
+            message += f" Did you mean `{close[0]}`?"
+        await interaction.response.send_message(message, ephemeral=True)
+        return None
+
+    # The latency metrics are labelled with the resolved key, never with whatever was typed
+    interaction.extras["server"] = server
+    return server
+
+
+async def resolve_servers(interaction: discord.Interaction, server):
+    """Like resolve_server, but `all` (unless a server is actually called that) targets every server of the guild"""
+    if server is not None and server.lower() == ALL_SERVERS:
+        guild_servers = get_guild_servers(interaction.guild_id)
+        if server not in guild_servers:
+            if not guild_servers:
+                await interaction.response.send_message("No servers are configured for this Discord server.", ephemeral=True)
+                return None
+            interaction.extras["server"] = ALL_SERVERS
+            return list(guild_servers)
+    server = await resolve_server(interaction, server)
+    return None if server is None else [server]
+
+
+async def resolve_server_list(interaction: discord.Interaction, servers):
+    """Resolve "all" or a comma-separated list of server keys, replying with an error and returning None if any is unknown"""
+    guild_servers = get_guild_servers(interaction.guild_id)
+    if not guild_servers:
+        await interaction.response.send_message("No servers are configured for this Discord server.", ephemeral=True)
+        return None
+    if servers.strip().lower() == ALL_SERVERS and ALL_SERVERS not in guild_servers:
+        interaction.extras["server"] = ALL_SERVERS
+        return list(guild_servers)
+
+    keys = list(dict.fromkeys(key.strip() for key in servers.split(",") if key.strip()))
+    unknown = [key for key in keys if key not in guild_servers]
+    if unknown or not keys:
+        await interaction.response.send_message(
+            f"❌ Unknown servers: {', '.join(unknown) or servers}. Use `all` or a comma-separated list of: "
+            f"{', '.join(guild_servers)}", ephemeral=True)
+        return None
+    interaction.extras["server"] = keys[0] if len(keys) == 1 else "several"
+    return keys
+
+
+# Discord shows at most this many autocomplete choices
+MAX_CHOICES = 25
+
+
+def _match_rank(server, current):
+    """Sort key for how well a server key matches what was typed, or None if it doesn't"""
+    key = server.lower()
+    if key.startswith(current):
+        return (0, key)
+    if current in key:
+        return (1, key)
+    ratio = difflib.SequenceMatcher(None, current, key).ratio()
+    if ratio >= 0.5:
+        # Typos: closer matches first
+        return (2, -ratio, key)
+    return None
+
+
+def _server_choices(interaction, current, include_all):
+    # Only in-memory lookups here: Discord drops autocomplete answers after 3 seconds
+    if not startup.stores_loaded.is_set():
+        # Autocomplete skips interaction_check; loading servers.json here would block the event loop
+        return []
+    guild_servers = get_guild_servers(interaction.guild_id)
+    current = current.strip().lower()
+    ranked = []
+    for server in guild_servers:
+        rank = _match_rank(server, current) if current else (0, server.lower())
+        if rank is not None:
+            ranked.append((rank, server))
+    ranked.sort()
+
+    choices = []
+    if include_all and len(guild_servers) > 1 and ALL_SERVERS.startswith(current):
+        choices.append(app_commands.Choice(name=f"{ALL_SERVERS} ({len(guild_servers)} servers)", value=ALL_SERVERS))
+    for _, server in ranked[:MAX_CHOICES - len(choices)]:
+        choices.append(app_commands.Choice(name=f"{server} · {get_server_hint(server)}"[:100], value=server))
+    return choices
+
+
+async def server_autocomplete(interaction: discord.Interaction, current: str):
+    """Suggest the guild's server keys, with their health and player count"""
+    return _server_choices(interaction, current, include_all=False)
+
+
+async def server_or_all_autocomplete(interaction: discord.Interaction, current: str):
+    """Like server_autocomplete, plus `all` for commands that can fan out"""
+    return _server_choices(interaction, current, include_all=True)
+
+
+def _token_time_left(interaction):
+    expires = interaction.created_at + TOKEN_LIFETIME
+    return (expires - discord.utils.utcnow()).total_seconds()
+
+
+def split_pages(text, size=MAX_MESSAGE_LENGTH):
+    """Split text into message-sized pages, preferring line breaks, then spaces"""
+    pages = []
+    while len(text) > size:
+        cut = text.rfind("\n", 0, size)
+        if cut <= 0:
+            cut = text.rfind(" ", 0, size)
+        if cut <= 0:
+            cut = size
+        pages.append(text[:cut])
+        text = text[cut:].lstrip("\n ")
+    pages.append(text)
+    return pages
+
+
+def long_text(text, filename):
+    """Fit command output into Discord: one message, a few pages, or an attached file"""
+    if len(text) <= MAX_MESSAGE_LENGTH:
+        return text
+    pages = split_pages(text)
+    if len(pages) <= MAX_PAGES:
+        return pages
+    return {
+        "content": f"📄 The output is {len(text):,} characters long, so it's attached as a file.",
+        "file": discord.File(io.BytesIO(text.encode("utf-8")), filename=filename),
+    }
+
+
+def _as_message(result):
+    if isinstance(result, dict):
+        # Already message keyword arguments, e.g. content plus an attached file
+        return result
+    if isinstance(result, discord.Embed):
+        return {"embed": result}
+    return {"content": result}
+
+
+async def execute(interaction: discord.Interaction, work, server=None, priority=PRIORITY_STATUS,
+                  timeout=DEFAULT_TIMEOUT, ephemeral=False):
+    """Run a command's slow work and deliver its result without missing Discord's acknowledgement window.
+
+    `work` is a coroutine returning a message string, an Embed, a dict of message arguments,
+    or a list of those to send as consecutive messages.
+    When a server is given, the work first passes that server's admission control (rate limits
+    apply to everyone but admins) and waits its turn in the given priority lane.
+    Quick results are sent as the response; otherwise the interaction is deferred and the result
+    arrives as a followup. The work is cancelled after `timeout` seconds or when the interaction
+    token is about to expire.
+    """
+    label = f"[{server}] " if server else ""
+    timeout = min(timeout, _token_time_left(interaction) - 5.0)
+    if timeout <= 0:
+        work.close()
+        return
+
+    if server is not None:
+        try:
+            ticket = command_scheduler.admit(server, priority, interaction.user.id, interaction.guild_id,
+                                             exempt=bool(is_admin(interaction.user)))
+        except SchedulerBusy as e:
+            work.close()
+            await interaction.response.send_message(str(e), ephemeral=True)
+            return
+        work = _run_when_admitted(ticket, work)
+
+    task = asyncio.ensure_future(work)
+
+    # Give fast work (cache hits, snapshots) the chance to answer in a single message
+    grace = max(min(ANSWER_DIRECTLY_WITHIN, ACK_DEADLINE - _elapsed(interaction), timeout), 0)
+    done, _ = await asyncio.wait({task}, timeout=grace)
+    if done:
+        await _deliver(interaction, _result(task, label), ephemeral, respond=True)
+        return
+
+    await interaction.response.defer(ephemeral=ephemeral, thinking=True)
+    done, _ = await asyncio.wait({task}, timeout=timeout - grace)
+    if not done:
+        task.cancel()
+        message = f"⏱️ {label}The server didn't answer within {timeout:.0f} seconds."
+    else:
+        message = _result(task, label)
+
+    if _token_time_left(interaction) <= 0:
+        # Nobody can see a followup on an expired token
+        return
+    await _deliver(interaction, message, ephemeral, respond=False)
+
+
+async def _deliver(interaction, result, ephemeral, respond):
+    """Send a result as the interaction response (or first followup), extra pages as further followups"""
+    pages = result if isinstance(result, list) else [result]
+    for i, page in enumerate(pages):
+        if i == 0 and respond:
+            await interaction.response.send_message(ephemeral=ephemeral, **_as_message(page))
+        else:
+            await interaction.followup.send(ephemeral=ephemeral, **_as_message(page))
+
+
+async def _run_when_admitted(ticket, work):
+    try:
+        await ticket.wait()
+    except BaseException:
+        # Cancelled while queued: the work never started
+        ticket.release()
+        work.close()
+        raise
+    try:
+        return await work
+    finally:
+        ticket.release()
+
+
+def _elapsed(interaction):
+    return (discord.utils.utcnow() - interaction.created_at).total_seconds()
+
+
+def _result(task, label):
+    error = task.exception()
+    if error is not None:
+        logger.error("command failed", exc_info=error)
+        return f"❌ {label}Something went wrong: {error}"
+    return task.result()
+
+
+async def execute_all(interaction: discord.Interaction, servers, work, title, color, priority=PRIORITY_STATUS,
+                      deadline=FAN_OUT_DEADLINE):
+    """Run `work(server)` on every server at once and answer with one embed, a field per server.
+
+    `work` returns the text for its server's field. Servers that fail, are busy or miss the
+    deadline get an explanation in their field instead, so the slowest server bounds the total
+    time and never hides the others' results.
+    """
+    if _token_time_left(interaction) - 5.0 <= 0:
+        return
+    try:
+        admitted = command_scheduler.admit_many(servers, priority, interaction.user.id, interaction.guild_id,
+                                                exempt=bool(is_admin(interaction.user)))
+    except SchedulerBusy as e:
+        await interaction.response.send_message(str(e), ephemeral=True)
+        return
+
+    async def fan_out():
+        tasks = {}
+        results = {}
+        for server, ticket in admitted.items():
+            if isinstance(ticket, SchedulerBusy):
+                results[server] = str(ticket)
+            else:
+                tasks[server] = asyncio.ensure_future(_run_when_admitted(ticket, work(server)))
+        try:
+            if tasks:
+                await asyncio.wait(tasks.values(), timeout=deadline)
+        finally:
+            for task in tasks.values():
+                task.cancel()
+
+        answered = 0
+        for server, task in tasks.items():
+            if not task.done() or task.cancelled():
+                results[server] = f"⏱️ No answer within {deadline:.0f} seconds"
+            elif task.exception() is not None:
+                logger.error("command failed", extra={"server": server}, exc_info=task.exception())
+                results[server] = f"❌ Something went wrong: {task.exception()}"
+            else:
+                results[server] = task.result()
+                answered += 1
+
+        embed = discord.Embed(title=title, color=color)
+        for server in servers[:MAX_EMBED_FIELDS]:
+            value = results[server] or "\u200b"
+            if len(value) > MAX_FIELD_LENGTH:
+                value = value[:MAX_FIELD_LENGTH - 1] + "…"
+            embed.add_field(name=server, value=value, inline=False)
+        footer = f"{answered} of {len(servers)} servers answered"
+        if len(servers) > MAX_EMBED_FIELDS:
+            footer += f" (showing the first {MAX_EMBED_FIELDS})"
+        embed.set_footer(text=footer)
+        return embed
+
+    # The fan-out enforces its own deadline; the margin just leaves room to build the reply
+    await execute(interaction, fan_out(), timeout=deadline + 2.0)
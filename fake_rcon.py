@@ -0,0 +1,166 @@
+# Stand-in Minecraft RCON server for benchmarks and local testing.
+# Run it on its own with:  python fake_rcon.py --port 25575 --password secret --latency 0.05
+import argparse
+import asyncio
+import random
+import struct
+
+from rcon import SERVERDATA_AUTH, SERVERDATA_AUTH_RESPONSE, SERVERDATA_EXECCOMMAND, SERVERDATA_RESPONSE_VALUE
+
+# Minecraft splits replies into packets of at most this many body bytes
+MAX_RESPONSE_BODY = 4096
+# Vanilla's RconClient reads the socket in chunks of at most this many bytes
+VANILLA_READ_SIZE = 1460
+
+DEFAULT_RESPONSES = {
+    "list": "There are 2 of a max of 20 players online: Steve, Alex",
+    "version": "This server is running Paper version git-Paper-196 (MC: 1.20.1) "
+               "(Implementing API version 1.20.1-R0.1-SNAPSHOT)",
+    "tps": "§6TPS from last 1m, 5m, 15m: §a20.0, §a20.0, §a19.98",
+    "gc": "§6Uptime: 2 hours 4 minutes\n§6Maximum memory: 4,096 MB.\n"
+          "§6Allocated memory: 2,048 MB.\n§6Free memory: 1,024 MB.",
+    "time query daytime": "The time is 6000",
+    "weather query": "The weather is clear",
+    "difficulty": "The difficulty is Normal",
+    "debug start": "Started debug profiling",
+    "debug stop": "Stopped tick profiling after 5.00 seconds and 100 ticks (20.00 ticks per second)",
+}
+
+
+class FakeRconServer:
+    """Asyncio server speaking the Source RCON protocol with configurable latency and failures"""
+
+    def __init__(self, password="password", host="127.0.0.1", port=0, latency=0.0, jitter=0.0,
+                 failure_rate=0.0, responses=None, seed=None, vanilla=False):
+        self.password = password
+        # Read like vanilla/Spigot: one socket read per packet, dropping the client if a read holds
+        # anything but exactly one packet (so pipelined packets get the connection closed)
+        self.vanilla = vanilla
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.responses = dict(DEFAULT_RESPONSES if responses is None else responses)
+        self.whitelist = set()
+        self.commands_received = 0
+        self.connections_opened = 0
+        self._random = random.Random(seed)
+        self._server = None
+        self._handlers = set()
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            for handler in list(self._handlers):
+                handler.cancel()
+            await asyncio.gather(*self._handlers, return_exceptions=True)
+            await self._server.wait_closed()
+            self._server = None
+
+    def respond(self, command):
+        """Build the reply text for a command"""
+        name, _, argument = command.partition(" ")
+        if name == "say":
+            return ""
+        if name == "whitelist":
+            action, _, player = argument.partition(" ")
+            if action == "add":
+                if player in self.whitelist:
+                    return "Player is already whitelisted"
+                self.whitelist.add(player)
+                return f"Added {player} to the whitelist"
+            if action == "remove":
+                if player not in self.whitelist:
+                    return "Player is not whitelisted"
+                self.whitelist.discard(player)
+                return f"Removed {player} from the whitelist"
+            if action == "list":
+                if not self.whitelist:
+                    return "There are no whitelisted players"
+                return f"There are {len(self.whitelist)} whitelisted player(s): {', '.join(sorted(self.whitelist))}"
+        if name == "weather" and argument in ("clear", "rain", "thunder"):
+            return f"Set the weather to {argument}"
+        if command in self.responses:
+            return self.responses[command]
+        return f"Unknown or incomplete command, see below for error\n{command}<--[HERE]"
+
+    async def _delay(self):
+        delay = self.latency + self._random.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def _handle(self, reader, writer):
+        self.connections_opened += 1
+        self._handlers.add(asyncio.current_task())
+        authenticated = False
+
+        def send(request_id, packet_type, payload=b""):
+            writer.write(struct.pack("<iii", len(payload) + 10, request_id, packet_type) + payload + b"\x00\x00")
+
+        try:
+            while True:
+                if self.vanilla:
+                    chunk = await reader.read(VANILLA_READ_SIZE)
+                    if len(chunk) < 14:
+                        break
+                    (length,) = struct.unpack_from("<i", chunk)
+                    if length != len(chunk) - 4:
+                        break
+                    data = chunk[4:]
+                else:
+                    (length,) = struct.unpack("<i", await reader.readexactly(4))
+                    data = await reader.readexactly(length)
+                request_id, packet_type = struct.unpack_from("<ii", data)
+                body = data[8:-2].decode("utf-8")
+
+                if packet_type == SERVERDATA_AUTH:
+                    authenticated = body == self.password
+                    send(request_id if authenticated else -1, SERVERDATA_AUTH_RESPONSE)
+                elif not authenticated:
+                    break
+                elif packet_type == SERVERDATA_EXECCOMMAND:
+                    self.commands_received += 1
+                    await self._delay()
+                    if self._random.random() < self.failure_rate:
+                        # Simulate a crash mid-request
+                        break
+                    payload = self.respond(body).encode("utf-8")
+                    # Like Minecraft, long replies span several packets with the same request ID
+                    for start in range(0, max(len(payload), 1), MAX_RESPONSE_BODY):
+                        send(request_id, SERVERDATA_RESPONSE_VALUE, payload[start:start + MAX_RESPONSE_BODY])
+                else:
+                    # Minecraft answers unknown packet types with this; clients use it as a sentinel
+                    send(request_id, SERVERDATA_RESPONSE_VALUE, f"Unknown request {packet_type:x}".encode("utf-8"))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self._handlers.discard(asyncio.current_task())
+            writer.close()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Run a fake Minecraft RCON server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=25575)
+    parser.add_argument("--password", default="password")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every command")
+    parser.add_argument("--jitter", type=float, default=0.0, help="random +/- seconds on top of latency")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="chance of dropping the connection")
+    parser.add_argument("--vanilla", action="store_true", help="read packets like a vanilla server")
+    args = parser.parse_args()
+
+    server = await FakeRconServer(args.password, args.host, args.port, args.latency, args.jitter,
+                                  args.failure_rate, vanilla=args.vanilla).start()
+    print(f"Fake RCON server listening on {server.host}:{server.port}")
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
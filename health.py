@@ -0,0 +1,106 @@
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class ServerHealth:
+    """Circuit breaker state for one server"""
+
+    __slots__ = ("state", "failures", "offline_since", "last_error", "next_probe", "backoff", "probing")
+
+    def __init__(self):
+        self.state = CLOSED
+        self.failures = 0
+        self.offline_since = None
+        self.last_error = None
+        self.next_probe = 0.0
+        self.backoff = 0.0
+        self.probing = False
+
+
+class HealthTracker:
+    """Per-server circuit breakers so requests to a dead server fail fast instead of waiting on timeouts"""
+
+    def __init__(self, failure_threshold=3, base_backoff=5.0, max_backoff=300.0):
+        self.failure_threshold = failure_threshold
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self._servers = {}
+
+    def get(self, server_key):
+        health = self._servers.get(server_key)
+        if health is None:
+            health = self._servers[server_key] = ServerHealth()
+        return health
+
+    def allow(self, server_key):
+        """Whether a request may go to the server; lets a single probe through once the backoff expires"""
+        health = self.get(server_key)
+        if health.state == CLOSED:
+            return True
+        if health.state == OPEN and time.monotonic() >= health.next_probe:
+            health.state = HALF_OPEN
+            health.probing = True
+            return True
+        return False
+
+    def record_success(self, server_key):
+        health = self.get(server_key)
+        if health.state != CLOSED:
+            logger.info("server reachable again", extra={"server": server_key})
+        health.state = CLOSED
+        health.failures = 0
+        health.offline_since = None
+        health.last_error = None
+        health.backoff = 0.0
+        health.probing = False
+
+    def record_failure(self, server_key, error):
+        health = self.get(server_key)
+        health.failures += 1
+        health.last_error = str(error) or type(error).__name__
+        if health.offline_since is None:
+            health.offline_since = time.time()
+
+        if health.state == HALF_OPEN:
+            # The probe failed: stay open and wait twice as long before the next one
+            health.backoff = min(health.backoff * 2, self.max_backoff)
+        elif health.state == CLOSED and health.failures >= self.failure_threshold:
+            logger.warning("server marked offline", extra={
+                "server": server_key, "failures": health.failures, "error": health.last_error,
+            })
+            health.backoff = self.base_backoff
+        else:
+            return
+        health.state = OPEN
+        health.probing = False
+        health.next_probe = time.monotonic() + health.backoff
+
+    def release_probe(self, server_key):
+        """Reopen the circuit if a probe finished without a verdict"""
+        health = self.get(server_key)
+        if health.state == HALF_OPEN:
+            health.state = OPEN
+            health.probing = False
+
+    def offline_since_text(self, server_key):
+        """When the server went offline, as a Discord relative timestamp"""
+        health = self.get(server_key)
+        return f"<t:{int(health.offline_since)}:R>" if health.offline_since else "recently"
+
+    def offline_message(self, server_key):
+        """Fast-fail reply for a server whose circuit is open"""
+        health = self.get(server_key)
+        return f"Error: Server offline since {self.offline_since_text(server_key)} ({health.last_error})"
+
+    def is_offline(self, server_key):
+        health = self._servers.get(server_key)
+        return health is not None and health.state != CLOSED
+
+    def forget(self, server_key):
+        self._servers.pop(server_key, None)
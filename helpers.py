@@ -1,161 +1,736 @@
+import asyncio
+import contextlib
 import json
-from mcrcon import MCRcon
+import logging
 import discord
 import os
+import sqlite3
+import threading
+import time
+from types import MappingProxyType
+from announcements import AnnouncementScheduler
+from cache import ResponseCache
+from config_watch import ConfigWatcher, config_lock, file_signature, read_servers_file, write_servers_file
+from metrics import registry
+from parsers import is_already_whitelisted, is_whitelist_addition, is_whitelist_removal, parse_whitelist
+from poller import ServerStatePoller
+from reconcile import WhitelistReconciler
+from health import HealthTracker
+from rcon import RconAuthError, RconError, RconPoolClosed, RconPoolManager
+from scheduler import CommandScheduler
+from sharding import shard_config
+from tps import TpsSampler
+from log import redactor
+
+logger = logging.getLogger(__name__)
 
 class ServerConfigManager:
-    """Singleton class to manage server configuration"""
+    """Singleton class to manage server configuration; servers.json is read on first use or by load()"""
     _instance = None
     
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super(ServerConfigManager, cls).__new__(cls)
-            cls._instance._load_config()
+            cls._instance._loaded = False
+            cls._instance._load_lock = threading.Lock()
         return cls._instance
+
+    def load(self):
+        """Read servers.json once; blocking, so startup runs it in a thread"""
+        with self._load_lock:
+            if not self._loaded:
+                self._load_config()
+                self._loaded = True
     
     def _load_config(self):
         self.SERVERS_FILE = "servers.json"
+        # What the file looked like when we last read or wrote it, and how often we wrote it
+        self.signature = None
+        self.saves = 0
+        # Servers another process changed, which the config watcher still has to reset here
+        self.stale = set()
         
-        if not os.path.exists(self.SERVERS_FILE) or os.path.getsize(self.SERVERS_FILE) == 0:
-            self.SERVERS = {}
-            self._save_config()
+        with config_lock(self.SERVERS_FILE):
+            if not os.path.exists(self.SERVERS_FILE) or os.path.getsize(self.SERVERS_FILE) == 0:
+                self.SERVERS = {}
+                self._save_config()
+            else:
+                with open(self.SERVERS_FILE) as f:
+                    self.SERVERS = json.load(f)
+                self.signature = file_signature(self.SERVERS_FILE)
+        self._build_index()
+
+    def _build_index(self):
+        """Index servers by guild so lookups don't scan every entry"""
+        self._guild_index = {}
+        self._unrestricted = set()
+        self._position = {}
+        self._guild_views = {}
+        self._shard_servers = None
+        for server_key, server_data in self.SERVERS.items():
+            self._index_server(server_key, server_data)
+
+    def _index_server(self, server_key, server_data):
+        # RCON passwords must never reach the logs, wherever they turn up
+        redactor.register(server_data.get("password"))
+        self._position.setdefault(server_key, len(self._position))
+        allowed_guilds = server_data.get("allowed_guilds", [])
+        if not allowed_guilds:
+            self._unrestricted.add(server_key)
         else:
-            with open(self.SERVERS_FILE) as f:
-                self.SERVERS = json.load(f)
+            self._unrestricted.discard(server_key)
+            for guild_id in allowed_guilds:
+                self._guild_index.setdefault(guild_id, set()).add(server_key)
     
+    def _unindex_server(self, server_key, server_data):
+        allowed_guilds = server_data.get("allowed_guilds", [])
+        if not allowed_guilds:
+            self._unrestricted.discard(server_key)
+        for guild_id in allowed_guilds:
+            keys = self._guild_index.get(guild_id)
+            if keys is not None:
+                keys.discard(server_key)
+                if not keys:
+                    del self._guild_index[guild_id]
+
     def _save_config(self):
-        with open(self.SERVERS_FILE, "w") as f:
-            json.dump(self.SERVERS, f, indent=4)
+        write_servers_file(self.SERVERS_FILE, self.SERVERS)
+        self.saves += 1
+        # Our own write isn't an out-of-band edit for the config watcher
+        self.signature = file_signature(self.SERVERS_FILE)
+
+    @contextlib.contextmanager
+    def _editing(self):
+        """Change the config under the inter-process lock, starting from what's on disk, then save it.
+
+        Other bot processes may have saved their own changes since we last read the file;
+        merging them first means no process overwrites another's edits.
+        """
+        if not self._loaded:
+            self.load()
+        with config_lock(self.SERVERS_FILE):
+            signature = file_signature(self.SERVERS_FILE)
+            if signature is not None and signature != self.signature:
+                try:
+                    signature, servers = read_servers_file(self.SERVERS_FILE)
+                except (OSError, ValueError) as e:
+                    # A broken hand edit; the watcher already reported it and ours replaces it
+                    logger.warning("overwriting invalid server config", extra={"file": self.SERVERS_FILE, "error": str(e)})
+                else:
+                    _, removed, changed = self.apply_config(servers, signature)
+                    self.stale |= removed | changed
+            yield
+            self._shard_servers = None
+            self._save_config()
+
+    def apply_config(self, servers, signature):
+        """Swap in a reloaded config, re-indexing only the entries that changed.
+
+        Returns the (added, removed, changed) server keys.
+        """
+        old = self.SERVERS
+        added = servers.keys() - old.keys()
+        removed = old.keys() - servers.keys()
+        changed = {key for key in servers.keys() & old.keys() if servers[key] != old[key]}
+
+        stale_guilds = set()
+        clear_all = False
+        for server_key in removed | changed:
+            self._unindex_server(server_key, old[server_key])
+            stale_guilds.update(old[server_key].get("allowed_guilds", []))
+            clear_all = clear_all or not old[server_key].get("allowed_guilds")
+        for server_key in removed:
+            self._position.pop(server_key, None)
+
+        # One assignment, so no command ever sees a half-applied config
+        self.SERVERS = servers
+        self._shard_servers = None
+        self.signature = signature
+        for server_key in added | changed:
+            self._index_server(server_key, servers[server_key])
+            stale_guilds.update(servers[server_key].get("allowed_guilds", []))
+            clear_all = clear_all or not servers[server_key].get("allowed_guilds")
+
+        if clear_all:
+            self._guild_views.clear()
+        else:
+            for guild_id in stale_guilds:
+                self._guild_views.pop(guild_id, None)
+        return added, removed, changed
     
     def get_servers(self):
+        if not self._loaded:
+            self.load()
         return self.SERVERS
+
+    def get_shard_servers(self):
+        """The servers this process's shards can use: those allowed in one of their guilds, or in every guild.
+
+        Background work (polling, TPS, whitelist sync, relays) and with it the RCON pools stay
+        limited to these, so several shard processes don't all connect to every server.
+        """
+        if not shard_config.enabled:
+            return self.get_servers()
+        if not self._loaded:
+            self.load()
+        view = self._shard_servers
+        if view is None:
+            view = self._shard_servers = MappingProxyType({
+                server_key: server_data for server_key, server_data in self.SERVERS.items()
+                if not server_data.get("allowed_guilds")
+                or any(shard_config.owns_guild(guild_id) for guild_id in server_data["allowed_guilds"])
+            })
+        return view
+
+    def get_guild_servers(self, guild_id):
+        """Return a read-only view of the servers a guild may use"""
+        if not self._loaded:
+            self.load()
+        view = self._guild_views.get(guild_id)
+        if view is None:
+            server_keys = self._guild_index.get(guild_id, set()) | self._unrestricted
+            ordered = sorted(server_keys, key=self._position.__getitem__)
+            view = MappingProxyType({key: self.SERVERS[key] for key in ordered})
+            self._guild_views[guild_id] = view
+        return view
     
     def add_server(self, server_key, host, port, password, guild_id):
-        if server_key in self.SERVERS:
-            # If server exists, add this guild to allowed guilds
-            if guild_id not in self.SERVERS[server_key].get("allowed_guilds", []):
-                if "allowed_guilds" not in self.SERVERS[server_key]:
-                    self.SERVERS[server_key]["allowed_guilds"] = []
-                self.SERVERS[server_key]["allowed_guilds"].append(guild_id)
-        else:
-            # Create new server entry
-            self.SERVERS[server_key] = {
-                "host": host,
-                "port": port,
-                "password": password,
-                "allowed_guilds": [guild_id]
-            }
-        
-        self._save_config()
+        with self._editing():
+            if server_key in self._unrestricted:
+                # The server stops being visible to every guild, so every cached view is stale
+                self._guild_views.clear()
+            else:
+                self._guild_views.pop(guild_id, None)
+
+            if server_key in self.SERVERS:
+                # If server exists, add this guild to allowed guilds
+                if guild_id not in self.SERVERS[server_key].get("allowed_guilds", []):
+                    if "allowed_guilds" not in self.SERVERS[server_key]:
+                        self.SERVERS[server_key]["allowed_guilds"] = []
+                    self.SERVERS[server_key]["allowed_guilds"].append(guild_id)
+            else:
+                # Create new server entry
+                self.SERVERS[server_key] = {
+                    "host": host,
+                    "port": port,
+                    "password": password,
+                    "allowed_guilds": [guild_id]
+                }
+
+            self._index_server(server_key, self.SERVERS[server_key])
         return True
 
+    def set_relay(self, server_key, guild_id, channel_id):
+        """Relay a server's chat and events to one of a guild's channels, or stop with channel_id None.
+
+        Every guild sharing the server has its own relay, so one guild's admins can't move or stop another's.
+        """
+        with self._editing():
+            server_data = self.SERVERS.get(server_key)
+            if server_data is None:
+                # Removed by another process meanwhile
+                return
+            # JSON object keys are strings
+            relay_channels = server_data.setdefault("relay_channels", {})
+            if channel_id is None:
+                relay_channels.pop(str(guild_id), None)
+            else:
+                relay_channels[str(guild_id)] = channel_id
+            if not relay_channels:
+                del server_data["relay_channels"]
+
 # Create a singleton instance
 server_manager = ServerConfigManager()
 
+# Persistent authenticated RCON connections, one small pool per server
+rcon_pools = RconPoolManager()
+
+# Short-lived cache of read-only query replies, shared by every guild
+response_cache = ResponseCache()
+
+# Circuit breakers so a dead server fails fast instead of making every caller wait
+server_health = HealthTracker()
+
+# Admission control and priority queues between the handlers and RCON
+command_scheduler = CommandScheduler()
+
 class UserManagementSystem:
-    """Singleton class to manage user additions/removals"""
+    """Singleton class to manage user additions/removals; the database is opened on first use or by load()"""
     _instance = None
     
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super(UserManagementSystem, cls).__new__(cls)
-            cls._instance._load_data()
+            cls._instance._db = None
+            cls._instance._load_lock = threading.Lock()
         return cls._instance
+
+    def load(self):
+        """Open the database and migrate any legacy file once; blocking, so startup runs it in a thread"""
+        with self._load_lock:
+            if self._db is None:
+                self._load_data()
+
+    @property
+    def db(self):
+        if self._db is None:
+            self.load()
+        return self._db
     
     def _load_data(self):
-        self.DATA_FILE = "user_management.json"
-        
-        if not os.path.exists(self.DATA_FILE) or os.path.getsize(self.DATA_FILE) == 0:
-            self.data = {"entries": {}}
-            self._save_data()
-        else:
-            with open(self.DATA_FILE) as f:
-                self.data = json.load(f)
-    
-    def _save_data(self):
-        with open(self.DATA_FILE, "w") as f:
-            json.dump(self.data, f, indent=4)
-    
+        self.DB_FILE = "user_management.db"
+        self.LEGACY_FILE = "user_management.json"
+
+        # WAL keeps each write a small append and survives crashes mid-write; it also lets several
+        # bot processes share the ledger, with writers waiting up to `timeout` seconds for each other.
+        # Opened in a startup thread but only used from the event loop afterwards.
+        db = sqlite3.connect(self.DB_FILE, isolation_level=None, timeout=10.0, check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " server_key TEXT NOT NULL,"
+            " username TEXT NOT NULL,"
+            " discord_user_id TEXT NOT NULL,"  # '' for players found on the server but not added by the bot
+            " PRIMARY KEY (server_key, username))"
+        )
+        self._db = db
+        self._migrate_legacy_file()
+
+    def _migrate_legacy_file(self):
+        """Import entries from the old user_management.json once, then set it aside"""
+        if not os.path.exists(self.LEGACY_FILE):
+            return
+        if os.path.getsize(self.LEGACY_FILE) > 0:
+            with open(self.LEGACY_FILE) as f:
+                legacy = json.load(f)
+            rows = []
+            for entry_key, discord_user_id in legacy.get("entries", {}).items():
+                # Server keys may contain ':' but Minecraft usernames can't
+                server_key, _, username = entry_key.rpartition(":")
+                rows.append((server_key, username.lower(), str(discord_user_id)))
+            with self.db:
+                self.db.execute("BEGIN IMMEDIATE")
+                self.db.executemany("INSERT OR IGNORE INTO entries VALUES (?, ?, ?)", rows)
+            logger.info("migrated legacy whitelist records", extra={"entries": len(rows), "file": self.LEGACY_FILE})
+        os.replace(self.LEGACY_FILE, self.LEGACY_FILE + ".migrated")
+
     def record_addition(self, server_key, minecraft_username, discord_user_id):
         """Record who added which username to which server"""
-        entry_key = f"{server_key}:{minecraft_username.lower()}"
-        self.data["entries"][entry_key] = discord_user_id
-        self._save_data()
-    
+        self.db.execute(
+            "INSERT OR REPLACE INTO entries VALUES (?, ?, ?)",
+            (server_key, minecraft_username.lower(), str(discord_user_id))
+        )
+
+    def record_additions(self, server_key, minecraft_usernames, discord_user_id):
+        """Record several additions by one user in a single transaction"""
+        rows = [(server_key, username.lower(), str(discord_user_id)) for username in minecraft_usernames]
+        if not rows:
+            return
+        with self.db:
+            self.db.execute("BEGIN IMMEDIATE")
+            self.db.executemany("INSERT OR REPLACE INTO entries VALUES (?, ?, ?)", rows)
+
+    def get_owners(self, server_key):
+        """Map of username -> Discord user ID for everything recorded on a server"""
+        return dict(self.db.execute(
+            "SELECT username, discord_user_id FROM entries WHERE server_key = ?", (server_key,)
+        ))
+
+    def get_usernames(self, server_key):
+        """Set of (lowercase) usernames recorded on a server"""
+        return {row[0] for row in self.db.execute("SELECT username FROM entries WHERE server_key = ?", (server_key,))}
+
+    def apply_whitelist_delta(self, server_key, added, removed):
+        """Apply a reconciliation in one transaction; added players get no owner, so only admins can remove them"""
+        with self.db:
+            self.db.execute("BEGIN IMMEDIATE")
+            # OR IGNORE keeps the owner of anything recorded since the whitelist was read
+            self.db.executemany("INSERT OR IGNORE INTO entries VALUES (?, ?, '')",
+                                [(server_key, username) for username in added])
+            self.db.executemany("DELETE FROM entries WHERE server_key = ? AND username = ?",
+                                [(server_key, username) for username in removed])
+
+    def get_owner(self, server_key, minecraft_username):
+        """Return the Discord user ID that added a username, or None"""
+        row = self.db.execute(
+            "SELECT discord_user_id FROM entries WHERE server_key = ? AND username = ?",
+            (server_key, minecraft_username.lower())
+        ).fetchone()
+        return row[0] if row else None
+
     def can_remove(self, server_key, minecraft_username, discord_user_id, is_admin=False):
         """Check if user can remove a username"""
-        entry_key = f"{server_key}:{minecraft_username.lower()}"
         if is_admin:
             return True
-        if entry_key in self.data["entries"]:
-            return str(self.data["entries"][entry_key]) == str(discord_user_id)
-        return False
-    
+        return self.get_owner(server_key, minecraft_username) == str(discord_user_id)
+
     def remove_entry(self, server_key, minecraft_username):
         """Remove the entry after successful removal"""
-        entry_key = f"{server_key}:{minecraft_username.lower()}"
-        if entry_key in self.data["entries"]:
-            del self.data["entries"][entry_key]
-            self._save_data()
+        self.db.execute(
+            "DELETE FROM entries WHERE server_key = ? AND username = ?",
+            (server_key, minecraft_username.lower())
+        )
+
+    def remove_entries(self, server_key, minecraft_usernames):
+        """Remove several entries in a single transaction"""
+        rows = [(server_key, username.lower()) for username in minecraft_usernames]
+        if not rows:
+            return
+        with self.db:
+            self.db.execute("BEGIN IMMEDIATE")
+            self.db.executemany("DELETE FROM entries WHERE server_key = ? AND username = ?", rows)
 
 # Create a singleton instance for user management
 user_manager = UserManagementSystem()
 
 def get_guild_servers(guild_id):
-    """Get servers configured for a specific guild"""
-    print(f"get_guild_servers called with: {guild_id}")
-    guild_servers = {}
-    for server_key, server_data in server_manager.get_servers().items():
-        allowed_guilds = server_data.get("allowed_guilds", [])
-        if not allowed_guilds or guild_id in allowed_guilds:
-            guild_servers[server_key] = server_data
-    print(f"guild_servers: {guild_servers}")
-    return guild_servers
+    """Get a read-only view of the servers configured for a specific guild"""
+    return server_manager.get_guild_servers(guild_id)
 
 def get_single_guild_server(guild_id):
     """Get a single server if only one is available for a specific guild"""
-    print(f"get_single_guild_server called with: {guild_id}")
     guild_servers = get_guild_servers(guild_id)
     if len(guild_servers) == 1:
         return next(iter(guild_servers))
     return None
 
-def rcon_command(server_key, command):
-    print(f"rcon_command called with: {server_key}, {command}")
+async def _through_breaker(server_key, request):
+    """Await an RCON request and feed the outcome to the server's circuit breaker"""
+    try:
+        result = await request
+    except RconAuthError:
+        # A wrong password is a config problem; the server itself answered
+        server_health.record_success(server_key)
+        raise
+    except RconPoolClosed:
+        # Shut down on our side; says nothing about the server
+        server_health.release_probe(server_key)
+        raise
+    except (OSError, RconError) as e:
+        server_health.record_failure(server_key, e)
+        raise
+    except BaseException:
+        server_health.release_probe(server_key)
+        raise
+    server_health.record_success(server_key)
+    return result
+
+async def rcon_command(server_key, command):
+    logger.debug("rcon command", extra={"server": server_key, "rcon_command": command, "sampled": True})
+    started = time.perf_counter()
     try:
         servers = server_manager.get_servers()
         if server_key not in servers:
             return "Error: Server not found"
 
-        cfg = servers[server_key]
-        with MCRcon(cfg["host"], cfg["password"], port=cfg["port"]) as mcr:
-            return mcr.command(command)
+        # Answered from the cache before asking the breaker: allow() may let a probe through,
+        # and a probe that never reaches the server would leave the breaker half-open for good
+        cached = response_cache.peek(server_key, command)
+        if cached is not None:
+            return cached
+        if not server_health.allow(server_key):
+            return server_health.offline_message(server_key)
+
+        pool = rcon_pools.get_pool(server_key, servers[server_key])
+        if response_cache.is_cacheable(command):
+            return await response_cache.get(
+                server_key, command, lambda: _through_breaker(server_key, pool.command(command))
+            )
+        try:
+            return await _through_breaker(server_key, pool.command(command))
+        finally:
+            # Anything that isn't a known read-only query may have changed the server's state
+            if response_cache.invalidates(command):
+                response_cache.invalidate(server_key)
     except Exception as e:
-        print(f"Error in rcon_command: {e}")
+        logger.warning("rcon command failed", extra={"server": server_key, "rcon_command": command, "error": str(e)})
+        registry.inc("rcon_errors_total", (("server", server_key), ("type", type(e).__name__)))
         return f"Error: {e}"
+    finally:
+        registry.observe("rcon_request_seconds", time.perf_counter() - started, (("server", server_key),))
+
+async def rcon_batch(server_key, commands):
+    """Send several commands on one connection and return their results in order"""
+    logger.debug("rcon batch", extra={"server": server_key, "rcon_commands": commands, "sampled": True})
+    started = time.perf_counter()
+    try:
+        servers = server_manager.get_servers()
+        if server_key not in servers:
+            return ["Error: Server not found"] * len(commands)
+
+        cached = [response_cache.peek(server_key, command) for command in commands]
+        if None not in cached:
+            return cached
+        if not server_health.allow(server_key):
+            return [server_health.offline_message(server_key)] * len(commands)
+
+        pool = rcon_pools.get_pool(server_key, servers[server_key])
+        if all(response_cache.is_cacheable(command) for command in commands):
+            return await response_cache.get_many(
+                server_key, commands, lambda misses: _through_breaker(server_key, pool.batch(misses))
+            )
+        try:
+            return await _through_breaker(server_key, pool.batch(commands))
+        finally:
+            if any(response_cache.invalidates(command) for command in commands):
+                response_cache.invalidate(server_key)
+    except Exception as e:
+        logger.warning("rcon batch failed", extra={"server": server_key, "rcon_commands": commands, "error": str(e)})
+        registry.inc("rcon_errors_total", (("server", server_key), ("type", type(e).__name__)))
+        return [f"Error: {e}"] * len(commands)
+    finally:
+        registry.observe("rcon_request_seconds", time.perf_counter() - started, (("server", server_key),))
+
+# Background poller that keeps a snapshot of every server for the status commands
+state_poller = ServerStatePoller(
+    server_manager.get_shard_servers,
+    rcon_batch,
+    interval=float(os.getenv("POLL_INTERVAL", 30)),
+    active_interval=float(os.getenv("POLL_ACTIVE_INTERVAL", 10)),
+    max_interval=float(os.getenv("POLL_MAX_INTERVAL", 300)),
+)
+
+# Background TPS sampling into a rolling history per server
+tps_sampler = TpsSampler(
+    server_manager.get_shard_servers,
+    rcon_command,
+    profile_interval=float(os.getenv("TPS_PROFILE_INTERVAL", 1800)),
+)
+
+async def _fetch_whitelist(server_key):
+    # Reconciling against a cached list could undo changes made in the last few seconds
+    response_cache.discard(server_key, "whitelist list")
+    return await rcon_command(server_key, "whitelist list")
+
+# Periodic diff of each server's whitelist against the ownership ledger
+whitelist_reconciler = WhitelistReconciler(
+    server_manager.get_shard_servers,
+    _fetch_whitelist,
+    user_manager,
+    response_cache.generation,
+    interval=float(os.getenv("WHITELIST_SYNC_INTERVAL", 900)),
+)
+
+async def reconcile_whitelist(server_key):
+    """Reconcile a server's ledger against its whitelist now; returns (added, removed) or None"""
+    return await whitelist_reconciler.reconcile(server_key)
+
+async def _reset_server(server_key):
+    """Forget connections and cached state for a server whose config entry changed or was removed"""
+    await rcon_pools.drop(server_key)
+    response_cache.invalidate(server_key)
+    server_health.forget(server_key)
+    state_poller.forget(server_key)
+    command_scheduler.forget(server_key)
+
+# Picks up hand edits to servers.json (e.g. rotated RCON passwords) without a restart
+config_watcher = ConfigWatcher(
+    server_manager,
+    _reset_server,
+    interval=float(os.getenv("CONFIG_WATCH_INTERVAL", 5)),
+)
+
+async def broadcast(server_keys, commands):
+    """Run the same command sequence on several servers at once; returns {server_key: replies}"""
+    # Each server gets its sequence pipelined over one pooled connection, all servers in parallel
+    replies = await asyncio.gather(*(rcon_batch(server_key, commands) for server_key in server_keys))
+    return dict(zip(server_keys, replies))
+
+def announcement_servers(guild_id, servers):
+    """Server keys an announcement goes to right now: "all" means every server the guild has then"""
+    guild_servers = server_manager.get_guild_servers(guild_id)
+    if servers == ["all"]:
+        return list(guild_servers)
+    # Servers removed since it was scheduled are skipped
+    return [server_key for server_key in servers if server_key in guild_servers]
+
+async def _deliver_announcement(announcement):
+    server_keys = announcement_servers(announcement.guild_id, announcement.servers)
+    results = await broadcast(server_keys, [f"say {announcement.message}"])
+    failed = [server_key for server_key, replies in results.items() if replies[0].startswith("Error:")]
+    logger.info("announcement sent", extra={
+        "announcement_id": announcement.id, "servers": server_keys, "failed": failed,
+    })
+
+# Delayed and recurring announcements, kept in SQLite so they survive restarts
+announcement_scheduler = AnnouncementScheduler("announcements.db", _deliver_announcement, shard_config.owns_guild)
+
+async def load_stores():
+    """Load servers.json, the whitelist ledger and the announcements in threads, all at once"""
+    await asyncio.gather(
+        asyncio.to_thread(server_manager.load),
+        asyncio.to_thread(user_manager.load),
+        asyncio.to_thread(announcement_scheduler.open),
+    )
+
+def get_tps_history(server_key):
+    """Get the rolling TPS history for a server, or None if it has no samples yet"""
+    history = tps_sampler.get_history(server_key)
+    if history is None or not history.count:
+        return None
+    return history
+
+def get_server_liveness(server_key):
+    """Short status line for a server from its circuit breaker and the poller's snapshot"""
+    if server_health.is_offline(server_key):
+        return f"🔴 offline since {server_health.offline_since_text(server_key)}"
+    snapshot = state_poller.get_snapshot(server_key)
+    if snapshot is None or snapshot.last_seen is None:
+        return "⚪ not checked yet"
+    if not snapshot.reachable:
+        return f"🟠 not answering (last seen {snapshot.age_text()})"
+    if snapshot.player_list is not None:
+        return f"🟢 online, {snapshot.player_list.online}/{snapshot.player_list.max} players"
+    return "🟢 online"
+
+def get_server_hint(server_key):
+    """Very short status for a server (no Discord markup), e.g. for autocomplete choices"""
+    if server_health.is_offline(server_key):
+        return "🔴 offline"
+    snapshot = state_poller.get_snapshot(server_key)
+    if snapshot is None or snapshot.last_seen is None:
+        return "⚪ not checked yet"
+    if not snapshot.reachable:
+        return "🟠 not answering"
+    if snapshot.player_list is not None:
+        return f"🟢 {snapshot.player_list.online}/{snapshot.player_list.max} online"
+    return "🟢 online"
+
+def get_online_players(server_key):
+    """Names of the players online according to the poller, or None if unknown; keeps the server polled often"""
+    state_poller.mark_active(server_key)
+    snapshot = state_poller.get_snapshot(server_key)
+    if snapshot is None or not snapshot.reachable or snapshot.player_list is None:
+        return None
+    return snapshot.player_list.names
+
+def get_snapshot(server_key):
+    """Get the poller's snapshot for a server if it has answered recently, else None"""
+    state_poller.mark_active(server_key)
+    snapshot = state_poller.get_snapshot(server_key)
+    if snapshot is None or not snapshot.reachable or snapshot.age() > state_poller.max_interval:
+        return None
+    return snapshot
 
 def is_admin(user: discord.User | discord.Member):
-    print(f"is_admin called with: {user}")
     return getattr(user, "guild_permissions", None) and user.guild_permissions.administrator
 
 def add_server(server_key, host, port, password, guild_id):
     """Add a server to the configuration"""
     return server_manager.add_server(server_key, host, port, password, guild_id)
 
-def add_player(server_key, minecraft_username, discord_user_id):
+def set_relay_channel(server_key, guild_id, channel_id):
+    """Point a guild's live relay of a server at a channel, or turn it off with None"""
+    server_manager.set_relay(server_key, guild_id, channel_id)
+
+async def add_player(server_key, minecraft_username, discord_user_id):
     """Add a player to the whitelist and record who added them"""
     # Use explicit "whitelist add" command
-    result = rcon_command(server_key, "whitelist add " + minecraft_username)
-    user_manager.record_addition(server_key, minecraft_username, discord_user_id)
+    result = await rcon_command(server_key, "whitelist add " + minecraft_username)
+    # Only an actual addition makes the caller the owner; a player who was already whitelisted
+    # keeps their owner (or none, so only admins can remove them)
+    if is_whitelist_addition(result):
+        user_manager.record_addition(server_key, minecraft_username, discord_user_id)
+    elif not result.startswith("Error:") and not is_already_whitelisted(result):
+        # Unrecognised reply: let the server's whitelist decide what the ledger says
+        whitelist_reconciler.request(server_key)
     return result
 
-def remove_player(server_key, minecraft_username, discord_user_id, is_admin=False):
+async def remove_player(server_key, minecraft_username, discord_user_id, is_admin=False):
     """Remove a player from the whitelist if allowed"""
     if user_manager.can_remove(server_key, minecraft_username, discord_user_id, is_admin):
         # Use explicit "whitelist remove" command
-        result = rcon_command(server_key, "whitelist remove " + minecraft_username)
-        if "Removed" in result or "was not on" in result:
+        result = await rcon_command(server_key, "whitelist remove " + minecraft_username)
+        if is_whitelist_removal(result):
             user_manager.remove_entry(server_key, minecraft_username)
+        elif not result.startswith("Error:"):
+            # Unrecognised reply: let the server's whitelist decide what the ledger says
+            whitelist_reconciler.request(server_key)
         return result, True
     else:
         return "You can only remove players that you added yourself.", False
+
+# Commands per pipelined batch in bulk whitelist changes; progress is reported between batches
+BULK_BATCH_SIZE = 50
+
+async def _bulk_whitelist(server_key, action, minecraft_usernames, record, progress=None, before=None):
+    """Run "whitelist <action>" for many players in pipelined batches, returning (username, reply) pairs.
+
+    `record(pairs)` writes each batch's outcome to the ledger as soon as the batch completes. Batches
+    are shielded from cancellation, so a command that times out mid-import still records what ran.
+    """
+    async def run_batch(chunk):
+        replies = await rcon_batch(server_key, [f"whitelist {action} {username}" for username in chunk])
+        record(list(zip(chunk, replies)))
+        return replies
+
+    results = []
+    for start in range(0, len(minecraft_usernames), BULK_BATCH_SIZE):
+        chunk = minecraft_usernames[start:start + BULK_BATCH_SIZE]
+        replies = await asyncio.shield(run_batch(chunk))
+        results.extend(zip(chunk, replies))
+        if all(reply.startswith("Error:") for reply in replies):
+            # The server is down or rejected us; don't keep hammering it with the rest
+            results.extend((username, replies[0]) for username in minecraft_usernames[len(results):])
+            break
+        if progress is not None:
+            await progress(len(results), len(minecraft_usernames))
+    settled = await _settle_errors(server_key, action, results, before)
+    # Errors the whitelist has since resolved weren't recorded with their batch
+    record([pair for pair, (_, reply) in zip(settled, results) if reply.startswith("Error:")])
+    return settled
+
+async def _whitelist_snapshot(server_key):
+    """Lowercase names on a server's whitelist right now, or None if it can't be read"""
+    names = parse_whitelist(await _fetch_whitelist(server_key))
+    return None if names is None else {name.lower() for name in names}
+
+async def _settle_errors(server_key, action, results, before=None):
+    """Replace error replies with what the server's whitelist says now.
+
+    A batch that timed out or lost its connection may still have run some of its commands, so the
+    whitelist is reconciled into the ledger and read back instead of reporting every name as failed.
+    An addition only counts as ours if the name was missing from `before`, the whitelist as read
+    before the import; anything else is never reported as added, so it never gets an owner.
+    """
+    if not any(reply.startswith("Error:") for _, reply in results):
+        return results
+    if await reconcile_whitelist(server_key) is None:
+        # Still can't read the whitelist; the errors stand and the next sync catches up
+        return results
+    present = user_manager.get_usernames(server_key)
+    settled = []
+    for username, reply in results:
+        if reply.startswith("Error:"):
+            name = username.lower()
+            if action == "add" and name in present:
+                if before is None:
+                    reply = "Player is whitelisted, but it's unconfirmed whether this import added them"
+                elif name in before:
+                    reply = "Player is already whitelisted"
+                else:
+                    reply = f"Added {username} to the whitelist"
+            elif action == "remove" and name not in present:
+                reply = f"Removed {username} from the whitelist"
+        settled.append((username, reply))
+    return settled
+
+async def add_players(server_key, minecraft_usernames, discord_user_id, progress=None):
+    """Whitelist many players, recording the ones actually added one batch at a time"""
+    def record(pairs):
+        # Players someone else already whitelisted keep their recorded owner
+        user_manager.record_additions(
+            server_key, [username for username, reply in pairs if is_whitelist_addition(reply)], discord_user_id
+        )
+
+    # Read first, so a batch error can't make anyone already on the whitelist look added by this import
+    before = await _whitelist_snapshot(server_key)
+    return await _bulk_whitelist(server_key, "add", minecraft_usernames, record, progress, before)
+
+async def remove_players(server_key, minecraft_usernames, progress=None):
+    """Remove many players from the whitelist (admin only), dropping their entries one batch at a time"""
+    def record(pairs):
+        user_manager.remove_entries(server_key, [username for username, reply in pairs if is_whitelist_removal(reply)])
+
+    return await _bulk_whitelist(server_key, "remove", minecraft_usernames, record, progress)
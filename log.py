@@ -0,0 +1,157 @@
+import contextvars
+import copy
+import datetime
+import itertools
+import json
+import logging
+import logging.handlers
+import queue
+import re
+import sys
+
+# Set per interaction so every record a command produces, in any task, can be tied together
+correlation_id = contextvars.ContextVar("correlation_id", default=None)
+
+# Attributes every LogRecord has; anything else on a record came from `extra=` and is logged as a field
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+_SECRET_KEYS = re.compile(r"password|passwd|token|secret", re.IGNORECASE)
+# Shorter values would redact innocent substrings all over the logs
+MIN_SECRET_LENGTH = 4
+REDACTED = "***"
+
+
+class SecretRedactor:
+    """Scrubs known secret values and secret-looking fields from records"""
+
+    def __init__(self):
+        self._secrets = ()
+
+    def register(self, *secrets):
+        # Replaced wholesale, so the listener thread always sees a consistent tuple
+        known = set(self._secrets)
+        known.update(str(secret) for secret in secrets if secret and len(str(secret)) >= MIN_SECRET_LENGTH)
+        self._secrets = tuple(sorted(known, key=len, reverse=True))
+
+    def scrub(self, text):
+        for secret in self._secrets:
+            if secret in text:
+                text = text.replace(secret, REDACTED)
+        return text
+
+    def scrub_field(self, key, value):
+        if _SECRET_KEYS.search(key):
+            return REDACTED
+        if isinstance(value, str):
+            return self.scrub(value)
+        if isinstance(value, dict):
+            return {k: self.scrub_field(str(k), v) for k, v in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [self.scrub_field(key, v) for v in value]
+        return value
+
+
+redactor = SecretRedactor()
+
+
+class ContextFilter(logging.Filter):
+    """Stamps the current correlation ID on a record; runs in the logging task, not the listener"""
+
+    def filter(self, record):
+        record.correlation_id = correlation_id.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps one in `every` records marked with extra={"sampled": True}, per logger and message"""
+
+    def __init__(self, every):
+        super().__init__()
+        self.every = max(int(every), 1)
+        self._counters = {}
+
+    def filter(self, record):
+        if not getattr(record, "sampled", False) or record.levelno >= logging.WARNING:
+            return True
+        key = (record.name, record.msg)
+        counter = self._counters.get(key)
+        if counter is None:
+            counter = self._counters[key] = itertools.count()
+        if next(counter) % self.every:
+            return False
+        record.sample_rate = self.every
+        return True
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that never blocks the event loop; records are dropped when the queue is full"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # The stock prepare() formats the whole record here, on the event loop, and folds the traceback
+        # into msg; only merge the arguments (they may change later) and leave the rest to the listener
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with any `extra=` fields included and secrets redacted"""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": redactor.scrub(record.getMessage()),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and key != "sampled" and value is not None:
+                entry[key] = redactor.scrub_field(key, value)
+        if record.exc_info:
+            entry["exc"] = redactor.scrub(self.formatException(record.exc_info))
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    """Human-readable lines for local development, with the same redaction"""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)-7s %(name)s [%(correlation_id)s] %(message)s")
+
+    def format(self, record):
+        if record.correlation_id is None:
+            record.correlation_id = "-"
+        return redactor.scrub(super().format(record))
+
+
+def setup_logging(level="INFO", fmt="json", sample_every=100, queue_size=10000):
+    """Route all logging through a bounded queue to a background thread writing to stdout.
+
+    Returns the QueueListener; call stop() on it at shutdown to flush what's queued.
+    """
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(TextFormatter() if fmt == "text" else JsonFormatter())
+
+    handler = DroppingQueueHandler(queue.Queue(queue_size))
+    handler.addFilter(SamplingFilter(sample_every))
+    handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(level.upper())
+    # discord.py's gateway chatter is only interesting when something goes wrong
+    logging.getLogger("discord").setLevel(max(root.level, logging.INFO))
+
+    listener = logging.handlers.QueueListener(handler.queue, output, respect_handler_level=True)
+    listener.start()
+    return listener
@@ -1,23 +1,132 @@
+# Imported first, so the startup report covers every import
+from startup import startup
+
+import asyncio
+import logging
 import os
+import discord
 from dotenv import load_dotenv
-from bot_setup import bot, tree
-import commands
 
-# Load .env
+# Load .env before the command modules read their settings
 load_dotenv()
+
+from log import redactor, setup_logging
+
+# Logging is set up before anything else is imported, so no early record is lost
+log_listener = setup_logging(
+    level=os.getenv("LOG_LEVEL", "INFO"),
+    fmt=os.getenv("LOG_FORMAT", "json"),
+    sample_every=int(os.getenv("LOG_SAMPLE_EVERY", 100)),
+)
+logger = logging.getLogger("main")
+
+from bot_setup import bot, tree
+from helpers import (announcement_scheduler, config_watcher, get_online_players, load_stores, server_manager,
+                     state_poller, tps_sampler, whitelist_reconciler)
+from sharding import shard_config
+
 DISCORD_TOKEN = os.getenv("TOKEN")
+redactor.register(DISCORD_TOKEN)
+METRICS_PORT = os.getenv("METRICS_PORT")
+# Sync commands to this guild only (instant updates on a test server) instead of globally
+SYNC_GUILD_ID = os.getenv("SYNC_GUILD_ID")
+
+startup.mark("imports")
+
+# Prometheus metrics on localhost, only if a port is configured; created in on_ready
+metrics_server = None
+
+# Live chat and event relay into Discord channels; created in on_ready
+relay_manager = None
+
+# Loads servers.json and the databases while the gateway connects
+stores_task = None
+
+def relay_targets():
+    """The shard's relayed servers, each with the channels (one per guild) this process can post it to"""
+    targets = {}
+    for server_key, server_data in server_manager.get_shard_servers().items():
+        allowed_guilds = server_data.get("allowed_guilds")
+        channel_ids = frozenset(
+            channel_id for guild_id, channel_id in server_data.get("relay_channels", {}).items()
+            # A guild removed from the server by hand loses its relay too
+            if (not allowed_guilds or int(guild_id) in allowed_guilds) and bot.get_channel(channel_id) is not None
+        )
+        if channel_ids:
+            targets[server_key] = (channel_ids, server_data.get("log_path"))
+    return targets
+
+async def load_stores_in_background():
+    try:
+        with startup.measure("stores"):
+            await load_stores()
+    except Exception:
+        # Without its config the bot can't do anything useful; let the supervisor restart it
+        logger.exception("error loading servers and databases")
+        await bot.close()
+        return
+    startup.stores_loaded.set()
 
 # --- Bot Events ---
 
+@bot.event
+async def setup_hook():
+    global stores_task
+    # Runs once, after logging in and before connecting to the gateway
+    startup.mark("login")
+    # Reading the config and databases overlaps with the gateway handshake
+    stores_task = asyncio.create_task(load_stores_in_background())
+    with startup.measure("commands"):
+        # Registers the slash commands on the tree
+        import commands
+
 @bot.event
 async def on_ready():
-    print(f"✅ Logged in as {bot.user}")
+    global metrics_server, relay_manager
+    startup.mark("ready")
+    logger.info("logged in", extra={"user": str(bot.user), "shards": str(shard_config)})
+
+    # Background work needs the stores; usually they finished loading during the handshake
+    await startup.stores_loaded.wait()
+
+    # Start polling server state and TPS for the status commands (no-op on reconnect)
+    state_poller.start()
+    tps_sampler.start()
+    whitelist_reconciler.start()
+    config_watcher.start()
+    announcement_scheduler.start()
+    if relay_manager is None:
+        from relay import RelayManager
+        relay_manager = RelayManager(relay_targets, bot.get_channel, get_online_players)
+    relay_manager.start()
+    if METRICS_PORT and metrics_server is None:
+        from metrics import MetricsServer
+        metrics_server = MetricsServer(port=int(METRICS_PORT))
+        await metrics_server.start()
+
+    # Commands are global to the application, so one shard process syncs them for all
+    if shard_config.syncs_commands:
+        await sync_commands()
+    startup.report()
 
-    # Perform a global sync
-    await tree.sync()
-    print("Command tree synced globally!")
+async def sync_commands():
+    # on_ready fires again on every reconnect; only talk to Discord if the commands changed
+    guild = discord.Object(id=int(SYNC_GUILD_ID)) if SYNC_GUILD_ID else None
+    scope = f"guild {SYNC_GUILD_ID}" if guild else "globally"
+    try:
+        with startup.measure("sync"):
+            synced = await tree.sync_if_changed(guild=guild)
+        if synced:
+            logger.info("command tree synced", extra={"scope": scope})
+        else:
+            logger.info("command tree unchanged, skipped syncing", extra={"scope": scope})
+    except discord.HTTPException as e:
+        logger.error("error syncing command tree", extra={"scope": scope, "error": str(e)})
 
 try:
-    bot.run(DISCORD_TOKEN)
-except Exception as e:
-    print(f"Error running bot: {e}")
+    # Our logging is already configured; don't let discord.py install its own handler
+    bot.run(DISCORD_TOKEN, log_handler=None)
+except Exception:
+    logger.exception("error running bot")
+finally:
+    log_listener.stop()
@@ -0,0 +1,141 @@
+import asyncio
+import logging
+import time
+from bisect import bisect_left
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in seconds, from a cache hit up to a connect timeout
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """Cumulative-bucket histogram for one label set"""
+
+    __slots__ = ("buckets", "counts", "total", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """In-process counters, gauges and histograms rendered in Prometheus text format"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._help = {}
+        self._types = {}
+        self._values = {}
+
+    def describe(self, name, kind, help_text):
+        self._types[name] = kind
+        self._help[name] = help_text
+        self._values.setdefault(name, {})
+
+    def inc(self, name, labels=(), amount=1):
+        series = self._values[name]
+        series[labels] = series.get(labels, 0) + amount
+
+    def set(self, name, value, labels=()):
+        self._values[name][labels] = value
+
+    def observe(self, name, value, labels=()):
+        series = self._values[name]
+        histogram = series.get(labels)
+        if histogram is None:
+            histogram = series[labels] = Histogram(self.buckets)
+        histogram.observe(value)
+
+    def render(self):
+        lines = []
+        for name, series in self._values.items():
+            lines.append(f"# HELP {name} {self._help[name]}")
+            lines.append(f"# TYPE {name} {self._types[name]}")
+            for labels, value in series.items():
+                if isinstance(value, Histogram):
+                    cumulative = 0
+                    for bound, count in zip(self.buckets + (float("inf"),), value.counts):
+                        cumulative += count
+                        le = "+Inf" if bound == float("inf") else repr(bound)
+                        lines.append(f"{name}_bucket{_format_labels(labels + (('le', le),))} {cumulative}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {value.total}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {value.count}")
+                else:
+                    lines.append(f"{name}{_format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    pairs = ",".join(f'{key}="{_escape(str(value))}"' for key, value in labels)
+    return "{" + pairs + "}"
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+# Shared registry for the whole bot
+registry = MetricsRegistry()
+registry.describe("bot_command_seconds", "histogram", "Slash command handler latency")
+registry.describe("bot_command_errors_total", "counter", "Slash commands that raised an error")
+registry.describe("rcon_request_seconds", "histogram", "rcon_command/rcon_batch latency, cache hits included")
+registry.describe("rcon_phase_seconds", "histogram", "RCON connect, auth and command round-trip times")
+registry.describe("rcon_errors_total", "counter", "Failed RCON requests by error type")
+registry.describe("event_loop_lag_seconds", "histogram", "How late the event loop ran a scheduled wakeup")
+registry.describe("event_loop_lag_last_seconds", "gauge", "Most recent event loop lag measurement")
+
+
+async def monitor_event_loop_lag(interval=0.5):
+    """Measure how late asyncio.sleep wakes up, which is time the loop spent blocked"""
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        lag = max(time.perf_counter() - started - interval, 0.0)
+        registry.observe("event_loop_lag_seconds", lag)
+        registry.set("event_loop_lag_last_seconds", lag)
+
+
+class MetricsServer:
+    """Serves the registry at /metrics on a local port and runs the event loop lag monitor"""
+
+    def __init__(self, host="127.0.0.1", port=9108):
+        self.host = host
+        self.port = port
+        self._runner = None
+        self._lag_task = None
+
+    async def start(self):
+        """Start serving; safe to call again on reconnect"""
+        if self._runner is not None:
+            return
+        from aiohttp import web
+
+        async def handle_metrics(request):
+            return web.Response(body=registry.render().encode("utf-8"),
+                                headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+        app = web.Application()
+        app.router.add_get("/metrics", handle_metrics)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        self._lag_task = asyncio.create_task(monitor_event_loop_lag())
+        logger.info("metrics available", extra={"url": f"http://{self.host}:{self.port}/metrics"})
+
+    async def stop(self):
+        if self._lag_task is not None:
+            self._lag_task.cancel()
+            self._lag_task = None
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
@@ -0,0 +1,294 @@
+import re
+
+# Precompiled once; these run on every poll and every status command
+_COLOR_CODES = re.compile(r"§[0-9a-fk-orx]", re.IGNORECASE)
+_UNKNOWN_COMMAND = re.compile(r"Unknown (?:or incomplete )?command", re.IGNORECASE)
+
+# Vanilla: "There are 2 of a max of 20 players online: Steve, Alex"
+# Older vanilla/Spigot: "There are 2/20 players online:\nSteve, Alex"
+# Paper: "There are 2 out of maximum 20 players online.\ndefault: Steve, Alex"
+_LIST = re.compile(
+    r"There (?:are|is) (\d+)\s*(?:/|of a max(?:imum)? of|out of maximum)\s*(\d+) players? online[:.]?\s*(.*)",
+    re.IGNORECASE | re.DOTALL,
+)
+_LIST_GROUP_PREFIX = re.compile(r"^[^:\n,]+:\s*", re.MULTILINE)
+
+# Paper/Spigot: "TPS from last 1m, 5m, 15m: 20.0, 19.98, *20.0"
+_TPS = re.compile(r"TPS from last[^:]*:\s*\*?([\d.]+),\s*\*?([\d.]+),\s*\*?([\d.]+)")
+# Vanilla "debug stop": "Stopped tick profiling after 5.00 seconds and 100 ticks (20.00 ticks per second)"
+_DEBUG_STOP = re.compile(r"\(([\d.]+) ticks per second\)")
+# Vanilla "debug start": "Started tick profiling" (older: "Started debug profiling")
+_DEBUG_STARTED = re.compile(r"^Started \w+ profiling", re.IGNORECASE)
+# Vanilla 1.20.3+ "tick query": "Target tick rate: 20.0 per second.\nAverage time per tick: 3.2ms (Target: 50.0ms)"
+_TICK_RATE = re.compile(r"Target tick rate:\s*([\d.]+)")
+_TICK_TIME = re.compile(r"Average time per tick:\s*([\d.]+)\s*ms")
+
+# Essentials/Paper gc: "Maximum memory: 4,096 MB." "Allocated memory: 2,048 MB." "Free memory: 1,024 MB."
+_MEMORY_FIELD = re.compile(r"(Maximum|Allocated|Free) memory:\s*([\d,]+)\s*MB", re.IGNORECASE)
+_UPTIME = re.compile(r"Uptime:\s*([^\n.]+)", re.IGNORECASE)
+
+# "This server is running Paper version git-Paper-196 (MC: 1.20.1) (Implementing API version ...)"
+# or vanilla 1.21.6+: "Server version info: id = 1.21.6, name = 1.21.6, ..."
+_VERSION_PAPER = re.compile(r"running (\S+) version (\S+) \(MC: ([^)]+)\)")
+_VERSION_VANILLA = re.compile(r"name = ([^,\n]+)")
+
+# "There are 3 whitelisted player(s): a, b, c" / "There are no whitelisted players"
+_WHITELIST = re.compile(r"There (?:are|is) (\d+|no) whitelisted players?(?:\(s\))?(?::\s*(.*))?",
+                        re.IGNORECASE | re.DOTALL)
+# "Removed Steve from the whitelist" / "Player is not whitelisted" / "Steve was not on the whitelist"
+_WHITELIST_REMOVED = re.compile(r"^Removed |not whitelisted|was not on", re.IGNORECASE)
+_NAME_SPLIT = re.compile(r"[,\s]+")
+# "Added Steve to the whitelist" / "Player is already whitelisted"
+_WHITELIST_ADDED = re.compile(r"^Added ", re.IGNORECASE)
+_WHITELIST_ALREADY = re.compile(r"already whitelisted", re.IGNORECASE)
+
+# Java edition usernames; anything else in an uploaded list is reported back as invalid
+_USERNAME = re.compile(r"^[A-Za-z0-9_]{3,16}$")
+_FIELD_SPLIT = re.compile(r"[,;\t]")
+_HEADER_NAMES = {"username", "name", "player", "minecraft_username", "minecraft"}
+
+# Server log lines: vanilla "[12:34:56] [Server thread/INFO]: ..." or Paper "[12:34:56 INFO]: ..."
+_LOG_PREFIX = re.compile(r"^\[[^\]]*\](?: \[[^\]]*\])?: ")
+_LOG_CHAT = re.compile(r"^(?:\[Not Secure\] )?<([^>]+)> (.*)")
+_LOG_JOIN = re.compile(r"^(\w{1,16}) joined the game")
+_LOG_LEAVE = re.compile(r"^(\w{1,16}) left the game")
+_LOG_ADVANCEMENT = re.compile(r"^(\w{1,16}) has (?:made the advancement|completed the challenge|reached the goal) \[(.+)\]")
+# Vanilla death messages all start with the victim's name and one of these phrases
+_LOG_DEATH = re.compile(
+    r"^(\w{1,16}) (?:was |were |died|drowned|blew up|burned|fell |hit the ground|starved|suffocated|froze|"
+    r"tried to swim|walked into|went up in flames|went off|experienced kinetic|withered away|"
+    r"discovered the floor|didn't want to live|left the confines)"
+)
+
+
+def strip_colors(text):
+    """Remove § formatting codes"""
+    return _COLOR_CODES.sub("", text)
+
+
+def is_unknown_command(text):
+    """Whether the server rejected the command as unknown (vanilla, Spigot or Paper wording)"""
+    return _UNKNOWN_COMMAND.search(text) is not None
+
+
+def _split_names(text):
+    return tuple(name for name in _NAME_SPLIT.split(text) if name)
+
+
+class PlayerList:
+    """Parsed reply to "list" """
+
+    __slots__ = ("online", "max", "names")
+
+    def __init__(self, online, max, names):
+        self.online = online
+        self.max = max
+        self.names = names
+
+    def __repr__(self):
+        return f"PlayerList(online={self.online}, max={self.max}, names={self.names!r})"
+
+
+class TpsReading:
+    """Parsed reply to Paper/Spigot "tps" """
+
+    __slots__ = ("one_minute", "five_minute", "fifteen_minute")
+
+    def __init__(self, one_minute, five_minute, fifteen_minute):
+        self.one_minute = one_minute
+        self.five_minute = five_minute
+        self.fifteen_minute = fifteen_minute
+
+    def __repr__(self):
+        return f"TpsReading({self.one_minute}, {self.five_minute}, {self.fifteen_minute})"
+
+
+class MemoryReading:
+    """Parsed reply to "gc"; sizes are in MB"""
+
+    __slots__ = ("max_mb", "allocated_mb", "free_mb", "uptime")
+
+    def __init__(self, max_mb, allocated_mb, free_mb, uptime):
+        self.max_mb = max_mb
+        self.allocated_mb = allocated_mb
+        self.free_mb = free_mb
+        self.uptime = uptime
+
+    @property
+    def used_mb(self):
+        if self.allocated_mb is None or self.free_mb is None:
+            return None
+        return self.allocated_mb - self.free_mb
+
+    def __repr__(self):
+        return f"MemoryReading(max={self.max_mb}, allocated={self.allocated_mb}, free={self.free_mb})"
+
+
+class VersionInfo:
+    """Parsed reply to "version" """
+
+    __slots__ = ("software", "build", "minecraft")
+
+    def __init__(self, software, build, minecraft):
+        self.software = software
+        self.build = build
+        self.minecraft = minecraft
+
+    def __repr__(self):
+        return f"VersionInfo({self.software!r}, {self.build!r}, {self.minecraft!r})"
+
+
+def parse_list(text):
+    """Parse "list" output into a PlayerList, or None if it isn't recognised"""
+    match = _LIST.search(strip_colors(text))
+    if match is None:
+        return None
+    # Paper groups names by permission group ("default: a, b"); drop the group labels
+    names = _split_names(_LIST_GROUP_PREFIX.sub("", match.group(3)))
+    return PlayerList(int(match.group(1)), int(match.group(2)), names)
+
+
+def parse_tps(text):
+    """Parse Paper/Spigot "tps" output into a TpsReading, or None"""
+    match = _TPS.search(strip_colors(text))
+    if match is None:
+        return None
+    return TpsReading(*(float(value) for value in match.groups()))
+
+
+def parse_debug_stop(text):
+    """Parse the ticks-per-second figure from vanilla "debug stop", or None"""
+    match = _DEBUG_STOP.search(strip_colors(text))
+    return float(match.group(1)) if match else None
+
+
+def is_debug_started(text):
+    """Whether "debug start" began profiling (not refused because someone is already profiling)"""
+    return _DEBUG_STARTED.search(strip_colors(text).strip()) is not None
+
+
+def parse_tick_query(text):
+    """Ticks per second from vanilla "tick query": the target rate, or less if ticks take too long; None if unparsable"""
+    text = strip_colors(text)
+    rate = _TICK_RATE.search(text)
+    tick_time = _TICK_TIME.search(text)
+    if rate is None or tick_time is None:
+        return None
+    target = float(rate.group(1))
+    milliseconds = float(tick_time.group(1))
+    return min(target, 1000.0 / milliseconds) if milliseconds > 0 else target
+
+
+def parse_gc(text):
+    """Parse "gc" output into a MemoryReading, or None"""
+    text = strip_colors(text)
+    fields = {name.lower(): int(value.replace(",", "")) for name, value in _MEMORY_FIELD.findall(text)}
+    if not fields:
+        return None
+    uptime = _UPTIME.search(text)
+    return MemoryReading(fields.get("maximum"), fields.get("allocated"), fields.get("free"),
+                         uptime.group(1).strip() if uptime else None)
+
+
+def parse_version(text):
+    """Parse "version" output into a VersionInfo, or None"""
+    text = strip_colors(text)
+    match = _VERSION_PAPER.search(text)
+    if match:
+        return VersionInfo(*match.groups())
+    match = _VERSION_VANILLA.search(text)
+    if match:
+        return VersionInfo("Vanilla", None, match.group(1).strip())
+    return None
+
+
+def parse_whitelist(text):
+    """Parse "whitelist list" output into a tuple of names, or None"""
+    match = _WHITELIST.search(strip_colors(text))
+    if match is None:
+        return None
+    if match.group(1).lower() == "no":
+        return ()
+    return _split_names(match.group(2) or "")
+
+
+def is_whitelist_removal(text):
+    """Whether "whitelist remove" left the player off the whitelist"""
+    return _WHITELIST_REMOVED.search(strip_colors(text)) is not None
+
+
+def is_whitelist_addition(text):
+    """Whether "whitelist add" added the player"""
+    return _WHITELIST_ADDED.search(strip_colors(text)) is not None
+
+
+def is_already_whitelisted(text):
+    return _WHITELIST_ALREADY.search(strip_colors(text)) is not None
+
+
+def parse_username_file(text):
+    """Parse an uploaded player list into (usernames, invalid entries).
+
+    Accepts one name per line, whitespace-separated names, or CSV/TSV where the first
+    column is the username (a header row is skipped). Names are de-duplicated case-insensitively.
+    """
+    names = []
+    invalid = []
+    seen = set()
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        if _FIELD_SPLIT.search(line):
+            tokens = [_FIELD_SPLIT.split(line, 1)[0].strip().strip('"')]
+        else:
+            tokens = line.split()
+        for token in tokens:
+            if token.lower() in _HEADER_NAMES:
+                continue
+            if not _USERNAME.match(token):
+                invalid.append(token)
+                continue
+            key = token.lower()
+            if key not in seen:
+                seen.add(key)
+                names.append(token)
+    return names, invalid
+
+
+class LogEvent:
+    """A chat message, join, leave, death or advancement from a server log"""
+
+    __slots__ = ("kind", "player", "text")
+
+    def __init__(self, kind, player, text):
+        self.kind = kind
+        self.player = player
+        self.text = text
+
+    def __repr__(self):
+        return f"LogEvent({self.kind!r}, {self.player!r}, {self.text!r})"
+
+
+def parse_log_line(line):
+    """Parse one latest.log line into a LogEvent, or None for everything the relay ignores"""
+    match = _LOG_PREFIX.match(line)
+    if match is None:
+        return None
+    message = strip_colors(line[match.end():].rstrip())
+    match = _LOG_CHAT.match(message)
+    if match:
+        return LogEvent("chat", match.group(1), match.group(2))
+    match = _LOG_JOIN.match(message)
+    if match:
+        return LogEvent("join", match.group(1), message)
+    match = _LOG_LEAVE.match(message)
+    if match:
+        return LogEvent("leave", match.group(1), message)
+    match = _LOG_ADVANCEMENT.match(message)
+    if match:
+        return LogEvent("advancement", match.group(1), message)
+    match = _LOG_DEATH.match(message)
+    if match:
+        return LogEvent("death", match.group(1), message)
+    return None
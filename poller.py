@@ -0,0 +1,195 @@
+import asyncio
+import logging
+import time
+from parsers import is_unknown_command, parse_gc, parse_list, parse_version
+
+logger = logging.getLogger(__name__)
+
+# Queries run on every poll, in one pipelined batch, and the snapshot field each one fills
+POLL_QUERIES = {
+    "list": "players",
+    "version": "version",
+    "gc": "memory",
+    "time query daytime": "time",
+    "weather query": "weather",
+}
+
+
+class ServerSnapshot:
+    """Last known state of one server, as seen by the poller"""
+
+    __slots__ = ("server_key", "players", "version", "memory", "time", "weather",
+                 "player_list", "version_info", "memory_info",
+                 "updated", "last_seen", "error", "unsupported")
+
+    def __init__(self, server_key):
+        self.server_key = server_key
+        self.players = None
+        self.version = None
+        self.memory = None
+        self.time = None
+        self.weather = None
+        self.player_list = None
+        self.version_info = None
+        self.memory_info = None
+        self.updated = None
+        self.last_seen = None
+        self.error = None
+        self.unsupported = set()
+
+    @property
+    def reachable(self):
+        return self.error is None and self.last_seen is not None
+
+    def age(self):
+        """Seconds since the server last answered a poll"""
+        if self.last_seen is None:
+            return None
+        return time.time() - self.last_seen
+
+    def age_text(self):
+        age = self.age()
+        if age is None:
+            return "never"
+        if age < 60:
+            return f"{int(age)}s ago"
+        return f"{int(age // 60)}m ago"
+
+
+class ServerStatePoller:
+    """Polls every configured server in the background and keeps a snapshot of each"""
+
+    def __init__(self, get_servers, fetch_batch, interval=30.0, active_interval=10.0,
+                 max_interval=300.0, active_window=300.0, concurrency=8):
+        self.get_servers = get_servers
+        self.fetch_batch = fetch_batch
+        self.interval = interval
+        self.active_interval = active_interval
+        self.max_interval = max_interval
+        self.active_window = active_window
+        self.concurrency = concurrency
+        self._snapshots = {}
+        self._next_poll = {}
+        self._failures = {}
+        self._last_activity = {}
+        self._running = {}
+        self._wakeup = None
+        self._task = None
+
+    def start(self):
+        """Start polling; safe to call again on reconnect"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def get_snapshot(self, server_key):
+        return self._snapshots.get(server_key)
+
+    def mark_active(self, server_key):
+        """Note that someone used this server, so it gets polled more often for a while"""
+        now = time.monotonic()
+        self._last_activity[server_key] = now
+        # Pull a sleepy server's next poll forward instead of waiting out its backoff
+        due = self._next_poll.get(server_key)
+        if due is not None and due > now + self.active_interval:
+            self._next_poll[server_key] = now + self.active_interval
+            self._wake()
+
+    def forget(self, server_key):
+        """Drop everything known about a server, e.g. after its config changed; it's polled again right away"""
+        self._forget(server_key)
+        self._wake()
+
+    def _wake(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _next_interval(self, server_key, snapshot):
+        failures = self._failures.get(server_key, 0)
+        if failures:
+            # Unreachable: back off exponentially
+            return min(self.interval * 2 ** (failures - 1), self.max_interval)
+        recently_used = time.monotonic() - self._last_activity.get(server_key, float("-inf")) < self.active_window
+        if recently_used:
+            return self.active_interval
+        if snapshot.player_list is not None and snapshot.player_list.online:
+            return self.interval
+        # Nobody online and nobody asking: poll lazily
+        return min(self.interval * 4, self.max_interval)
+
+    async def _run(self):
+        semaphore = asyncio.Semaphore(self.concurrency)
+        self._wakeup = asyncio.Event()
+        while True:
+            self._wakeup.clear()
+            now = time.monotonic()
+            servers = self.get_servers()
+
+            for server_key in list(self._snapshots):
+                if server_key not in servers:
+                    self._forget(server_key)
+
+            for server_key in servers:
+                if server_key in self._running:
+                    continue
+                if self._next_poll.setdefault(server_key, now) <= now:
+                    self._running[server_key] = asyncio.create_task(self._poll(server_key, semaphore))
+
+            upcoming = [due for key, due in self._next_poll.items() if key not in self._running]
+            delay = min(upcoming, default=now + 1.0) - time.monotonic()
+            # Finished polls and new activity wake us early; otherwise check for new servers every second
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), min(max(delay, 0.05), 1.0))
+            except asyncio.TimeoutError:
+                pass
+
+    async def _poll(self, server_key, semaphore):
+        snapshot = self._snapshots.setdefault(server_key, ServerSnapshot(server_key))
+        try:
+            async with semaphore:
+                queries = [query for query in POLL_QUERIES if query not in snapshot.unsupported]
+                results = await self.fetch_batch(server_key, queries)
+
+            snapshot.updated = time.time()
+            errors = [result for result in results if result.startswith("Error:")]
+            if len(errors) == len(results):
+                snapshot.error = errors[0]
+                self._failures[server_key] = self._failures.get(server_key, 0) + 1
+            else:
+                snapshot.error = None
+                snapshot.last_seen = snapshot.updated
+                self._failures[server_key] = 0
+                for query, result in zip(queries, results):
+                    if is_unknown_command(result):
+                        # Vanilla servers lack gc; stop asking
+                        snapshot.unsupported.add(query)
+                        result = None
+                    setattr(snapshot, POLL_QUERIES[query], result)
+                snapshot.player_list = parse_list(snapshot.players) if snapshot.players else None
+                snapshot.version_info = parse_version(snapshot.version) if snapshot.version else None
+                snapshot.memory_info = parse_gc(snapshot.memory) if snapshot.memory else None
+        except Exception as e:
+            logger.warning("error polling server", extra={"server": server_key, "error": str(e)})
+            snapshot.error = f"Error: {e}"
+            self._failures[server_key] = self._failures.get(server_key, 0) + 1
+        finally:
+            self._next_poll[server_key] = time.monotonic() + self._next_interval(server_key, snapshot)
+            self._running.pop(server_key, None)
+            self._wake()
+
+    def _forget(self, server_key):
+        self._snapshots.pop(server_key, None)
+        self._next_poll.pop(server_key, None)
+        self._failures.pop(server_key, None)
+        self._last_activity.pop(server_key, None)
+        task = self._running.pop(server_key, None)
+        if task is not None:
+            task.cancel()
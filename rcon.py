@@ -0,0 +1,484 @@
+import asyncio
+import struct
+import time
+from metrics import registry
+
+# Source RCON packet types (https://wiki.vg/RCON)
+SERVERDATA_AUTH = 3
+SERVERDATA_AUTH_RESPONSE = 2
+SERVERDATA_EXECCOMMAND = 2
+SERVERDATA_RESPONSE_VALUE = 0
+
+_HEADER = struct.Struct("<iii")
+_LENGTH = struct.Struct("<i")
+_MAX_REQUEST_ID = 2 ** 31 - 1
+
+# Servers split replies into packets of at most this many body bytes
+MAX_RESPONSE_BODY = 4096
+# Packet type servers don't understand; Minecraft answers it with "Unknown request ...". Sent once the
+# command's reply has started, its reply can only arrive after every fragment of the command's reply.
+# It's never written together with the command: vanilla drops clients whose read holds two packets.
+SENTINEL_TYPE = 200
+SENTINEL_PROBE_TIMEOUT = 2.0
+
+
+class RconError(Exception):
+    """Raised when an RCON connection or command fails"""
+
+
+class RconAuthError(RconError):
+    """Raised when the server rejects the RCON password"""
+
+
+class RconConnectionLost(RconError):
+    """Raised when the server closes the connection"""
+
+
+class RconPoolClosed(RconError):
+    """Raised when a pool is shut down, e.g. because the server's settings changed"""
+
+
+def encode_packet(request_id, packet_type, body):
+    """Build a raw RCON packet"""
+    payload = body.encode("utf-8")
+    return _HEADER.pack(len(payload) + 10, request_id, packet_type) + payload + b"\x00\x00"
+
+
+class ResponseBuffer:
+    """Growable byte buffer that fragments are copied into; decoded once at the end.
+
+    Decoding once also keeps multi-byte characters split across two packets intact.
+    """
+
+    __slots__ = ("data", "length")
+
+    def __init__(self, capacity=MAX_RESPONSE_BODY):
+        self.data = bytearray(capacity)
+        self.length = 0
+
+    def append(self, chunk):
+        end = self.length + len(chunk)
+        if end > len(self.data):
+            # Double, so a reply of n packets costs O(log n) reallocations
+            self.data.extend(bytes(max(end, 2 * len(self.data)) - len(self.data)))
+        self.data[self.length:end] = chunk
+        self.length = end
+
+    def text(self):
+        return str(memoryview(self.data)[:self.length], "utf-8", "replace")
+
+
+class _Reply:
+    """What the read loop knows about one outstanding request"""
+
+    __slots__ = ("future", "response_type", "buffer", "sentinel", "sentinel_id")
+
+    def __init__(self, future, response_type, sentinel):
+        self.future = future
+        self.response_type = response_type
+        self.buffer = ResponseBuffer()
+        # Whether a sentinel reply marks the end; otherwise a short fragment does
+        self.sentinel = sentinel
+        # Request ID of the sentinel to send once the first fragment arrives, until it's sent
+        self.sentinel_id = None
+
+
+class RconConnection:
+    """A single authenticated asyncio RCON connection"""
+
+    def __init__(self, host, port, password, timeout=5.0, name=None, pipelining=None):
+        self.host = host
+        self.port = port
+        self.password = password
+        self.timeout = timeout
+        self.name = name or f"{host}:{port}"
+        self.created = time.monotonic()
+        self.last_used = self.created
+        self.uses = 0
+        self._reader = None
+        self._writer = None
+        self._reader_task = None
+        self._pending = {}
+        self._sentinels = {}
+        self._next_request_id = 0
+        self._closed = False
+        # Whether the server answers sentinel packets; probed after authenticating
+        self.sentinels = False
+        # Whether the server accepts several packets in one write (None: probe it). Vanilla and
+        # Spigot drop the client instead, so their commands are sent one at a time.
+        self.pipelining = pipelining
+
+    @property
+    def closed(self):
+        return self._closed or self._writer is None or self._writer.is_closing()
+
+    def _new_request_id(self):
+        self._next_request_id = self._next_request_id % _MAX_REQUEST_ID + 1
+        return self._next_request_id
+
+    async def connect(self):
+        """Open the TCP connection, authenticate and find out what the server supports"""
+        await self._open()
+        try:
+            if self.pipelining is None:
+                try:
+                    # Two packets in one write: a server reading packet by packet answers both
+                    self.pipelining = self.sentinels = await self._probe(2)
+                except RconConnectionLost:
+                    # A vanilla-style server hung up; it takes one packet at a time
+                    self.pipelining = False
+                    await self.close()
+                    self._closed = False
+                    await self._open()
+                    self.sentinels = await self._probe(1)
+            else:
+                self.sentinels = await self._probe(1)
+        except BaseException:
+            await self.close()
+            raise
+
+    async def _open(self):
+        started = time.perf_counter()
+        self._reader, self._writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port), self.timeout
+        )
+        connected = time.perf_counter()
+        registry.observe("rcon_phase_seconds", connected - started, (("server", self.name), ("phase", "connect")))
+        self._reader_task = asyncio.create_task(self._read_loop())
+        try:
+            await self._request(SERVERDATA_AUTH, self.password, SERVERDATA_AUTH_RESPONSE)
+        except BaseException:
+            await self.close()
+            raise
+        registry.observe("rcon_phase_seconds", time.perf_counter() - connected, (("server", self.name), ("phase", "auth")))
+
+    async def _probe(self, count):
+        """Write `count` sentinel packets at once and check that the server answers every one.
+
+        Raises RconConnectionLost if the server hangs up on them.
+        """
+        loop = asyncio.get_running_loop()
+        replies = {}
+        for _ in range(count):
+            replies[self._new_request_id()] = _Reply(loop.create_future(), None, True)
+        self._sentinels.update(replies)
+        self._writer.write(b"".join(encode_packet(request_id, SENTINEL_TYPE, "") for request_id in replies))
+        try:
+            await self._writer.drain()
+            await asyncio.wait_for(self._collect([reply.future for reply in replies.values()]),
+                                   min(self.timeout, SENTINEL_PROBE_TIMEOUT))
+            return True
+        except asyncio.TimeoutError:
+            # No sentinels: fall back to treating a short fragment as the last one
+            return False
+        finally:
+            for request_id, reply in replies.items():
+                self._sentinels.pop(request_id, None)
+                if reply.future.done() and not reply.future.cancelled():
+                    reply.future.exception()
+                else:
+                    reply.future.cancel()
+
+    async def command(self, command):
+        """Run a command and return the response text"""
+        return (await self.batch([command]))[0]
+
+    async def batch(self, commands):
+        """Run several commands on this connection, pipelined where the server allows, and return their responses in order"""
+        if self.closed:
+            raise RconConnectionLost("Connection is closed")
+        self.uses += 1
+        started = time.perf_counter()
+        try:
+            results = await self._request_many(SERVERDATA_EXECCOMMAND, commands, SERVERDATA_RESPONSE_VALUE)
+        finally:
+            self.last_used = time.monotonic()
+        registry.observe("rcon_phase_seconds", time.perf_counter() - started, (("server", self.name), ("phase", "command")))
+        return results
+
+    async def _request(self, packet_type, body, response_type):
+        return (await self._request_many(packet_type, [body], response_type))[0]
+
+    async def _request_many(self, packet_type, bodies, response_type):
+        """Send the packets (in one go if the server allows it), then wait for the replies matched by request ID"""
+        if len(bodies) > 1 and not self.pipelining:
+            results = []
+            for body in bodies:
+                results.extend(await self._request_many(packet_type, [body], response_type))
+            return results
+
+        loop = asyncio.get_running_loop()
+        # Auth replies are always a single packet
+        sentinel = self.sentinels and packet_type == SERVERDATA_EXECCOMMAND
+        request_ids = []
+        futures = []
+        packets = []
+        for body in bodies:
+            request_id = self._new_request_id()
+            reply = _Reply(loop.create_future(), response_type, sentinel)
+            self._pending[request_id] = reply
+            request_ids.append(request_id)
+            futures.append(reply.future)
+            packets.append(encode_packet(request_id, packet_type, body))
+            if sentinel:
+                sentinel_id = self._new_request_id()
+                self._sentinels[sentinel_id] = reply
+                request_ids.append(sentinel_id)
+                if self.pipelining:
+                    packets.append(encode_packet(sentinel_id, SENTINEL_TYPE, ""))
+                else:
+                    reply.sentinel_id = sentinel_id
+        try:
+            self._writer.write(b"".join(packets))
+            await self._writer.drain()
+            return await self._collect_each(futures)
+        except asyncio.TimeoutError:
+            # The replies may still arrive later; don't reuse a connection in an unknown state
+            self._closed = True
+            raise RconError(f"Timed out waiting for {self.host}:{self.port}")
+        finally:
+            for request_id in request_ids:
+                self._pending.pop(request_id, None)
+                self._sentinels.pop(request_id, None)
+            for future in futures:
+                # Mark errors on replies nobody awaited as seen, and stop waiting on the rest
+                if future.done() and not future.cancelled():
+                    future.exception()
+                else:
+                    future.cancel()
+
+    @staticmethod
+    async def _collect(futures):
+        return [await future for future in futures]
+
+    async def _collect_each(self, futures):
+        # `timeout` applies to each reply, not the whole batch: the server answers in order, and
+        # slow commands (e.g. "whitelist add" looking up a profile) add up over a long batch
+        return [await asyncio.wait_for(future, self.timeout) for future in futures]
+
+    async def _read_loop(self):
+        """Read packets and hand them to whoever is waiting on their request ID"""
+        error = RconConnectionLost("Connection closed by server")
+        try:
+            while True:
+                (length,) = _LENGTH.unpack(await self._reader.readexactly(4))
+                if length < 10:
+                    raise RconError(f"Malformed packet of length {length}")
+                data = await self._reader.readexactly(length)
+                request_id, packet_type = struct.unpack_from("<ii", data)
+
+                if request_id == -1:
+                    raise RconAuthError("Authentication failed")
+
+                reply = self._pending.get(request_id)
+                if reply is not None:
+                    # Some servers send an empty RESPONSE_VALUE ahead of the AUTH_RESPONSE
+                    if packet_type != reply.response_type or reply.future.done():
+                        continue
+                    body = memoryview(data)[8:-2]
+                    reply.buffer.append(body)
+                    if reply.sentinel_id is not None:
+                        # The server has read the command; the sentinel goes in a packet of its own
+                        self._writer.write(encode_packet(reply.sentinel_id, SENTINEL_TYPE, ""))
+                        reply.sentinel_id = None
+                    if not reply.sentinel and len(body) < MAX_RESPONSE_BODY:
+                        reply.future.set_result(reply.buffer.text())
+                    continue
+
+                # Everything the server sent for the command before this sentinel has arrived
+                reply = self._sentinels.pop(request_id, None)
+                if reply is not None and not reply.future.done():
+                    reply.future.set_result(reply.buffer.text())
+        except (asyncio.IncompleteReadError, ConnectionError) as e:
+            if not isinstance(e, asyncio.IncompleteReadError):
+                error = RconConnectionLost(str(e))
+        except RconError as e:
+            error = e
+        except asyncio.CancelledError:
+            error = RconConnectionLost("Connection closed")
+        finally:
+            self._closed = True
+            for reply in list(self._pending.values()) + list(self._sentinels.values()):
+                if not reply.future.done():
+                    reply.future.set_exception(error)
+
+    async def close(self):
+        self._closed = True
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+        if self._writer is not None:
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except (OSError, asyncio.CancelledError):
+                pass
+
+
+class RconPool:
+    """A small pool of authenticated connections to a single server"""
+
+    def __init__(self, host, port, password, max_size=2, idle_timeout=300.0, timeout=5.0, name=None):
+        self.name = name
+        self.host = host
+        self.port = port
+        self.password = password
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self._idle = []
+        self._size = 0
+        self._closed = False
+        self._cond = None
+        # Learned from the first connection, so later ones skip the pipelining probe
+        self.pipelining = None
+
+    @property
+    def _condition(self):
+        # Created lazily so the pool can be built before the event loop is running
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        return self._cond
+
+    def matches(self, cfg):
+        return (self.host, int(self.port), self.password) == (cfg["host"], int(cfg["port"]), cfg["password"])
+
+    def _is_healthy(self, conn, now):
+        return not conn.closed and now - conn.last_used < self.idle_timeout
+
+    async def _acquire(self):
+        cond = self._condition
+        async with cond:
+            while True:
+                if self._closed:
+                    raise RconPoolClosed("Connection pool is closed")
+                now = time.monotonic()
+                while self._idle:
+                    # LIFO so the most recently used connection stays warm
+                    conn = self._idle.pop()
+                    if self._is_healthy(conn, now):
+                        return conn
+                    self._size -= 1
+                    asyncio.create_task(conn.close())
+                if self._size < self.max_size:
+                    self._size += 1
+                    break
+                await cond.wait()
+
+        conn = RconConnection(self.host, self.port, self.password, self.timeout, name=self.name,
+                              pipelining=self.pipelining)
+        try:
+            await conn.connect()
+        except BaseException:
+            async with cond:
+                self._size -= 1
+                cond.notify()
+            raise
+        self.pipelining = conn.pipelining
+        return conn
+
+    async def _release(self, conn, broken=False):
+        cond = self._condition
+        async with cond:
+            if broken or conn.closed or self._closed:
+                self._size -= 1
+                asyncio.create_task(conn.close())
+            else:
+                self._idle.append(conn)
+            cond.notify()
+
+    async def command(self, command):
+        """Run a command on a pooled connection"""
+        return (await self.batch([command]))[0]
+
+    async def batch(self, commands):
+        """Run several commands on one pooled connection, reconnecting once if a reused one has gone stale"""
+        while True:
+            conn = await self._acquire()
+            reused = conn.uses > 0
+            try:
+                result = await conn.batch(commands)
+            except (RconError, OSError) as e:
+                await self._release(conn, broken=True)
+                # Only retry when the server dropped an idle connection; a timeout may have run the commands
+                if reused and isinstance(e, (OSError, RconConnectionLost)):
+                    continue
+                raise
+            except BaseException:
+                await self._release(conn, broken=True)
+                raise
+            await self._release(conn)
+            return result
+
+    async def prune(self):
+        """Close idle connections that are dead or have been idle for too long"""
+        cond = self._condition
+        async with cond:
+            now = time.monotonic()
+            keep = []
+            for conn in self._idle:
+                if self._is_healthy(conn, now):
+                    keep.append(conn)
+                else:
+                    self._size -= 1
+                    asyncio.create_task(conn.close())
+            self._idle = keep
+            cond.notify_all()
+
+    async def close(self):
+        cond = self._condition
+        async with cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            cond.notify_all()
+        for conn in idle:
+            await conn.close()
+
+
+class RconPoolManager:
+    """Keeps one RconPool per servers.json entry and sweeps idle connections"""
+
+    def __init__(self, max_size=2, idle_timeout=300.0, timeout=5.0, sweep_interval=60.0):
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.sweep_interval = sweep_interval
+        self._pools = {}
+        self._sweeper = None
+
+    def get_pool(self, server_key, cfg):
+        """Return the pool for a server, replacing it if its connection settings changed"""
+        pool = self._pools.get(server_key)
+        if pool is None or not pool.matches(cfg):
+            if pool is not None:
+                asyncio.create_task(pool.close())
+            pool = RconPool(cfg["host"], int(cfg["port"]), cfg["password"],
+                            max_size=self.max_size, idle_timeout=self.idle_timeout, timeout=self.timeout,
+                            name=server_key)
+            self._pools[server_key] = pool
+        self._ensure_sweeper()
+        return pool
+
+    async def drop(self, server_key):
+        """Close and forget the pool for a server"""
+        pool = self._pools.pop(server_key, None)
+        if pool is not None:
+            await pool.close()
+
+    async def close_all(self):
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            self._sweeper = None
+        pools, self._pools = self._pools, {}
+        for pool in pools.values():
+            await pool.close()
+
+    def _ensure_sweeper(self):
+        if self._sweeper is None or self._sweeper.done():
+            self._sweeper = asyncio.create_task(self._sweep())
+
+    async def _sweep(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            for pool in list(self._pools.values()):
+                await pool.prune()
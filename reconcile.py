@@ -0,0 +1,109 @@
+import asyncio
+import logging
+from parsers import parse_whitelist
+
+logger = logging.getLogger(__name__)
+
+# Give up on a pass after this many attempts that raced with whitelist changes
+MAX_ATTEMPTS = 3
+
+
+class WhitelistReconciler:
+    """Keeps the ownership ledger in step with each server's real whitelist.
+
+    Players added in-game or through /custom show up in the ledger without an owner (only admins
+    can remove them); players removed outside the bot are dropped from it. Only the difference
+    between the two sets is written.
+    """
+
+    def __init__(self, get_servers, fetch_whitelist, ledger, get_generation, interval=900.0, concurrency=4):
+        self.get_servers = get_servers
+        self.fetch_whitelist = fetch_whitelist
+        self.ledger = ledger
+        # Changes whenever a command that may have edited the whitelist runs on the server
+        self.get_generation = get_generation
+        self.interval = interval
+        self.concurrency = concurrency
+        self._requested = set()
+        self._running = {}
+        self._wakeup = None
+        self._task = None
+
+    def start(self):
+        """Start reconciling in the background; safe to call again on reconnect"""
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        tasks = list(self._running.values())
+        if self._task is not None:
+            tasks.append(self._task)
+            self._task = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def request(self, server_key):
+        """Reconcile a server soon, e.g. after its whitelist was changed outside the usual commands"""
+        self._requested.add(server_key)
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def reconcile(self, server_key):
+        """Reconcile one server now; returns (added, removed) usernames, or None if the whitelist couldn't be read"""
+        task = self._running.get(server_key)
+        if task is None:
+            task = self._running[server_key] = asyncio.ensure_future(self._reconcile(server_key))
+            task.add_done_callback(lambda done: self._running.pop(server_key, None))
+        return await asyncio.shield(task)
+
+    async def _reconcile(self, server_key):
+        for _ in range(MAX_ATTEMPTS):
+            generation = self.get_generation(server_key)
+            known = self.ledger.get_usernames(server_key)
+            names = parse_whitelist(await self.fetch_whitelist(server_key))
+            if names is None:
+                return None
+            if self.get_generation(server_key) != generation:
+                # Something ran on the server while we were asking; the list may already be stale
+                continue
+            on_server = {name.lower() for name in names}
+            added = sorted(on_server - known)
+            removed = sorted(known - on_server)
+            if added or removed:
+                self.ledger.apply_whitelist_delta(server_key, added, removed)
+                logger.info("reconciled whitelist", extra={"server": server_key, "added": added, "removed": removed})
+            return added, removed
+        logger.info("whitelist kept changing, reconciling again later", extra={"server": server_key})
+        # Picked up on the next wakeup rather than straight away, so a busy server can't keep us spinning
+        self._requested.add(server_key)
+        return None
+
+    async def _run(self):
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def guarded(server_key):
+            async with semaphore:
+                try:
+                    await self.reconcile(server_key)
+                except Exception as e:
+                    logger.warning("error reconciling whitelist", extra={"server": server_key, "error": str(e)})
+
+        timed_out = True
+        while True:
+            servers = self.get_servers()
+            if timed_out:
+                due = list(servers)
+            else:
+                due = [server_key for server_key in self._requested if server_key in servers]
+            self._requested.clear()
+            # Cleared before the pass so requests made during it aren't lost
+            self._wakeup.clear()
+            await asyncio.gather(*(guarded(server_key) for server_key in due))
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.interval)
+                timed_out = False
+            except asyncio.TimeoutError:
+                timed_out = True
@@ -0,0 +1,255 @@
+import asyncio
+import logging
+import os
+import time
+import discord
+from parsers import parse_log_line
+
+logger = logging.getLogger(__name__)
+
+# Discord allows about 5 messages per 5 seconds per channel; one send or edit per flush stays well inside that
+FLUSH_INTERVAL = 2.0
+MAX_MESSAGE_LENGTH = 2000
+# Recent relay messages are edited to append lines instead of posting new ones
+APPEND_WINDOW = 60.0
+# Lines kept waiting per channel; older ones are dropped (and counted) when a burst outruns Discord
+MAX_BACKLOG = 500
+# Most bytes read from a log per tick, so a huge backlog can't monopolise the worker thread
+MAX_READ_BYTES = 1024 * 1024
+
+EVENT_FORMATS = {
+    "chat": "💬 **{player}**: {text}",
+    "join": "➡️ {text}",
+    "leave": "⬅️ {text}",
+    "death": "💀 {text}",
+    "advancement": "🏆 {text}",
+}
+
+
+def format_event(event):
+    # Underscores in names shouldn't turn into italics; mentions are disabled when sending
+    return EVENT_FORMATS[event.kind].format(player=discord.utils.escape_markdown(event.player),
+                                            text=discord.utils.escape_markdown(event.text))
+
+
+class LogTailer:
+    """Follows a growing log file by byte offset, surviving rotation and truncation"""
+
+    def __init__(self, path):
+        self.path = path
+        self._inode = None
+        self._offset = None
+        self._partial = b""
+
+    def read_events(self):
+        """Parse whatever was appended since the last call; blocking, so run it in a thread"""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return []
+        if self._offset is None:
+            # Start at the end: the relay shows what happens from now on, not the log's history
+            self._inode, self._offset = stat.st_ino, stat.st_size
+            return []
+        if stat.st_ino != self._inode or stat.st_size < self._offset:
+            # latest.log was rotated on restart or truncated: the new file is read from the start
+            self._inode, self._offset, self._partial = stat.st_ino, 0, b""
+        if stat.st_size == self._offset:
+            return []
+
+        with open(self.path, "rb") as f:
+            f.seek(self._offset)
+            data = f.read(MAX_READ_BYTES)
+        self._offset += len(data)
+        lines = (self._partial + data).split(b"\n")
+        # The last piece is an unfinished line until the server writes its newline
+        self._partial = lines.pop()
+
+        events = []
+        for line in lines:
+            event = parse_log_line(line.decode("utf-8", errors="replace"))
+            if event is not None:
+                events.append(event)
+        return events
+
+
+class PlayerListDiff:
+    """Join/leave events from successive player lists, for servers whose log isn't reachable"""
+
+    def __init__(self):
+        self._previous = None
+
+    def diff(self, names):
+        if names is None:
+            return []
+        current = set(names)
+        previous, self._previous = self._previous, current
+        if previous is None:
+            return []
+        return ([f"➡️ {discord.utils.escape_markdown(name)} joined the game" for name in sorted(current - previous)] +
+                [f"⬅️ {discord.utils.escape_markdown(name)} left the game" for name in sorted(previous - current)])
+
+
+class ChannelBatcher:
+    """Coalesces relay lines for one channel into as few sends and edits as possible"""
+
+    def __init__(self, channel_id):
+        self.channel_id = channel_id
+        self.lines = []
+        self.dropped = 0
+        self._message = None
+        self._message_text = ""
+        self._message_time = 0.0
+
+    def add(self, lines):
+        self.lines.extend(lines)
+        overflow = len(self.lines) - MAX_BACKLOG
+        if overflow > 0:
+            del self.lines[:overflow]
+            self.dropped += overflow
+
+    def _take(self, room):
+        """Pop as many whole lines as fit in `room` characters"""
+        taken = []
+        used = 0
+        if self.dropped:
+            note = f"… {self.dropped} lines skipped"
+            taken.append(note)
+            used = len(note) + 1
+            self.dropped = 0
+        while self.lines:
+            line = self.lines[0][:MAX_MESSAGE_LENGTH - 1]
+            if used + len(line) + 1 > room:
+                break
+            taken.append(line)
+            used += len(line) + 1
+            self.lines.pop(0)
+        return "\n".join(taken)
+
+    async def flush(self, channel):
+        """Send at most one message or edit for whatever is waiting"""
+        if not self.lines and not self.dropped:
+            return
+        now = time.monotonic()
+        next_length = len(self.lines[0]) if self.lines else 0
+        if (self._message is not None and now - self._message_time < APPEND_WINDOW
+                and len(self._message_text) + 1 + next_length < MAX_MESSAGE_LENGTH):
+            text = self._take(MAX_MESSAGE_LENGTH - len(self._message_text) - 1)
+            try:
+                self._message = await self._message.edit(content=self._message_text + "\n" + text)
+                self._message_text += "\n" + text
+                return
+            except discord.NotFound:
+                # Someone deleted the message; start a new one
+                self._message = None
+        else:
+            text = self._take(MAX_MESSAGE_LENGTH)
+        self._message = await channel.send(text, allowed_mentions=discord.AllowedMentions.none())
+        self._message_text = text
+        self._message_time = now
+
+
+class ServerRelay:
+    """Relay state for one server: where events come from and which channels (one per guild) they go to"""
+
+    def __init__(self, server_key, channel_ids, log_path):
+        self.server_key = server_key
+        self.channel_ids = channel_ids
+        self.log_path = log_path
+        self.tailer = LogTailer(log_path) if log_path else None
+        self.player_diff = PlayerListDiff()
+
+
+class RelayManager:
+    """Relays chat, joins, leaves, deaths and advancements from servers to Discord channels.
+
+    Each guild sharing a server picks its own channel ("relay_channels" in servers.json maps guild
+    IDs to channel IDs); `get_targets` returns {server_key: (channel_ids, log_path)}. With a log
+    path the relay tails latest.log once for all of them; otherwise it diffs the poller's player
+    lists, which adds no RCON traffic of its own.
+    """
+
+    def __init__(self, get_targets, get_channel, get_players, interval=1.0, flush_interval=FLUSH_INTERVAL):
+        self.get_targets = get_targets
+        self.get_channel = get_channel
+        self.get_players = get_players
+        self.interval = interval
+        self.flush_interval = flush_interval
+        self._relays = {}
+        # One batcher per channel, so servers sharing a channel share its rate limit budget too
+        self._batchers = {}
+        self._shared = set()
+        self._task = None
+
+    def start(self):
+        """Start relaying; safe to call again on reconnect"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def _sync_relays(self):
+        targets = self.get_targets()
+        for server_key in list(self._relays):
+            if server_key not in targets:
+                del self._relays[server_key]
+        for server_key, (channel_ids, log_path) in targets.items():
+            relay = self._relays.get(server_key)
+            if relay is None or relay.log_path != log_path:
+                self._relays[server_key] = ServerRelay(server_key, channel_ids, log_path)
+            else:
+                # Keeps its place in the log when a guild starts or stops relaying it
+                relay.channel_ids = channel_ids
+
+        channels = set().union(*(relay.channel_ids for relay in self._relays.values()))
+        for channel_id in list(self._batchers):
+            if channel_id not in channels:
+                del self._batchers[channel_id]
+        for channel_id in channels:
+            if channel_id not in self._batchers:
+                self._batchers[channel_id] = ChannelBatcher(channel_id)
+        self._shared = {channel_id for channel_id in channels
+                        if sum(channel_id in relay.channel_ids for relay in self._relays.values()) > 1}
+
+    async def _collect(self, relay):
+        if relay.tailer is not None:
+            events = await asyncio.to_thread(relay.tailer.read_events)
+            lines = [format_event(event) for event in events]
+        else:
+            lines = relay.player_diff.diff(self.get_players(relay.server_key))
+        if not lines:
+            return
+        for channel_id in relay.channel_ids:
+            if channel_id in self._shared:
+                self._batchers[channel_id].add([f"[{relay.server_key}] {line}" for line in lines])
+            else:
+                self._batchers[channel_id].add(lines)
+
+    async def _flush(self, batcher):
+        channel = self.get_channel(batcher.channel_id)
+        if channel is None:
+            return
+        try:
+            await batcher.flush(channel)
+        except Exception as e:
+            logger.warning("error relaying to channel", extra={"channel_id": batcher.channel_id, "error": str(e)})
+
+    async def _run(self):
+        last_flush = 0.0
+        while True:
+            self._sync_relays()
+            relays = list(self._relays.values())
+            results = await asyncio.gather(*(self._collect(relay) for relay in relays), return_exceptions=True)
+            for relay, result in zip(relays, results):
+                if isinstance(result, Exception):
+                    logger.warning("error reading relay source", extra={"server": relay.server_key, "error": str(result)})
+
+            now = time.monotonic()
+            if now - last_flush >= self.flush_interval:
+                last_flush = now
+                await asyncio.gather(*(self._flush(batcher) for batcher in list(self._batchers.values())))
+            await asyncio.sleep(self.interval)
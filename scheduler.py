@@ -0,0 +1,198 @@
+import asyncio
+import heapq
+import itertools
+import time
+
+# Priority lanes, most urgent first
+PRIORITY_ADMIN = 0     # admins' /custom and whitelist changes
+PRIORITY_ACTION = 1    # /say, /weather, players' own whitelist changes
+PRIORITY_STATUS = 2    # read-only status queries
+
+
+class SchedulerBusy(Exception):
+    """Raised when a command is refused by admission control; the message is shown to the user"""
+
+
+class TokenBucket:
+    """Classic token bucket refilled lazily on each check"""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_take(self, now=None):
+        self.refill(time.monotonic() if now is None else now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def wait_time(self):
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+
+class RateLimiter:
+    """One token bucket per key, dropping buckets that have refilled completely"""
+
+    def __init__(self, rate, capacity, max_keys=10000):
+        self.rate = rate
+        self.capacity = capacity
+        self.max_keys = max_keys
+        self._buckets = {}
+
+    def peek(self, key):
+        """Whether a token is available, without taking it"""
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            return True
+        bucket.refill(time.monotonic())
+        return bucket.tokens >= 1
+
+    def take(self, key):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if len(self._buckets) >= self.max_keys:
+                self._prune()
+            bucket = self._buckets[key] = TokenBucket(self.rate, self.capacity)
+        return bucket.try_take()
+
+    def retry_after(self, key):
+        bucket = self._buckets.get(key)
+        return bucket.wait_time() if bucket is not None else 0.0
+
+    def _prune(self):
+        now = time.monotonic()
+        for key, bucket in list(self._buckets.items()):
+            bucket.refill(now)
+            if bucket.tokens >= bucket.capacity:
+                del self._buckets[key]
+
+
+class Ticket:
+    """A command's place in a server's queue; holds a running slot once granted"""
+
+    __slots__ = ("_scheduler", "_granted", "released")
+
+    def __init__(self, scheduler, granted):
+        self._scheduler = scheduler
+        self._granted = granted
+        self.released = False
+
+    async def wait(self):
+        await self._granted
+
+    def release(self):
+        if self.released:
+            return
+        self.released = True
+        if self._granted.done() and not self._granted.cancelled():
+            self._scheduler._finish()
+        else:
+            # Gave up while still queued; the entry is skipped when it reaches the front
+            self._granted.cancel()
+
+
+class ServerScheduler:
+    """Bounded concurrency and a bounded priority queue for one server"""
+
+    def __init__(self, max_concurrency=4, max_queue=32):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.running = 0
+        self._queue = []
+        self._queued = 0
+        self._order = itertools.count()
+
+    def enter(self, priority):
+        """Take a running slot now, or a queue position; raises SchedulerBusy if the queue is full"""
+        granted = asyncio.get_running_loop().create_future()
+        if self.running < self.max_concurrency and not self._queued:
+            self.running += 1
+            granted.set_result(None)
+        elif self._queued >= self.max_queue:
+            raise SchedulerBusy("busy")
+        else:
+            heapq.heappush(self._queue, (priority, next(self._order), granted))
+            self._queued += 1
+        return Ticket(self, granted)
+
+    def _finish(self):
+        self.running -= 1
+        while self._queue and self.running < self.max_concurrency:
+            _, _, granted = heapq.heappop(self._queue)
+            self._queued -= 1
+            if granted.cancelled():
+                continue
+            self.running += 1
+            granted.set_result(None)
+
+
+class CommandScheduler:
+    """Admission control in front of RCON work: per-server queues plus per-user and per-guild rate limits"""
+
+    def __init__(self, max_concurrency=4, max_queue=32, user_rate=0.5, user_burst=5,
+                 guild_rate=5.0, guild_burst=30):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.user_limits = RateLimiter(user_rate, user_burst)
+        self.guild_limits = RateLimiter(guild_rate, guild_burst)
+        self._servers = {}
+
+    def _server(self, server_key):
+        scheduler = self._servers.get(server_key)
+        if scheduler is None:
+            scheduler = self._servers[server_key] = ServerScheduler(self.max_concurrency, self.max_queue)
+        return scheduler
+
+    def admit(self, server_key, priority, user_id, guild_id, exempt=False):
+        """Admit a command or raise SchedulerBusy with a message for the user.
+
+        Commands from `exempt` users (admins) skip the rate limits and only compete for the server's slots.
+        """
+        self._check_limits(exempt, user_id, guild_id)
+        try:
+            ticket = self._server(server_key).enter(priority)
+        except SchedulerBusy:
+            raise SchedulerBusy(f"⏳ [{server_key}] is busy right now, try again in a few seconds.")
+        self._take_limits(exempt, user_id, guild_id)
+        return ticket
+
+    def admit_many(self, server_keys, priority, user_id, guild_id, exempt=False):
+        """Admit one command fanned out to several servers, charged as a single command.
+
+        Returns a dict of server key -> Ticket, or the SchedulerBusy for servers with a full queue;
+        raises SchedulerBusy if the user or guild is rate limited.
+        """
+        self._check_limits(exempt, user_id, guild_id)
+        admitted = {}
+        for server_key in server_keys:
+            try:
+                admitted[server_key] = self._server(server_key).enter(priority)
+            except SchedulerBusy:
+                admitted[server_key] = SchedulerBusy(f"⏳ [{server_key}] is busy right now.")
+        self._take_limits(exempt, user_id, guild_id)
+        return admitted
+
+    def _check_limits(self, exempt, user_id, guild_id):
+        if not exempt:
+            if not self.user_limits.peek(user_id):
+                raise SchedulerBusy(f"⏳ You're sending commands too fast, try again in "
+                                    f"{max(self.user_limits.retry_after(user_id), 1.0):.0f}s.")
+            if not self.guild_limits.peek(guild_id):
+                raise SchedulerBusy("⏳ This Discord server is sending too many commands, try again shortly.")
+
+    def _take_limits(self, exempt, user_id, guild_id):
+        if not exempt:
+            self.user_limits.take(user_id)
+            self.guild_limits.take(guild_id)
+
+    def forget(self, server_key):
+        self._servers.pop(server_key, None)
@@ -0,0 +1,60 @@
+import os
+
+
+class ShardConfig:
+    """Which of the bot's gateway shards this process runs.
+
+    Set SHARD_COUNT to shard the bot, and SHARD_IDS (e.g. "0,1") to split the shards between
+    several processes on one host. Without SHARD_COUNT the bot runs unsharded, as one process.
+    """
+
+    def __init__(self, shard_count=None, shard_ids=None):
+        self.shard_count = shard_count
+        if shard_count is not None and shard_ids is None:
+            shard_ids = list(range(shard_count))
+        self.shard_ids = shard_ids
+        self._owned = frozenset(shard_ids or ())
+
+    @classmethod
+    def from_env(cls):
+        shard_count = os.getenv("SHARD_COUNT")
+        shard_ids = os.getenv("SHARD_IDS")
+        if not shard_count:
+            return cls()
+        shard_count = int(shard_count)
+        if shard_ids:
+            shard_ids = sorted({int(shard_id) for shard_id in shard_ids.split(",") if shard_id.strip()})
+            invalid = [shard_id for shard_id in shard_ids if not 0 <= shard_id < shard_count]
+            if invalid:
+                raise ValueError(f"SHARD_IDS {invalid} out of range for SHARD_COUNT={shard_count}")
+        return cls(shard_count, shard_ids or None)
+
+    @property
+    def enabled(self):
+        return self.shard_count is not None
+
+    @property
+    def syncs_commands(self):
+        """Only one process (the one running shard 0) syncs the command tree"""
+        return not self.enabled or 0 in self._owned
+
+    def owns_guild(self, guild_id):
+        """Whether this process's shards receive the guild's interactions (Discord's sharding formula)"""
+        if not self.enabled:
+            return True
+        return (guild_id >> 22) % self.shard_count in self._owned
+
+    def bot_options(self):
+        """Keyword arguments for the bot's constructor"""
+        if not self.enabled:
+            return {}
+        return {"shard_count": self.shard_count, "shard_ids": self.shard_ids}
+
+    def __str__(self):
+        if not self.enabled:
+            return "unsharded"
+        return f"shards {','.join(map(str, self.shard_ids))} of {self.shard_count}"
+
+
+# This process's share of the bot, from the environment
+shard_config = ShardConfig.from_env()
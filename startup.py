@@ -0,0 +1,43 @@
+import asyncio
+import contextlib
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class StartupTimer:
+    """When each startup phase finished, in seconds since the process started, reported once when ready.
+
+    Phases overlap (the stores load while the gateway connects), so each one is recorded as a
+    point in time; `measure` additionally records how long a phase itself took.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.finished_at = {}
+        self.durations = {}
+        self.reported = False
+        # Set once servers.json and the databases are loaded; commands wait for it
+        self.stores_loaded = asyncio.Event()
+
+    def mark(self, phase):
+        # Only the first time: on_ready and friends run again on every reconnect
+        self.finished_at.setdefault(phase, round(time.perf_counter() - self.started, 3))
+
+    @contextlib.contextmanager
+    def measure(self, phase):
+        started = time.perf_counter()
+        yield
+        self.durations.setdefault(phase, round(time.perf_counter() - started, 3))
+        self.mark(phase)
+
+    def report(self):
+        if self.reported:
+            return
+        self.reported = True
+        logger.info("startup timing", extra={"finished_at": self.finished_at, "durations": self.durations})
+
+
+# Created when main imports this, before anything else, so it times the whole startup
+startup = StartupTimer()
@@ -0,0 +1,17 @@
+import os
+import sys
+
+import pytest
+
+# The bot is a set of top-level modules next to this folder
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def helpers(tmp_path_factory):
+    # The stores read and write servers.json and the databases in the working directory
+    previous = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("bot"))
+    import helpers
+    yield helpers
+    os.chdir(previous)
@@ -0,0 +1,86 @@
+import asyncio
+import time
+
+from announcements import MISSED_GRACE, AnnouncementScheduler
+
+
+def _scheduler(tmp_path, delivered, **options):
+    async def deliver(announcement):
+        delivered.append(announcement.message)
+
+    return AnnouncementScheduler(str(tmp_path / "announcements.db"), deliver, **options)
+
+
+def test_announcement_fires_once_and_is_removed(tmp_path):
+    delivered = []
+    scheduler = _scheduler(tmp_path, delivered)
+
+    async def scenario():
+        scheduler.start()
+        scheduler.add(1, ["all"], "hello", 0.01, created_by=5)
+        cancelled = scheduler.add(1, ["all"], "never", 0.01)
+        assert scheduler.cancel(1, cancelled.id)
+        await asyncio.sleep(0.05)
+        scheduler.stop()
+
+    asyncio.run(scenario())
+    assert delivered == ["hello"]
+    assert scheduler.list(1) == []
+
+
+def test_repeating_announcement_is_rescheduled(tmp_path):
+    delivered = []
+    scheduler = _scheduler(tmp_path, delivered)
+
+    async def scenario():
+        scheduler.start()
+        announcement = scheduler.add(1, ["a", "b"], "tick", 0.01, repeat=0.02)
+        await asyncio.sleep(0.06)
+        scheduler.stop()
+        return announcement
+
+    announcement = asyncio.run(scenario())
+    assert len(delivered) >= 2
+    (stored,) = scheduler.list(1)
+    assert (stored.id, stored.servers) == (announcement.id, ["a", "b"])
+    assert stored.next_run > announcement.next_run
+
+
+def test_restart_drops_stale_one_shots_and_catches_up_repeats(tmp_path):
+    scheduler = _scheduler(tmp_path, [])
+    late = -MISSED_GRACE - 60
+    scheduler.add(1, ["all"], "stale", late)
+    scheduler.add(1, ["all"], "recent", -1)
+    repeating = scheduler.add(1, ["all"], "hourly", late, repeat=3600)
+
+    # A new process opens the same table
+    delivered = []
+    restarted = _scheduler(tmp_path, delivered)
+
+    async def scenario():
+        restarted.start()
+        await asyncio.sleep(0.01)
+        restarted.stop()
+
+    asyncio.run(scenario())
+    assert delivered == ["recent"]
+    (stored,) = restarted.list(1)
+    assert stored.id == repeating.id
+    # Missed occurrences are skipped, not sent all at once
+    assert time.time() < stored.next_run <= time.time() + 3600
+
+
+def test_only_owned_guilds_are_armed(tmp_path):
+    delivered = []
+    scheduler = _scheduler(tmp_path, delivered, owns_guild=lambda guild_id: guild_id == 1)
+    scheduler.add(1, ["all"], "mine", 0)
+    scheduler.add(2, ["all"], "other shard's", 0)
+
+    async def scenario():
+        scheduler.start()
+        await asyncio.sleep(0.01)
+        scheduler.stop()
+
+    asyncio.run(scenario())
+    assert delivered == ["mine"]
+    assert [announcement.message for announcement in scheduler.list(2)] == ["other shard's"]
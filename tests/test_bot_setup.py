@@ -0,0 +1,55 @@
+import asyncio
+
+import discord
+from discord import app_commands
+
+from bot_setup import InstrumentedCommandTree
+
+
+def _tree():
+    tree = InstrumentedCommandTree(discord.Client(intents=discord.Intents.none()))
+    tree.synced = 0
+
+    async def sync(guild=None):
+        tree.synced += 1
+
+    tree.sync = sync
+    return tree
+
+
+def _add_command(tree, description):
+    async def ping(interaction: discord.Interaction):
+        pass
+
+    tree.add_command(app_commands.Command(name="ping", description=description, callback=ping), override=True)
+
+
+def test_tree_is_only_synced_when_it_changes(tmp_path):
+    cache_file = str(tmp_path / "command_sync.json")
+    tree = _tree()
+    _add_command(tree, "Check the bot")
+    assert asyncio.run(tree.sync_if_changed(cache_file=cache_file))
+    # A restart with the same commands
+    tree = _tree()
+    _add_command(tree, "Check the bot")
+    assert not asyncio.run(tree.sync_if_changed(cache_file=cache_file))
+    _add_command(tree, "Check whether the bot is up")
+    assert asyncio.run(tree.sync_if_changed(cache_file=cache_file))
+    assert tree.synced == 1
+
+
+def test_guild_sync_is_tracked_separately(tmp_path):
+    cache_file = str(tmp_path / "command_sync.json")
+    tree = _tree()
+    _add_command(tree, "Check the bot")
+    assert asyncio.run(tree.sync_if_changed(cache_file=cache_file))
+    assert asyncio.run(tree.sync_if_changed(guild=discord.Object(1), cache_file=cache_file))
+    assert not asyncio.run(tree.sync_if_changed(guild=discord.Object(1), cache_file=cache_file))
+
+
+def test_unreadable_cache_means_sync(tmp_path):
+    cache_file = tmp_path / "command_sync.json"
+    cache_file.write_text("{not json")
+    tree = _tree()
+    _add_command(tree, "Check the bot")
+    assert asyncio.run(tree.sync_if_changed(cache_file=str(cache_file)))
@@ -0,0 +1,71 @@
+import asyncio
+
+from cache import ResponseCache
+
+
+def test_identical_queries_are_coalesced_and_cached():
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "reply"
+
+    async def scenario():
+        cache = ResponseCache()
+        first = await asyncio.gather(*(cache.get("s", "list", fetch) for _ in range(5)))
+        second = await cache.get("s", "list", fetch)
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert first == ["reply"] * 5
+    assert second == "reply"
+    assert len(calls) == 1
+
+
+def test_peek_only_reads_the_cache():
+    async def scenario():
+        cache = ResponseCache()
+        missed = cache.peek("s", "list")
+        await cache.get("s", "list", lambda: asyncio.sleep(0, "reply"))
+        return missed, cache.peek("s", "list"), cache.peek("s", "version")
+
+    assert asyncio.run(scenario()) == (None, "reply", None)
+
+
+def test_invalidate_drops_replies_and_in_flight_results():
+    async def scenario():
+        cache = ResponseCache()
+        await cache.get("s", "list", lambda: asyncio.sleep(0, "old"))
+        generation = cache.generation("s")
+        cache.invalidate("s")
+        return await cache.get("s", "list", lambda: asyncio.sleep(0, "new")), cache.generation("s") != generation
+
+    assert asyncio.run(scenario()) == ("new", True)
+
+
+def test_mutating_commands_invalidate():
+    cache = ResponseCache()
+    assert cache.is_cacheable("list")
+    assert cache.invalidates("whitelist add Steve")
+    assert not cache.invalidates("list")
+
+
+def test_tick_query_is_read_only():
+    assert not ResponseCache().invalidates("tick query")
+
+
+def test_get_many_only_fetches_misses():
+    fetched = []
+
+    async def fetch_many(commands):
+        fetched.append(commands)
+        return [f"{command}!" for command in commands]
+
+    async def scenario():
+        cache = ResponseCache()
+        await cache.get("s", "version", lambda: asyncio.sleep(0, "v"))
+        return await cache.get_many("s", ["version", "list"], fetch_many)
+
+    assert asyncio.run(scenario()) == ["v", "list!"]
+    assert fetched == [["list"]]
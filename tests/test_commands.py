@@ -0,0 +1,44 @@
+import asyncio
+
+from fake_rcon import DEFAULT_RESPONSES, FakeRconServer
+from test_execution import FakeInteraction
+
+
+def _embed(helpers, command, server_key, responses):
+    import commands
+
+    async def main():
+        server = await FakeRconServer("secret", responses=responses).start()
+        helpers.server_manager.add_server(server_key, server.host, server.port, "secret", 1)
+        interaction = FakeInteraction()
+        try:
+            await getattr(commands, command).callback(interaction, server=server_key)
+        finally:
+            await helpers.rcon_pools.close_all()
+            await server.stop()
+        ((_, _, embed),) = interaction.sent
+        return embed
+
+    return asyncio.run(main())
+
+
+def test_memory_is_shown_from_the_parsed_reading(helpers):
+    embed = _embed(helpers, "memory", "memory", DEFAULT_RESPONSES)
+    assert embed.description is None
+    assert [(field.name, field.value) for field in embed.fields] == [
+        ("Used", "1,024 MB"), ("Allocated", "2,048 MB"), ("Maximum", "4,096 MB"),
+        ("Uptime", "2 hours 4 minutes"),
+    ]
+
+
+def test_unparsed_memory_reply_loses_its_colour_codes(helpers):
+    embed = _embed(helpers, "memory", "memory-raw", {"gc": "§cGarbage collected§r"})
+    assert embed.description == "Garbage collected"
+
+
+def test_world_fields_lose_their_colour_codes(helpers):
+    responses = dict(DEFAULT_RESPONSES, **{"weather query": "§eThe weather is §bclear"})
+    embed = _embed(helpers, "world", "world", responses)
+    assert [field.value for field in embed.fields] == [
+        "The time is 6000", "The weather is clear", "The difficulty is Normal",
+    ]
@@ -0,0 +1,125 @@
+import asyncio
+import json
+import multiprocessing
+
+import pytest
+
+from config_watch import ConfigWatcher, fcntl, validate_servers
+
+
+def _manager(helpers):
+    """A ServerConfigManager of its own on servers.json in the working directory, like another process's"""
+    manager = object.__new__(helpers.ServerConfigManager)
+    manager._loaded = True
+    manager._load_config()
+    return manager
+
+
+def _write(path, servers):
+    path.write_text(json.dumps(servers))
+
+
+def _entry(port, *guilds, **extra):
+    return dict(host="localhost", port=port, password="secret", allowed_guilds=list(guilds), **extra)
+
+
+def _watch(manager):
+    changed = []
+
+    async def on_server_changed(server_key):
+        changed.append(server_key)
+
+    return ConfigWatcher(manager, on_server_changed), changed
+
+
+def test_hand_edit_is_reloaded(helpers, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    _write(tmp_path / "servers.json", {"a": _entry(1, 10), "b": _entry(2, 10), "c": _entry(3, 20)})
+    manager = _manager(helpers)
+    watcher, changed = _watch(manager)
+    assert list(manager.get_guild_servers(10)) == ["a", "b"]
+    assert not asyncio.run(watcher.check())
+
+    _write(tmp_path / "servers.json", {"a": _entry(1, 10), "b": _entry(2, 20), "d": _entry(4, 10)})
+    assert asyncio.run(watcher.check())
+    # Only removed and changed servers lose their connections; "a" keeps them
+    assert sorted(changed) == ["b", "c"]
+    assert list(manager.get_guild_servers(10)) == ["a", "d"]
+    assert list(manager.get_guild_servers(20)) == ["b"]
+
+
+def test_invalid_edit_keeps_the_last_good_config(helpers, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    _write(tmp_path / "servers.json", {"a": _entry(1, 10)})
+    manager = _manager(helpers)
+    watcher, changed = _watch(manager)
+
+    (tmp_path / "servers.json").write_text('{"a": {"host": "localhost"')
+    assert not asyncio.run(watcher.check())
+    _write(tmp_path / "servers.json", {"a": {"host": "localhost", "password": "secret"}})
+    assert not asyncio.run(watcher.check())
+    assert list(manager.get_servers()) == ["a"]
+    assert changed == []
+
+
+def test_validate_servers_names_the_bad_entry():
+    assert validate_servers({"a": _entry("25575")})["a"]["port"] == 25575
+    with pytest.raises(ValueError, match="b: port 70000 is out of range"):
+        validate_servers({"a": _entry(1), "b": _entry(70000)})
+    with pytest.raises(ValueError, match="a: allowed_guilds"):
+        validate_servers({"a": _entry(1, "10")})
+    with pytest.raises(ValueError, match="a: relay_channels"):
+        validate_servers({"a": _entry(1, 10, relay_channels={"10": "general"})})
+
+
+def test_each_guild_sets_its_own_relay(helpers, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    _write(tmp_path / "servers.json", {"shared": _entry(1, 10, 20)})
+    manager = _manager(helpers)
+    manager.set_relay("shared", 10, 100)
+    manager.set_relay("shared", 20, 200)
+    manager.set_relay("shared", 20, 201)
+    manager.set_relay("shared", 10, None)
+    assert manager.get_servers()["shared"]["relay_channels"] == {"20": 201}
+    manager.set_relay("shared", 20, None)
+    assert "relay_channels" not in manager.get_servers()["shared"]
+
+
+def test_edits_from_another_process_are_merged(helpers, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    _write(tmp_path / "servers.json", {})
+    first, second = _manager(helpers), _manager(helpers)
+    first.add_server("a", "localhost", 1, "secret", 10)
+    second.add_server("b", "localhost", 2, "secret", 10)
+    second.set_relay("a", 10, 99)
+    first.add_server("c", "localhost", 3, "secret", 10)
+
+    saved = json.loads((tmp_path / "servers.json").read_text())
+    assert sorted(saved) == ["a", "b", "c"]
+    assert saved["a"]["relay_channels"] == {"10": 99}
+    assert list(first.get_guild_servers(10)) == ["a", "b", "c"]
+    # The first process merged the second's change to "a" while saving; its watcher resets "a"
+    watcher, changed = _watch(first)
+    asyncio.run(watcher.check())
+    assert changed == ["a"]
+
+
+def _add_servers(worker, count):
+    import helpers
+    manager = _manager(helpers)
+    for i in range(count):
+        manager.add_server(f"{worker}-{i}", "localhost", i + 1, "secret", worker)
+
+
+@pytest.mark.skipif(fcntl is None, reason="needs advisory file locks")
+def test_concurrent_processes_lose_no_edits(helpers, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    _write(tmp_path / "servers.json", {})
+    context = multiprocessing.get_context("fork")
+    processes = [context.Process(target=_add_servers, args=(worker, 20)) for worker in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    assert [process.exitcode for process in processes] == [0] * 4
+    assert len(json.loads((tmp_path / "servers.json").read_text())) == 80
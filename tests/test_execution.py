@@ -0,0 +1,118 @@
+import asyncio
+import datetime
+
+import discord
+import pytest
+
+
+@pytest.fixture
+def execution(helpers, monkeypatch):
+    import execution
+    monkeypatch.setattr(execution, "ANSWER_DIRECTLY_WITHIN", 0.05)
+    return execution
+
+
+class FakeUser:
+    id = 1
+
+
+class FakeResponse:
+    def __init__(self, interaction):
+        self.interaction = interaction
+
+    async def send_message(self, content=None, **kwargs):
+        self.interaction.sent.append(("response", content, kwargs.get("embed")))
+
+    async def defer(self, **kwargs):
+        self.interaction.sent.append(("defer", None, None))
+
+
+class FakeFollowup:
+    def __init__(self, interaction):
+        self.interaction = interaction
+
+    async def send(self, content=None, **kwargs):
+        self.interaction.sent.append(("followup", content, kwargs.get("embed")))
+
+
+class FakeInteraction:
+    def __init__(self):
+        self.created_at = discord.utils.utcnow()
+        self.guild_id = 1
+        self.user = FakeUser()
+        self.extras = {}
+        self.sent = []
+        self.response = FakeResponse(self)
+        self.followup = FakeFollowup(self)
+
+
+async def _after(delay, result):
+    await asyncio.sleep(delay)
+    return result
+
+
+def test_quick_work_is_the_response(execution):
+    interaction = FakeInteraction()
+    asyncio.run(execution.execute(interaction, _after(0, "done")))
+    assert interaction.sent == [("response", "done", None)]
+
+
+def test_slow_work_is_deferred_then_followed_up(execution):
+    interaction = FakeInteraction()
+    asyncio.run(execution.execute(interaction, _after(0.1, "done")))
+    assert interaction.sent == [("defer", None, None), ("followup", "done", None)]
+
+
+def test_work_is_cancelled_at_the_timeout(execution):
+    interaction = FakeInteraction()
+    work = _after(5, "too late")
+    asyncio.run(execution.execute(interaction, work, timeout=0.2))
+    assert interaction.sent[0] == ("defer", None, None)
+    assert interaction.sent[1][1].startswith("⏱️ The server didn't answer within")
+    assert work.cr_frame is None
+
+
+def test_errors_are_reported(execution):
+    async def broken():
+        raise RuntimeError("boom")
+
+    interaction = FakeInteraction()
+    asyncio.run(execution.execute(interaction, broken()))
+    assert interaction.sent == [("response", "❌ Something went wrong: boom", None)]
+
+
+def test_expired_interaction_gets_no_answer(execution):
+    interaction = FakeInteraction()
+    interaction.created_at -= datetime.timedelta(minutes=15)
+    asyncio.run(execution.execute(interaction, _after(0, "done")))
+    assert interaction.sent == []
+
+
+def test_fan_out_answers_by_the_deadline(execution):
+    async def work(server):
+        if server == "slow":
+            return await _after(5, "too late")
+        if server == "broken":
+            raise RuntimeError("boom")
+        return await _after(0.01, f"{server} ok")
+
+    interaction = FakeInteraction()
+    servers = ["fast", "slow", "broken"]
+    asyncio.run(execution.execute_all(interaction, servers, work, "Status", 0, deadline=0.2))
+    _, _, embed = interaction.sent[-1]
+    assert [field.name for field in embed.fields] == servers
+    fast, slow, broken = (field.value for field in embed.fields)
+    assert fast == "fast ok"
+    assert slow.startswith("⏱️ No answer within")
+    assert broken == "❌ Something went wrong: boom"
+    assert embed.footer.text == "1 of 3 servers answered"
+
+
+def test_long_output_is_paged_then_attached(execution):
+    text = "\n".join(f"line {i:04}" for i in range(400))
+    pages = execution.long_text(text, "output.txt")
+    assert len(pages) == 2
+    assert all(len(page) <= execution.MAX_MESSAGE_LENGTH for page in pages)
+    assert "\n".join(pages) == text
+    assert execution.long_text("short", "output.txt") == "short"
+    assert execution.long_text("x" * 10000, "output.txt")["file"].filename == "output.txt"
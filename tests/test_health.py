@@ -0,0 +1,39 @@
+import time
+
+from health import CLOSED, HALF_OPEN, OPEN, HealthTracker
+
+
+def test_breaker_opens_after_threshold_and_probes_after_backoff():
+    tracker = HealthTracker(failure_threshold=2, base_backoff=0.05)
+    tracker.record_failure("s", OSError("refused"))
+    assert tracker.allow("s")
+    tracker.record_failure("s", OSError("refused"))
+    assert tracker.get("s").state == OPEN
+    assert not tracker.allow("s")
+    assert tracker.offline_message("s").startswith("Error: Server offline")
+
+    time.sleep(0.06)
+    assert tracker.allow("s")
+    assert tracker.get("s").state == HALF_OPEN
+    # Only one probe at a time
+    assert not tracker.allow("s")
+    tracker.record_success("s")
+    assert tracker.get("s").state == CLOSED
+
+
+def test_failed_probe_doubles_backoff():
+    tracker = HealthTracker(failure_threshold=1, base_backoff=0.05)
+    tracker.record_failure("s", OSError())
+    time.sleep(0.06)
+    assert tracker.allow("s")
+    tracker.record_failure("s", OSError())
+    assert tracker.get("s").backoff == 0.1
+    assert not tracker.allow("s")
+
+
+def test_release_probe_reopens():
+    tracker = HealthTracker(failure_threshold=1, base_backoff=0.0)
+    tracker.record_failure("s", OSError())
+    assert tracker.allow("s")
+    tracker.release_probe("s")
+    assert tracker.get("s").state == OPEN
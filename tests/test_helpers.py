@@ -0,0 +1,143 @@
+import asyncio
+import json
+
+import pytest
+
+from fake_rcon import FakeRconServer
+
+
+def test_legacy_json_ledger_is_migrated(helpers, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    legacy = {"entries": {"survival:Steve": 1, "host:25565:Alex": "2"}}
+    (tmp_path / "user_management.json").write_text(json.dumps(legacy))
+    # A store of its own, so the shared one keeps its database
+    store = object.__new__(helpers.UserManagementSystem)
+    store._load_data()
+    assert store.get_owner("survival", "steve") == "1"
+    assert store.get_owner("host:25565", "ALEX") == "2"
+    assert not (tmp_path / "user_management.json").exists()
+    assert (tmp_path / "user_management.json.migrated").exists()
+
+
+def _run(helpers, scenario, server_key, **server_options):
+    async def main():
+        server = await FakeRconServer("secret", **server_options).start()
+        helpers.server_manager.add_server(server_key, server.host, server.port, "secret", 1)
+        try:
+            return await scenario(server)
+        finally:
+            await helpers.rcon_pools.close_all()
+            await server.stop()
+
+    return asyncio.run(main())
+
+
+def test_cache_hit_does_not_strand_the_breaker(helpers):
+    async def scenario(server):
+        helpers.server_health.base_backoff = 0.05
+        await helpers.rcon_command("breaker", "whitelist list")
+        health = helpers.server_health.get("breaker")
+        for _ in range(helpers.server_health.failure_threshold):
+            helpers.server_health.record_failure("breaker", OSError("down"))
+        await asyncio.sleep(0.06)
+        # Answered from the cache; must not use up the probe
+        await helpers.rcon_command("breaker", "whitelist list")
+        assert "players online" in await helpers.rcon_command("breaker", "list")
+        return health.state
+
+    assert _run(helpers, scenario, "breaker") == "closed"
+
+
+def test_already_whitelisted_player_keeps_their_owner(helpers):
+    async def scenario(server):
+        server.whitelist.add("Outsider")
+        await helpers.add_player("owners", "Outsider", 99)
+        await helpers.add_player("owners", "Newcomer", 99)
+        return helpers.user_manager.get_owners("owners")
+
+    owners = _run(helpers, scenario, "owners")
+    assert "outsider" not in owners
+    assert owners["newcomer"] == "99"
+
+
+@pytest.mark.parametrize("vanilla", [False, True])
+def test_bulk_add_records_what_the_server_added(helpers, vanilla):
+    server_key = f"bulk-{vanilla}"
+
+    async def scenario(server):
+        server.whitelist.add("already")
+        results = await helpers.add_players(server_key, ["already"] + [f"player{i}" for i in range(60)], 7)
+        return results, helpers.user_manager.get_owners(server_key), server.whitelist
+
+    results, owners, whitelist = _run(helpers, scenario, server_key, vanilla=vanilla)
+    assert sum(reply.startswith("Added") for _, reply in results) == 60
+    assert len(whitelist) == 61
+    assert sorted(owners) == sorted(f"player{i}" for i in range(60))
+
+
+def test_bulk_errors_are_settled_from_the_whitelist(helpers):
+    async def scenario(server):
+        server.whitelist.update({"ran", "owned", "ingame"})
+        helpers.user_manager.record_addition("settle", "owned", 5)
+        results = [(name, "Error: Timed out") for name in ("ran", "owned", "ingame", "never")]
+        return (await helpers._settle_errors("settle", "add", results, before={"owned", "ingame"}),
+                await helpers._settle_errors("settle", "add", results[:1]))
+
+    settled, unconfirmed = _run(helpers, scenario, "settle")
+    assert settled == [
+        ("ran", "Added ran to the whitelist"),
+        ("owned", "Player is already whitelisted"),
+        ("ingame", "Player is already whitelisted"),
+        ("never", "Error: Timed out"),
+    ]
+    # Without a whitelist from before the import, nothing counts as added
+    assert not helpers.is_whitelist_addition(unconfirmed[0][1])
+
+
+def test_failed_bulk_add_never_claims_players_already_whitelisted(helpers, monkeypatch):
+    async def scenario(server):
+        server.whitelist.add("preexisting")
+        rcon_batch = helpers.rcon_batch
+
+        async def timed_out(server_key, commands):
+            # The commands ran, but the replies never arrived
+            await rcon_batch(server_key, commands)
+            return ["Error: Timed out"] * len(commands)
+
+        monkeypatch.setattr(helpers, "rcon_batch", timed_out)
+        results = await helpers.add_players("claims", ["new1", "preexisting"], 42)
+        return results, helpers.user_manager.get_owners("claims")
+
+    results, owners = _run(helpers, scenario, "claims")
+    assert results == [("new1", "Added new1 to the whitelist"), ("preexisting", "Player is already whitelisted")]
+    assert owners == {"new1": "42", "preexisting": ""}
+
+
+def test_cancelled_bulk_add_records_every_batch_that_ran(helpers, monkeypatch):
+    monkeypatch.setattr(helpers, "BULK_BATCH_SIZE", 5)
+
+    async def scenario(server):
+        # Like a command timeout cancelling a long import halfway through a batch
+        task = asyncio.ensure_future(helpers.add_players("cancelled", [f"player{i}" for i in range(20)], 8))
+        await asyncio.sleep(0.25)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        # The batch that was running completes on its own
+        await asyncio.sleep(0.2)
+        return set(server.whitelist), helpers.user_manager.get_owners("cancelled")
+
+    whitelist, owners = _run(helpers, scenario, "cancelled", latency=0.02)
+    assert 0 < len(whitelist) < 20
+    assert set(owners) == whitelist
+
+
+def test_changed_server_loses_its_scheduler_queue(helpers):
+    from scheduler import PRIORITY_STATUS
+
+    async def scenario():
+        helpers.command_scheduler.admit("renamed", PRIORITY_STATUS, 1, 1).release()
+        assert "renamed" in helpers.command_scheduler._servers
+        await helpers._reset_server("renamed")
+
+    asyncio.run(scenario())
+    assert "renamed" not in helpers.command_scheduler._servers
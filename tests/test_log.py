@@ -0,0 +1,58 @@
+import json
+import logging
+import queue
+import sys
+
+from log import REDACTED, DroppingQueueHandler, JsonFormatter, SamplingFilter, SecretRedactor, redactor
+
+
+def _record(msg, *args, **extra):
+    record = logging.LogRecord("test", logging.INFO, __file__, 1, msg, args, None)
+    record.__dict__.update(extra)
+    return record
+
+
+def test_known_secrets_and_secret_fields_are_redacted():
+    redactor.register("hunter22", "abc")
+    entry = json.loads(JsonFormatter().format(_record(
+        "connecting with %s", "hunter22",
+        server="survival", password="anything", options={"rcon_password": "x", "note": "pw hunter22"},
+        commands=["say hunter22"], short="abc",
+    )))
+    assert entry["msg"] == f"connecting with {REDACTED}"
+    assert entry["password"] == REDACTED
+    assert entry["options"] == {"rcon_password": REDACTED, "note": f"pw {REDACTED}"}
+    assert entry["commands"] == [f"say {REDACTED}"]
+    # Too short to redact without mangling unrelated text
+    assert entry["short"] == "abc"
+    assert entry["server"] == "survival"
+
+
+def test_longer_secrets_are_redacted_first():
+    secrets = SecretRedactor()
+    secrets.register("pass", "password1")
+    assert secrets.scrub("password1 pass") == f"{REDACTED} {REDACTED}"
+
+
+def test_sampling_keeps_one_in_n_and_every_warning():
+    sampling = SamplingFilter(3)
+    kept = [sampling.filter(_record("rcon command", sampled=True)) for _ in range(6)]
+    assert kept == [True, False, False, True, False, False]
+    warning = _record("rcon command", sampled=True)
+    warning.levelno = logging.WARNING
+    assert sampling.filter(warning)
+
+
+def test_queued_records_keep_their_traceback_and_overflow_is_dropped():
+    handler = DroppingQueueHandler(queue.Queue(1))
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        record = logging.LogRecord("test", logging.ERROR, __file__, 1, "failed %s", ("badly",), sys.exc_info())
+    handler.emit(record)
+    handler.emit(record)
+    assert handler.dropped == 1
+
+    entry = json.loads(JsonFormatter().format(handler.queue.get_nowait()))
+    assert entry["msg"] == "failed badly"
+    assert entry["exc"].endswith("ValueError: boom")
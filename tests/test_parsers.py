@@ -0,0 +1,46 @@
+from parsers import (is_already_whitelisted, is_debug_started, is_unknown_command, is_whitelist_addition,
+                     is_whitelist_removal, parse_debug_stop, parse_list, parse_tick_query, parse_tps,
+                     parse_username_file, parse_whitelist)
+
+
+def test_parse_list_formats():
+    vanilla = parse_list("There are 2 of a max of 20 players online: Steve, Alex")
+    assert (vanilla.online, vanilla.max, vanilla.names) == (2, 20, ("Steve", "Alex"))
+    paper = parse_list("There are 1 out of maximum 50 players online.\ndefault: Notch")
+    assert (paper.online, paper.max, paper.names) == (1, 50, ("Notch",))
+    assert parse_list("Unknown command") is None
+
+
+def test_parse_tps():
+    reading = parse_tps("§6TPS from last 1m, 5m, 15m: §a*20.0, §a19.5, §a19.98")
+    assert reading.one_minute == 20.0
+    assert parse_tps("Unknown or incomplete command") is None
+
+
+def test_vanilla_tick_readings():
+    assert parse_tick_query("Target tick rate: 20.0 per second.\nAverage time per tick: 3.1ms (Target: 50.0ms)") == 20.0
+    assert parse_tick_query("Target tick rate: 20.0 per second.\nAverage time per tick: 100.0ms") == 10.0
+    assert parse_debug_stop("Stopped tick profiling after 5.00 seconds and 95 ticks (19.00 ticks per second)") == 19.0
+    assert is_debug_started("Started tick profiling")
+    assert not is_debug_started("Can't start profiling, profiling already started")
+
+
+def test_whitelist_replies():
+    assert is_whitelist_addition("Added Steve to the whitelist")
+    assert not is_whitelist_addition("Player is already whitelisted")
+    assert is_already_whitelisted("Player is already whitelisted")
+    assert is_whitelist_removal("Removed Steve from the whitelist")
+    assert is_whitelist_removal("Player is not whitelisted")
+    assert is_unknown_command("Unknown or incomplete command, see below for error")
+
+
+def test_parse_whitelist():
+    assert parse_whitelist("There are 2 whitelisted player(s): Steve, Alex") == ("Steve", "Alex")
+    assert parse_whitelist("There are no whitelisted players") == ()
+    assert parse_whitelist("Error: Server offline") is None
+
+
+def test_parse_username_file():
+    names, invalid = parse_username_file("username,note\nSteve,hi\nsteve,dup\nnot a name!,x\nAlex,\n")
+    assert names == ["Steve", "Alex"]
+    assert invalid == ["not a name!"]
@@ -0,0 +1,95 @@
+import asyncio
+
+import pytest
+
+from fake_rcon import FakeRconServer
+from rcon import RconAuthError, RconPool
+
+
+async def _with_pool(scenario, **server_options):
+    server = await FakeRconServer("secret", **server_options).start()
+    pool = RconPool(server.host, server.port, "secret")
+    try:
+        return await scenario(server, pool)
+    finally:
+        await pool.close()
+        await server.stop()
+
+
+@pytest.mark.parametrize("vanilla", [False, True])
+def test_single_command(vanilla):
+    async def scenario(server, pool):
+        return await pool.command("list")
+
+    assert asyncio.run(_with_pool(scenario, vanilla=vanilla)).startswith("There are 2 of a max of 20")
+
+
+@pytest.mark.parametrize("vanilla", [False, True])
+def test_batch_replies_in_order(vanilla):
+    async def scenario(server, pool):
+        return await pool.batch(["version", "list", "difficulty"])
+
+    version, players, difficulty = asyncio.run(_with_pool(scenario, vanilla=vanilla))
+    assert "Paper" in version
+    assert "players online" in players
+    assert difficulty == "The difficulty is Normal"
+
+
+@pytest.mark.parametrize("vanilla", [False, True])
+def test_multi_packet_reply_is_reassembled(vanilla):
+    # Non-ASCII characters end up split across the 4096-byte packet boundaries
+    text = "é" * 10000 + "end"
+
+    async def scenario(server, pool):
+        return await pool.batch(["big", "list"])
+
+    big, players = asyncio.run(_with_pool(scenario, vanilla=vanilla, responses={"big": text, "list": "x"}))
+    assert big == text
+    assert players == "x"
+
+
+def test_vanilla_server_is_not_pipelined():
+    async def scenario(server, pool):
+        await pool.batch(["list", "list"])
+        return pool.pipelining
+
+    assert asyncio.run(_with_pool(scenario, vanilla=True)) is False
+    assert asyncio.run(_with_pool(scenario)) is True
+
+
+def test_connection_is_reused():
+    async def scenario(server, pool):
+        for _ in range(5):
+            await pool.command("list")
+        return server.connections_opened
+
+    assert asyncio.run(_with_pool(scenario)) == 1
+
+
+def test_wrong_password():
+    async def scenario():
+        server = await FakeRconServer("secret").start()
+        pool = RconPool(server.host, server.port, "wrong")
+        try:
+            await pool.command("list")
+        finally:
+            await pool.close()
+            await server.stop()
+
+    with pytest.raises(RconAuthError):
+        asyncio.run(scenario())
+
+
+def test_slow_batch_gets_a_timeout_per_reply():
+    async def scenario():
+        server = await FakeRconServer("secret", latency=0.1).start()
+        pool = RconPool(server.host, server.port, "secret", timeout=0.5)
+        try:
+            # 10 commands take about 1s in total, twice the timeout
+            return await pool.batch([f"whitelist add player{i}" for i in range(10)])
+        finally:
+            await pool.close()
+            await server.stop()
+
+    replies = asyncio.run(scenario())
+    assert all(reply.startswith("Added") for reply in replies)
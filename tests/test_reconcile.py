@@ -0,0 +1,39 @@
+import asyncio
+
+from reconcile import WhitelistReconciler
+
+
+class FakeLedger:
+    def __init__(self, owners):
+        self.owners = dict(owners)
+
+    def get_usernames(self, server_key):
+        return set(self.owners)
+
+    def apply_whitelist_delta(self, server_key, added, removed):
+        for username in added:
+            self.owners.setdefault(username, "")
+        for username in removed:
+            self.owners.pop(username, None)
+
+
+def _reconciler(ledger, whitelist_reply):
+    async def fetch(server_key):
+        return whitelist_reply
+
+    return WhitelistReconciler(lambda: {"s": {}}, fetch, ledger, lambda server_key: 0)
+
+
+def test_reconcile_applies_only_the_difference():
+    ledger = FakeLedger({"steve": "1", "gone": "2"})
+    reconciler = _reconciler(ledger, "There are 2 whitelisted player(s): Steve, Alex")
+    assert asyncio.run(reconciler.reconcile("s")) == (["alex"], ["gone"])
+    # Found on the server without an owner; existing owners are kept
+    assert ledger.owners == {"steve": "1", "alex": ""}
+
+
+def test_unreadable_whitelist_changes_nothing():
+    ledger = FakeLedger({"steve": "1"})
+    reconciler = _reconciler(ledger, "Error: Server offline")
+    assert asyncio.run(reconciler.reconcile("s")) is None
+    assert ledger.owners == {"steve": "1"}
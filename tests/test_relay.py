@@ -0,0 +1,158 @@
+import asyncio
+
+import discord
+
+from relay import MAX_BACKLOG, ChannelBatcher, LogTailer, PlayerListDiff, RelayManager
+
+LOG_PREFIX = "[12:00:00] [Server thread/INFO]: "
+
+
+def _log(path, *lines, end="\n"):
+    with open(path, "a") as f:
+        f.write("".join(LOG_PREFIX + line + "\n" for line in lines[:-1]) + LOG_PREFIX + lines[-1] + end)
+
+
+def _kinds(events):
+    return [(event.kind, event.player) for event in events]
+
+
+def test_tailer_starts_at_the_end_and_waits_for_whole_lines(tmp_path):
+    path = tmp_path / "latest.log"
+    _log(path, "Steve joined the game")
+    tailer = LogTailer(str(path))
+    assert tailer.read_events() == []
+
+    _log(path, "<Steve> hello", "Alex joined the", end="")
+    assert _kinds(tailer.read_events()) == [("chat", "Steve")]
+    with open(path, "a") as f:
+        f.write(" game\n" + LOG_PREFIX + "Preparing spawn area: 50%\n")
+    assert _kinds(tailer.read_events()) == [("join", "Alex")]
+    assert tailer.read_events() == []
+
+
+def test_tailer_follows_rotation_and_truncation(tmp_path):
+    path = tmp_path / "latest.log"
+    _log(path, "Steve joined the game")
+    tailer = LogTailer(str(path))
+    tailer.read_events()
+
+    # The server moves latest.log aside on restart and starts a new, shorter one
+    path.rename(tmp_path / "old.log")
+    _log(path, "Alex left the game")
+    assert _kinds(tailer.read_events()) == [("leave", "Alex")]
+    path.write_text(LOG_PREFIX + "Steve drowned\n")
+    assert _kinds(tailer.read_events()) == [("death", "Steve")]
+
+
+def test_player_list_diff():
+    diff = PlayerListDiff()
+    assert diff.diff(["Steve"]) == []
+    assert diff.diff(None) == []
+    assert diff.diff(["Alex"]) == ["➡️ Alex joined the game", "⬅️ Steve left the game"]
+
+
+class FakeMessage:
+    def __init__(self, channel, content):
+        self.channel = channel
+        self.content = content
+
+    async def edit(self, content):
+        self.channel.edits.append(content)
+        self.content = content
+        return self
+
+
+class FakeChannel:
+    def __init__(self):
+        self.sent = []
+        self.edits = []
+
+    async def send(self, content, **kwargs):
+        self.sent.append(content)
+        return FakeMessage(self, content)
+
+
+def test_batcher_appends_to_its_last_message():
+    channel = FakeChannel()
+    batcher = ChannelBatcher(1)
+
+    async def scenario():
+        batcher.add(["one", "two"])
+        await batcher.flush(channel)
+        batcher.add(["three"])
+        await batcher.flush(channel)
+        await batcher.flush(channel)
+
+    asyncio.run(scenario())
+    assert channel.sent == ["one\ntwo"]
+    assert channel.edits == ["one\ntwo\nthree"]
+
+
+def test_batcher_starts_a_new_message_when_full():
+    channel = FakeChannel()
+    batcher = ChannelBatcher(1)
+
+    async def scenario():
+        batcher.add(["x" * 1500])
+        await batcher.flush(channel)
+        batcher.add(["y" * 1500])
+        await batcher.flush(channel)
+
+    asyncio.run(scenario())
+    assert channel.sent == ["x" * 1500, "y" * 1500]
+    assert channel.edits == []
+
+
+def test_batcher_reports_lines_dropped_from_its_backlog():
+    channel = FakeChannel()
+    batcher = ChannelBatcher(1)
+    batcher.add([f"line {i}" for i in range(MAX_BACKLOG + 10)])
+    asyncio.run(batcher.flush(channel))
+    assert channel.sent[0].startswith("… 10 lines skipped\nline 10\n")
+    assert len(channel.sent[0]) <= 2000
+
+
+class FakeResponse:
+    status = 404
+    reason = "Not Found"
+
+
+def test_batcher_replaces_a_deleted_message():
+    channel = FakeChannel()
+    batcher = ChannelBatcher(1)
+
+    async def deleted(content):
+        raise discord.NotFound(FakeResponse(), "Unknown Message")
+
+    async def scenario():
+        batcher.add(["one"])
+        await batcher.flush(channel)
+        batcher._message.edit = deleted
+        batcher.add(["two"])
+        await batcher.flush(channel)
+
+    asyncio.run(scenario())
+    assert channel.sent == ["one", "two"]
+
+
+def test_manager_relays_a_shared_server_to_every_guilds_channel():
+    channels = {100: FakeChannel(), 200: FakeChannel()}
+    players = {"survival": ["Steve"], "creative": []}
+    targets = {"survival": (frozenset({100, 200}), None), "creative": (frozenset({200}), None)}
+    manager = RelayManager(lambda: targets, channels.get, players.get)
+
+    async def scenario():
+        for _ in range(2):
+            manager._sync_relays()
+            for relay in list(manager._relays.values()):
+                await manager._collect(relay)
+            players["survival"] = ["Alex"]
+            players["creative"] = ["Notch"]
+        for batcher in list(manager._batchers.values()):
+            await manager._flush(batcher)
+
+    asyncio.run(scenario())
+    assert channels[100].sent == ["➡️ Alex joined the game\n⬅️ Steve left the game"]
+    # Channel 200 gets two servers, so each line says which one
+    assert channels[200].sent == ["[survival] ➡️ Alex joined the game\n[survival] ⬅️ Steve left the game\n"
+                                  "[creative] ➡️ Notch joined the game"]
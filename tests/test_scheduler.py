@@ -0,0 +1,76 @@
+import asyncio
+
+import pytest
+
+from scheduler import PRIORITY_ACTION, PRIORITY_ADMIN, PRIORITY_STATUS, CommandScheduler, SchedulerBusy
+
+
+def test_user_rate_limit_is_per_user():
+    async def scenario():
+        scheduler = CommandScheduler(user_rate=0.001, user_burst=2)
+        for _ in range(2):
+            scheduler.admit("s", PRIORITY_ACTION, 1, 10).release()
+        with pytest.raises(SchedulerBusy):
+            scheduler.admit("s", PRIORITY_ACTION, 1, 10)
+        scheduler.admit("s", PRIORITY_ACTION, 2, 10).release()
+
+    asyncio.run(scenario())
+
+
+def test_user_rate_limit_applies_unless_exempt():
+    async def scenario():
+        scheduler = CommandScheduler(user_rate=0.001, user_burst=2)
+        for _ in range(2):
+            scheduler.admit("s", PRIORITY_ADMIN, 1, 10).release()
+        with pytest.raises(SchedulerBusy):
+            # The admin lane alone doesn't skip the limits
+            scheduler.admit("s", PRIORITY_ADMIN, 1, 10)
+        scheduler.admit("s", PRIORITY_ACTION, 1, 10, exempt=True).release()
+
+    asyncio.run(scenario())
+
+
+def test_full_queue_is_refused():
+    async def scenario():
+        scheduler = CommandScheduler(max_concurrency=1, max_queue=1, user_rate=1000, user_burst=1000)
+        running = scheduler.admit("s", PRIORITY_STATUS, 1, 10)
+        scheduler.admit("s", PRIORITY_STATUS, 2, 10)
+        with pytest.raises(SchedulerBusy):
+            scheduler.admit("s", PRIORITY_STATUS, 3, 10)
+        running.release()
+
+    asyncio.run(scenario())
+
+
+def test_queued_commands_run_by_priority():
+    async def scenario():
+        scheduler = CommandScheduler(max_concurrency=1, user_rate=1000, user_burst=1000)
+        running = scheduler.admit("s", PRIORITY_STATUS, 1, 10)
+        order = []
+
+        async def queued(priority, name):
+            ticket = scheduler.admit("s", priority, 1, 10)
+            await ticket.wait()
+            order.append(name)
+            ticket.release()
+
+        tasks = [asyncio.create_task(queued(PRIORITY_STATUS, "status")),
+                 asyncio.create_task(queued(PRIORITY_ADMIN, "admin"))]
+        await asyncio.sleep(0)
+        running.release()
+        await asyncio.gather(*tasks)
+        return order
+
+    assert asyncio.run(scenario()) == ["admin", "status"]
+
+
+def test_fan_out_is_charged_once():
+    async def scenario():
+        scheduler = CommandScheduler(user_rate=0.001, user_burst=1)
+        admitted = scheduler.admit_many(["a", "b", "c"], PRIORITY_STATUS, 1, 10)
+        for ticket in admitted.values():
+            ticket.release()
+        with pytest.raises(SchedulerBusy):
+            scheduler.admit("a", PRIORITY_STATUS, 1, 10)
+
+    asyncio.run(scenario())
@@ -0,0 +1,38 @@
+import pytest
+
+from sharding import ShardConfig
+
+
+def test_unsharded_process_owns_everything(monkeypatch):
+    monkeypatch.delenv("SHARD_COUNT", raising=False)
+    config = ShardConfig.from_env()
+    assert not config.enabled
+    assert config.syncs_commands
+    assert config.owns_guild(123 << 22)
+    assert config.bot_options() == {}
+
+
+def test_guilds_are_split_by_discords_formula(monkeypatch):
+    monkeypatch.setenv("SHARD_COUNT", "4")
+    monkeypatch.setenv("SHARD_IDS", "3, 1")
+    config = ShardConfig.from_env()
+    assert config.bot_options() == {"shard_count": 4, "shard_ids": [1, 3]}
+    assert [config.owns_guild(shard << 22) for shard in range(4)] == [False, True, False, True]
+    assert config.owns_guild((7 << 22) + 12345)
+    # Shard 0 runs in another process, which syncs the command tree
+    assert not config.syncs_commands
+
+
+def test_shard_count_alone_runs_every_shard(monkeypatch):
+    monkeypatch.setenv("SHARD_COUNT", "2")
+    monkeypatch.delenv("SHARD_IDS", raising=False)
+    config = ShardConfig.from_env()
+    assert config.shard_ids == [0, 1]
+    assert config.syncs_commands
+
+
+def test_out_of_range_shard_ids_are_refused(monkeypatch):
+    monkeypatch.setenv("SHARD_COUNT", "2")
+    monkeypatch.setenv("SHARD_IDS", "0,2")
+    with pytest.raises(ValueError, match=r"\[2\]"):
+        ShardConfig.from_env()
@@ -0,0 +1,184 @@
+import asyncio
+import logging
+import time
+from array import array
+from parsers import is_debug_started, is_unknown_command, parse_debug_stop, parse_tick_query, parse_tps
+
+logger = logging.getLogger(__name__)
+
+# How each server reports TPS, tried in this order
+SOURCE_TPS = "tps"                # Paper/Spigot
+SOURCE_TICK_QUERY = "tick query"  # vanilla 1.20.3+
+SOURCE_PROFILER = "debug"         # older vanilla: profile with debug start/stop
+
+SPARK_CHARS = "▁▂▃▄▅▆▇█"
+MAX_TPS = 20.0
+
+
+def format_tps(value):
+    if value is None:
+        return "n/a"
+    return f"{min(value, MAX_TPS):.1f}"
+
+
+class TpsHistory:
+    """Fixed-size ring buffer of (timestamp, tps) samples backed by arrays"""
+
+    __slots__ = ("capacity", "_times", "_values", "_head", "count")
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._times = array("d", bytes(8 * capacity))
+        self._values = array("d", bytes(8 * capacity))
+        self._head = 0
+        self.count = 0
+
+    def add(self, value, timestamp=None):
+        self._times[self._head] = time.time() if timestamp is None else timestamp
+        self._values[self._head] = value
+        self._head = (self._head + 1) % self.capacity
+        if self.count < self.capacity:
+            self.count += 1
+
+    def _newest_first(self):
+        index = self._head
+        for _ in range(self.count):
+            index = (index - 1) % self.capacity
+            yield self._times[index], self._values[index]
+
+    def latest(self):
+        if not self.count:
+            return None
+        return self._values[(self._head - 1) % self.capacity]
+
+    def latest_time(self):
+        if not self.count:
+            return None
+        return self._times[(self._head - 1) % self.capacity]
+
+    def average(self, window, now=None):
+        """Mean TPS over the last `window` seconds, or None without samples in range"""
+        cutoff = (time.time() if now is None else now) - window
+        total = 0.0
+        samples = 0
+        for timestamp, value in self._newest_first():
+            if timestamp < cutoff:
+                break
+            total += value
+            samples += 1
+        return total / samples if samples else None
+
+    def sparkline(self, width=20, window=900.0, now=None):
+        """Compact bar chart of the last `window` seconds, oldest on the left"""
+        now = time.time() if now is None else now
+        bucket_size = window / width
+        totals = [0.0] * width
+        counts = [0] * width
+        for timestamp, value in self._newest_first():
+            age = now - timestamp
+            if age >= window:
+                break
+            bucket = width - 1 - int(age // bucket_size)
+            totals[bucket] += value
+            counts[bucket] += 1
+
+        chars = []
+        for total, count in zip(totals, counts):
+            if not count:
+                chars.append(" ")
+                continue
+            level = min(total / count, MAX_TPS) / MAX_TPS
+            chars.append(SPARK_CHARS[round(level * (len(SPARK_CHARS) - 1))])
+        return "".join(chars).rstrip() or "-"
+
+
+class TpsSampler:
+    """Samples TPS from every server in the background into a TpsHistory per server"""
+
+    def __init__(self, get_servers, run_command, interval=30.0, profile_seconds=5.0, history_seconds=900.0,
+                 profile_interval=1800.0):
+        self.get_servers = get_servers
+        self.run_command = run_command
+        self.interval = interval
+        self.profile_seconds = profile_seconds
+        # Each profiling run writes an archive to the server's debug/ folder, tells ops, and blocks
+        # admins' own /debug sessions meanwhile, so servers that need it are sampled rarely
+        self.profile_interval = profile_interval
+        self.capacity = int(history_seconds // interval) + 1
+        self._histories = {}
+        self._sources = {}
+        self._tasks = {}
+        self._task = None
+
+    def start(self):
+        """Start sampling; safe to call again on reconnect"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        tasks = list(self._tasks.values())
+        if self._task is not None:
+            tasks.append(self._task)
+            self._task = None
+        self._tasks = {}
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def get_history(self, server_key):
+        return self._histories.get(server_key)
+
+    async def _run(self):
+        """Keep one sampling task per configured server"""
+        while True:
+            servers = self.get_servers()
+            for server_key in list(self._tasks):
+                if server_key not in servers:
+                    self._tasks.pop(server_key).cancel()
+                    self._histories.pop(server_key, None)
+                    self._sources.pop(server_key, None)
+            for server_key in servers:
+                if server_key not in self._tasks or self._tasks[server_key].done():
+                    self._tasks[server_key] = asyncio.create_task(self._sample_forever(server_key))
+            await asyncio.sleep(self.interval)
+
+    async def _sample_forever(self, server_key):
+        history = self._histories.setdefault(server_key, TpsHistory(self.capacity))
+        while True:
+            started = time.monotonic()
+            try:
+                value = await self._sample(server_key)
+                if value is not None:
+                    history.add(value)
+            except Exception as e:
+                logger.warning("error sampling TPS", extra={"server": server_key, "error": str(e)})
+            interval = self.profile_interval if self._sources.get(server_key) == SOURCE_PROFILER else self.interval
+            await asyncio.sleep(max(interval - (time.monotonic() - started), 1.0))
+
+    async def _sample(self, server_key):
+        source = self._sources.get(server_key, SOURCE_TPS)
+        if source == SOURCE_TPS:
+            result = await self.run_command(server_key, "tps")
+            reading = parse_tps(result)
+            if reading is not None:
+                self._sources[server_key] = SOURCE_TPS
+                return reading.one_minute
+            if not is_unknown_command(result):
+                return None
+            source = SOURCE_TICK_QUERY
+
+        if source == SOURCE_TICK_QUERY:
+            result = await self.run_command(server_key, "tick query")
+            value = parse_tick_query(result)
+            if value is not None:
+                self._sources[server_key] = SOURCE_TICK_QUERY
+                return value
+            if not is_unknown_command(result):
+                return None
+
+        # Older vanilla: profile for a few seconds, unless an admin is already profiling
+        self._sources[server_key] = SOURCE_PROFILER
+        if not is_debug_started(await self.run_command(server_key, "debug start")):
+            return None
+        await asyncio.sleep(self.profile_seconds)
+        return parse_debug_stop(await self.run_command(server_key, "debug stop"))